@@ -1,4 +1,4 @@
-__version__ = "0.1.4"
+__version__ = "0.1.23"
 __author__ = "Grigorii Batalov"
 __license__ = "MIT"
 __description__ = "Google cloud utils for the brevet.top"
@@ -1,2 +1,9 @@
-from .main import (create_document, firestore_to_track_point,  # noqa: F401
-                   get_checkpoints, resolve_document, route_point_to_firestore)  # noqa: F401
+from .main import (create_document, firestore_to_track, firestore_to_track_point,  # noqa: F401
+                   get_checkpoints, new_document, resolve_document, route_point_to_firestore,  # noqa: F401
+                   track_point_to_firestore)  # noqa: F401
+from .track import PACKED_FIELDS, decode_track, encode_track, read_track_field, route_track_fields  # noqa: F401
+from .documents import (BREVET_ALIGNMENT, BREVET_EXPORT, BREVET_METADATA, BREVET_RESULTS,  # noqa: F401
+                        get_brevet, get_dicts, query_dicts, query_subcollections)  # noqa: F401
+from .batch import BATCH_LIMIT, write_batches  # noqa: F401
+from .barcodes import barcode_id, create_barcodes  # noqa: F401
+from .trigger import RESULTS_DIRTY, ResultsTrigger, TaskResultsTrigger  # noqa: F401
@@ -0,0 +1,57 @@
+import hashlib
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+from google.cloud.firestore import Client
+
+from .batch import write_batches
+
+
+def barcode_id(rider_uid: str, brevet_uid: str, code: str, time: datetime) -> str:
+    """
+    Make a stable barcode document id, a retried upload or webhook maps to the same documents.
+
+    :param rider_uid: the rider UID
+    :param brevet_uid: the brevet UID
+    :param code: the checkpoint UID
+    :param time: the check-in time, seconds are significant
+    :return: a 20 characters id like the auto-generated ones
+    """
+    key = f"{rider_uid}/{brevet_uid}/{code}/{int(time.timestamp())}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def create_barcodes(
+    rider_uids: Iterable[str], brevet_uid: str, checkins: Iterable[Tuple[str, datetime]], db: Client
+) -> List[str]:
+    """
+    Register check-ins as riders/{rider}/barcodes documents: one read of the ids and one batched write
+    of the missing ones, already registered check-ins are left untouched.
+
+    :param rider_uids: the riders to check in
+    :param brevet_uid: the brevet UID
+    :param checkins: pairs of a checkpoint UID and the check-in time
+    :param db: a client to use and share
+    :return: the ids of the created documents
+    """
+    checkins = list(checkins)
+    barcodes = {}
+    for rider_uid in rider_uids:
+        for code, time in checkins:
+            uid = barcode_id(rider_uid, brevet_uid, code, time)
+            barcodes[db.document(f"riders/{rider_uid}/barcodes/{uid}")] = {
+                "uid": uid,
+                "code": code,
+                "control": rider_uid,
+                "owner": rider_uid,
+                "time": time,
+                "message": "new",
+            }
+    if not barcodes:
+        return []
+
+    snapshots = db.get_all(list(barcodes), field_paths=["uid"])
+    existing = {snapshot.reference.path for snapshot in snapshots if snapshot.exists}
+    writes = [(reference, data) for reference, data in barcodes.items() if reference.path not in existing]
+    write_batches(db, writes)
+    return [data["uid"] for _, data in writes]
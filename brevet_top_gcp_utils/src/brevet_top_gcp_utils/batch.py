@@ -0,0 +1,34 @@
+from typing import Iterable, Optional, Tuple
+
+from google.cloud.firestore import Client, DocumentReference
+
+BATCH_LIMIT = 500  # writes per batch allowed by Firestore
+
+
+def write_batches(
+    db: Client, writes: Iterable[Tuple[DocumentReference, Optional[dict]]], merge: bool = False
+) -> int:
+    """
+    Set documents in as few batched commits as possible instead of a round trip per document.
+
+    :param db: a client to use
+    :param writes: pairs of a document reference and its data, None deletes the document
+    :param merge: merge the data into existing documents
+    :return: the number of committed batches
+    """
+    batches = 0
+    batch, size = db.batch(), 0
+    for reference, data in writes:
+        if data is None:
+            batch.delete(reference)
+        else:
+            batch.set(reference, data, merge=merge)
+        size += 1
+        if size == BATCH_LIMIT:
+            batch.commit()
+            batches += 1
+            batch, size = db.batch(), 0
+    if size:
+        batch.commit()
+        batches += 1
+    return batches
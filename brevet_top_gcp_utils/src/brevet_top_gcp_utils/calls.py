@@ -0,0 +1,66 @@
+import json
+import os
+from typing import List, Optional
+
+from google.cloud import functions_v1, tasks_v2
+from google.protobuf import timestamp_pb2
+
+SAVE_RESULTS = "saveResults"
+# the Cloud Tasks queue of the delayed results updates
+RESULTS_QUEUE = os.getenv("RESULTS_QUEUE", "results")
+
+# the clients are created once per instance
+functions_client: Optional[functions_v1.CloudFunctionsServiceClient] = None
+tasks_client: Optional[tasks_v2.CloudTasksClient] = None
+
+
+def call_save_results(brevet_uid: str, rider_uids: List[str]):
+    """
+    Call the saveResults function synchronously.
+
+    :param brevet_uid: the brevet UID
+    :param rider_uids: the riders to update, all of them if empty
+    """
+    global functions_client
+    if functions_client is None:
+        functions_client = functions_v1.CloudFunctionsServiceClient()
+    functions_client.call_function(
+        request=functions_v1.CallFunctionRequest(
+            name=functions_client.cloud_function_path(
+                project=os.getenv("GCLOUD_PROJECT"),
+                location=os.getenv("FUNCTION_REGION"),
+                function=SAVE_RESULTS,
+            ),
+            data=json.dumps({"data": {"brevetUid": brevet_uid, "riderUids": rider_uids}}),
+        )
+    )
+
+
+def schedule_save_results(brevet_uid: str, task_name: str, run_at: float):
+    """
+    Create a Cloud Tasks task calling the saveResults function for the brevet's dirty riders.
+
+    :param brevet_uid: the brevet UID
+    :param task_name: the task id, a known one raises AlreadyExists
+    :param run_at: the time to run at in seconds since the epoch
+    """
+    global tasks_client
+    if tasks_client is None:
+        tasks_client = tasks_v2.CloudTasksClient()
+    project, region = os.getenv("GCLOUD_PROJECT"), os.getenv("FUNCTION_REGION")
+    tasks_client.create_task(
+        parent=tasks_client.queue_path(project, region, RESULTS_QUEUE),
+        task=tasks_v2.Task(
+            name=tasks_client.task_path(project, region, RESULTS_QUEUE, task_name),
+            schedule_time=timestamp_pb2.Timestamp(seconds=int(run_at)),
+            http_request=tasks_v2.HttpRequest(
+                http_method=tasks_v2.HttpMethod.POST,
+                url=f"https://{region}-{project}.cloudfunctions.net/{SAVE_RESULTS}",
+                headers={"Content-Type": "application/json"},
+                body=json.dumps({"data": {"brevetUid": brevet_uid, "dirty": True}}).encode(),
+                oidc_token=tasks_v2.OidcToken(
+                    service_account_email=os.getenv("RESULTS_SERVICE_ACCOUNT", f"{project}@appspot.gserviceaccount.com")
+                ),
+            ),
+        ),
+    )
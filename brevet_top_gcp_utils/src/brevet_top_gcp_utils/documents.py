@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+
+from google.cloud.firestore import Client, DocumentReference, Query
+
+# brevet document fields by use case, the full track is read by the export only
+BREVET_METADATA = ("uid", "name", "length", "startDate", "endDate", "mapUrl")
+BREVET_ALIGNMENT = (
+    "uid",
+    "name",
+    "startDate",
+    "endDate",
+    "checkpoints",
+    "short_track",
+    "trackDeviation",
+    "controlDeviation",
+    "skip_trim",
+)
+BREVET_EXPORT = ("uid", "name", "length", "startDate", "mapUrl", "checkpoints", "results", "track", "trackData")
+BREVET_RESULTS = ("uid", "checkpoints")
+
+QUERY_WORKERS = 16  # parallel subcollection queries
+
+
+def get_brevet(brevet_doc: DocumentReference, fields: Optional[Sequence[str]] = BREVET_METADATA) -> Optional[dict]:
+    """
+    Read the brevet document fields for a use case (see BREVET_*), the rest is not transferred.
+
+    :param brevet_doc: the brevet document reference
+    :param fields: the field paths to read or None for the whole document
+    :return: a dict with the fields or None if the document does not exist
+    """
+    return brevet_doc.get(field_paths=list(fields) if fields is not None else None).to_dict()
+
+
+def query_dicts(query: Query, fields: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Stream a query and take the data right from the snapshots, no document is read again.
+
+    :param query: a collection or a query
+    :param fields: the field paths to read (see BREVET_*) or None for the whole documents
+    :return: a list of the document dicts
+    """
+    if fields is not None:
+        query = query.select(list(fields))
+    return [snapshot.to_dict() for snapshot in query.stream()]
+
+
+def get_dicts(db: Client, paths: Sequence[str], fields: Optional[Sequence[str]] = None) -> List[Optional[dict]]:
+    """
+    Read several documents in a single batched round trip.
+
+    :param db: a client to use
+    :param paths: the document paths
+    :param fields: the field paths to read or None for the whole documents
+    :return: a list of the document dicts (None if missing) in the order of paths
+    """
+    references = [db.document(path) for path in paths]
+    snapshots = db.get_all(references, field_paths=list(fields) if fields is not None else None)
+    found = {snapshot.reference.path: snapshot.to_dict() for snapshot in snapshots}
+    return [found.get(reference.path) for reference in references]
+
+
+def query_subcollections(
+    references: Sequence[DocumentReference],
+    name: str,
+    fields: Optional[Sequence[str]] = None,
+    workers: int = QUERY_WORKERS,
+    filters: Sequence[Tuple[str, str, Any]] = (),
+) -> List[List[dict]]:
+    """
+    Query the same subcollection of several documents in parallel, the latency is about a single round trip
+    instead of one per document.
+
+    :param references: the parent documents
+    :param name: the subcollection name
+    :param fields: the field paths to read or None for the whole documents
+    :param workers: the maximum number of concurrent queries
+    :param filters: the (field path, operator, value) conditions applied to every subcollection
+    :return: a list of the document dicts for every parent in the order of references
+    """
+    if not references:
+        return []
+
+    def query(reference: DocumentReference) -> List[dict]:
+        subcollection = reference.collection(name)
+        for field_path, op_string, value in filters:
+            subcollection = subcollection.where(field_path, op_string, value)
+        return query_dicts(subcollection, fields)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(references))) as executor:
+        return list(executor.map(query, references))
@@ -1,11 +1,13 @@
 import logging
 import re
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Sequence, Tuple
 
 import google.cloud.firestore
+import numpy as np
 import google.cloud.logging
-from google.cloud.firestore import DocumentReference, GeoPoint
+from google.cloud.firestore import CollectionReference, DocumentReference, GeoPoint
 
+from brevet_top_numpy_utils import FloatArray
 from brevet_top_plot_a_route import RoutePoint
 
 log_client = google.cloud.logging.Client()
@@ -24,6 +26,16 @@ def route_point_to_firestore(point: RoutePoint) -> dict:
     return {"distance": point.distance, "coordinates": GeoPoint(point.lat, point.lng)}
 
 
+def track_point_to_firestore(point: Sequence[float]) -> dict:
+    """
+    Convert a track point (a row of a track array) to a storable format.
+
+    :param point: a sequence of (latitude, longitude, timestamp, distance)
+    :return: a dict with attributes
+    """
+    return {"distance": float(point[3]), "coordinates": GeoPoint(float(point[0]), float(point[1]))}
+
+
 def firestore_to_track_point(data: dict) -> Tuple[float, float, float, float]:
     """
     Convert a stored point dict to a tuple of coordinates and a distance
@@ -42,19 +54,55 @@ def firestore_to_track_point(data: dict) -> Tuple[float, float, float, float]:
     return 0.0, 0.0, 0.0, 0.0
 
 
+def _track_values(points: Sequence[dict]) -> Iterator[float]:
+    for data in points:
+        coordinates: Optional[GeoPoint] = data.get("coordinates")
+        if isinstance(coordinates, GeoPoint):
+            yield coordinates.latitude
+            yield coordinates.longitude
+            yield 0.0
+            yield data.get("distance", 0.0)
+        else:
+            yield from (0.0, 0.0, 0.0, 0.0)
+
+
+def firestore_to_track(points: Sequence[dict]) -> FloatArray:
+    """
+    Convert a list of stored point dicts to a track array in one pass, see firestore_to_track_point.
+    The values are streamed straight into a preallocated array.
+
+    :param points: a list of dicts with the point details
+    :return: an array of [latitude, longitude, 0, distance]
+    """
+    return np.fromiter(_track_values(points), dtype=np.float64, count=4 * len(points)).reshape(-1, 4)
+
+
+def new_document(collection: CollectionReference, data: dict) -> Tuple[DocumentReference, dict]:
+    """
+    Generate a document id on the client and embed it as the uid property, nothing is written yet.
+    The pair can be set directly or passed to write_batches along with other documents.
+
+    :param collection: a collection to add the document to
+    :param data: the document contents
+    :return: the new document reference and the contents with uid
+    """
+    doc_ref = collection.document()
+    return doc_ref, {**data, "uid": doc_ref.id}
+
+
 def create_document(
     collection_path: str, data: dict, db=google.cloud.firestore.Client()
 ) -> str:
     """
-    Add a document and update uid property.
+    Add a document with the uid property in a single write.
 
     :param collection_path: a collection to add the document to
     :param data: the document contents
     :param db: a client to use and share
     :return: id of the new document
     """
-    timestamp, doc_ref = db.collection(collection_path).add(data)
-    doc_ref.update({"uid": doc_ref.id})
+    doc_ref, data = new_document(db.collection(collection_path), data)
+    doc_ref.set(data)
     return doc_ref.id
 
 
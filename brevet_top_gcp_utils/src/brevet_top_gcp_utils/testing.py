@@ -0,0 +1,347 @@
+"""
+An in-memory stand-in for google.cloud.firestore.Client counting round trips and transferred bytes.
+Documents are kept as plain dicts by their paths, e.g. "brevets/abc" or "brevets/abc/checkpoints/cp1".
+Every write takes the next microsecond of a fake clock as the update time and the SERVER_TIMESTAMP value.
+A test helper for this package and the functions using it, requires the "test" extra:
+
+    # conftest.py
+    from brevet_top_gcp_utils.testing import fake_db  # noqa: F401
+"""
+import copy
+import operator
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pytest
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import DELETE_FIELD, SERVER_TIMESTAMP, ArrayRemove, ArrayUnion, GeoPoint
+from google.cloud.firestore_v1.field_path import parse_field_path
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "array_contains": lambda value, item: item in (value or []),
+}
+EPOCH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def value_size(value: Any) -> int:
+    """
+    Approximate Firestore storage size of a value.
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, GeoPoint):
+        return 16
+    if isinstance(value, str):
+        return len(value.encode()) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + 1 + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    return 8  # timestamps, references
+
+
+def get_path(data: dict, field_path: str) -> Any:
+    for key in field_path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def project(data: dict, field_paths: Optional[Sequence[str]]) -> dict:
+    if field_paths is None:
+        return copy.deepcopy(data)
+    result: dict = {}
+    for field_path in field_paths:
+        keys = field_path.split(".")
+        source, target = data, result
+        for key in keys[:-1]:
+            if not isinstance(source, dict) or key not in source:
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+        else:
+            if isinstance(source, dict) and keys[-1] in source:
+                target[keys[-1]] = copy.deepcopy(source[keys[-1]])
+    return result
+
+
+def merge_fields(target: dict, data: dict, field_paths: bool = False, now: Optional[datetime] = None) -> dict:
+    """
+    Apply a set(merge=True) change (nested maps are merged) or an update() (dotted paths, `quoted` segments).
+    DELETE_FIELD, SERVER_TIMESTAMP (the now value), ArrayUnion and ArrayRemove are applied as the server does.
+    """
+    for key, value in data.items():
+        keys = parse_field_path(key) if field_paths else [key]
+        node = target
+        for part in keys[:-1]:
+            node = node.setdefault(part, {})
+        if value is DELETE_FIELD:
+            node.pop(keys[-1], None)
+        elif value is SERVER_TIMESTAMP:
+            node[keys[-1]] = now
+        elif isinstance(value, ArrayUnion):
+            current = node.get(keys[-1]) or []
+            node[keys[-1]] = current + [item for item in value.values if item not in current]
+        elif isinstance(value, ArrayRemove):
+            node[keys[-1]] = [item for item in node.get(keys[-1]) or [] if item not in value.values]
+        elif isinstance(value, dict) and not field_paths and isinstance(node.get(keys[-1]), dict):
+            merge_fields(node[keys[-1]], value, now=now)
+        elif isinstance(value, dict):
+            node[keys[-1]] = merge_fields({}, value, now=now)
+        else:
+            node[keys[-1]] = copy.deepcopy(value)
+    return target
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Optional[dict], update_time: Optional[datetime] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.update_time = update_time
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        return get_path(self._data or {}, field_path)
+
+
+class FakeDocument:
+    def __init__(self, client: "FakeClient", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.split("/")[-1]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, FakeDocument) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths: Optional[Sequence[str]] = None) -> FakeSnapshot:
+        self._client.round_trips += 1
+        return self._client.read(self, field_paths)
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self._client.round_trips += 1
+        self._client.write(self, data, merge=merge)
+
+    def update(self, data: dict, option: Optional["FakeWriteOption"] = None) -> None:
+        self._client.round_trips += 1
+        self._client.write(self, data, update=True, option=option)
+
+    def delete(self) -> None:
+        self._client.round_trips += 1
+        self._client.write(self, None)
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", path: str, group: bool = False):
+        self._client = client
+        self._path = path
+        self._group = group
+        self._filters: List[tuple] = []
+        self._field_paths: Optional[Sequence[str]] = None
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+
+    def _copy(self) -> "FakeQuery":
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        return query
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "FakeQuery":
+        query = self._copy()
+        query._filters.append((field_path, OPERATORS[op_string], value))
+        return query
+
+    def select(self, field_paths: Sequence[str]) -> "FakeQuery":
+        query = self._copy()
+        query._field_paths = list(field_paths)
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        query = self._copy()
+        query._order = (field_path, direction == "DESCENDING")
+        return query
+
+    def limit(self, count: int) -> "FakeQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def _matches(self, path: str) -> bool:
+        parent, _, _ = path.rpartition("/")
+        if self._group:
+            return parent.rpartition("/")[2] == self._path
+        return parent == self._path
+
+    def stream(self) -> Iterable[FakeSnapshot]:
+        self._client.round_trips += 1
+        documents = [
+            (path, data)
+            for path, data in sorted(self._client.documents.items())
+            if self._matches(path)
+            and all(
+                get_path(data, field) is not None and test(get_path(data, field), value)
+                for field, test, value in self._filters
+            )
+        ]
+        if self._order is not None:
+            field, reverse = self._order
+            documents.sort(key=lambda item: get_path(item[1], field), reverse=reverse)
+        if self._limit is not None:
+            documents = documents[: self._limit]
+        return [self._client.read(FakeDocument(self._client, path), self._field_paths) for path, _ in documents]
+
+    def get(self) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def document(self, document_id: Optional[str] = None) -> FakeDocument:
+        if document_id is None:
+            document_id = f"auto{next(self._client.ids)}"
+        return FakeDocument(self._client, f"{self._path}/{document_id}")
+
+    def add(self, data: dict) -> tuple:
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+    def list_documents(self) -> List[FakeDocument]:
+        return [FakeDocument(self._client, path) for path in sorted(self._client.documents) if self._matches(path)]
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference: FakeDocument, data: dict, merge: bool = False) -> None:
+        self._writes.append((reference, data, {"merge": merge}))
+
+    def update(self, reference: FakeDocument, data: dict) -> None:
+        self._writes.append((reference, data, {"update": True}))
+
+    def delete(self, reference: FakeDocument) -> None:
+        self._writes.append((reference, None, {}))
+
+    def commit(self) -> list:
+        if len(self._writes) > FakeClient.BATCH_LIMIT:
+            raise ValueError(f"Too many writes in a batch: {len(self._writes)}")
+        self._client.round_trips += 1
+        self._client.batches.append(len(self._writes))
+        for reference, data, options in self._writes:
+            self._client.write(reference, data, **options)
+        self._writes = []
+        return []
+
+
+class FakeWriteOption:
+    def __init__(self, last_update_time: datetime):
+        self.last_update_time = last_update_time
+
+
+class FakeClient:
+    BATCH_LIMIT = 500
+
+    def __init__(self, documents: Optional[Dict[str, dict]] = None):
+        self.documents: Dict[str, dict] = copy.deepcopy(documents or {})
+        self.update_times: Dict[str, datetime] = {}
+        self.round_trips = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes = 0  # transferred to the client
+        self.batches: List[int] = []  # writes per committed batch
+        self.ids = count(1)
+        self._ticks = count(1)
+
+    def reset(self) -> None:
+        self.round_trips = self.reads = self.writes = self.bytes = 0
+        self.batches = []
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(self, path)
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def collection_group(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name, group=True)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def write_option(self, last_update_time: datetime) -> FakeWriteOption:
+        return FakeWriteOption(last_update_time)
+
+    def get_all(self, references: Iterable[FakeDocument], field_paths: Optional[Sequence[str]] = None):
+        self.round_trips += 1
+        return [self.read(reference, field_paths) for reference in references]
+
+    def read(self, reference: FakeDocument, field_paths: Optional[Sequence[str]]) -> FakeSnapshot:
+        self.reads += 1
+        data = self.documents.get(reference.path)
+        data = None if data is None else project(data, field_paths)
+        self.bytes += value_size(data)
+        return FakeSnapshot(reference, data, self.update_times.get(reference.path) if data is not None else None)
+
+    def write(
+        self,
+        reference: FakeDocument,
+        data: Optional[dict],
+        merge: bool = False,
+        update: bool = False,
+        option: Optional[FakeWriteOption] = None,
+    ):
+        if option is not None and self.update_times.get(reference.path) != option.last_update_time:
+            raise FailedPrecondition(f"The document was updated: {reference.path}")
+        self.writes += 1
+        now = EPOCH + timedelta(microseconds=next(self._ticks))
+        self.update_times[reference.path] = now
+        if data is None:
+            self.documents.pop(reference.path, None)
+            self.update_times.pop(reference.path)
+        elif update:
+            if reference.path not in self.documents:
+                raise ValueError(f"No document to update: {reference.path}")
+            self.documents[reference.path] = merge_fields(
+                self.documents[reference.path], data, field_paths=True, now=now
+            )
+        elif merge:
+            self.documents[reference.path] = merge_fields(self.documents.get(reference.path, {}), data, now=now)
+        else:
+            self.documents[reference.path] = merge_fields({}, data, now=now)
+
+
+@pytest.fixture
+def fake_db() -> FakeClient:
+    """
+    An empty in-memory client, the tests put their documents into fake_db.documents by paths.
+    """
+    return FakeClient()
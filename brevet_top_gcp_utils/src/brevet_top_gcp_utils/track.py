@@ -0,0 +1,90 @@
+import struct
+import zlib
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+from brevet_top_numpy_utils import FloatArray
+from brevet_top_plot_a_route import RoutePoint
+
+from .main import firestore_to_track, route_point_to_firestore, track_point_to_firestore
+
+TRACK_ENCODING = 1  # the format version
+HEADER = struct.Struct("<BI")  # version, number of points
+COORDINATE_SCALE = 1e6  # microdegrees
+DISTANCE_SCALE = 100  # centimeters
+# packed copies of the stored point lists, short_track is small and the site draws the map from it
+PACKED_FIELDS = {"track": "trackData"}
+
+
+def encode_track(track: Union[FloatArray, Sequence[Sequence[float]]]) -> bytes:
+    """
+    Pack a track into bytes: delta-encoded int32 microdegrees and centimeters, column by column, zlib compressed.
+    A few bytes per route point instead of a map with a GeoPoint.
+
+    :param track: an array of [latitude, longitude, timestamp, distance], the timestamp is not stored
+    :return: the packed track
+    """
+    track = np.asarray(track, dtype=np.float64).reshape(-1, 4)
+    columns = np.empty(shape=(3, len(track)), dtype=np.int64)
+    columns[0:2] = np.rint(track[:, 0:2].T * COORDINATE_SCALE)
+    columns[2] = np.rint(track[:, 3] * DISTANCE_SCALE)
+    # rounding the absolute values first keeps the error from accumulating
+    deltas = np.diff(columns, axis=1, prepend=0)
+    if np.any(np.abs(deltas) > np.iinfo(np.int32).max):
+        raise ValueError("Track values are out of range")
+    return HEADER.pack(TRACK_ENCODING, len(track)) + zlib.compress(deltas.astype("<i4").tobytes())
+
+
+def decode_track(data: bytes) -> FloatArray:
+    """
+    Unpack a track packed with encode_track.
+
+    :param data: the packed track
+    :return: an array of [latitude, longitude, 0, distance]
+    """
+    version, size = HEADER.unpack_from(data)
+    if version != TRACK_ENCODING:
+        raise ValueError(f"Unsupported track encoding {version}")
+    deltas = np.frombuffer(zlib.decompress(data[HEADER.size :]), dtype="<i4").reshape(3, size)
+    columns = np.cumsum(deltas, axis=1, dtype=np.int64)
+
+    track = np.zeros(shape=(size, 4), dtype=np.float64)
+    track[:, 0:2] = columns[0:2].T / COORDINATE_SCALE
+    track[:, 3] = columns[2] / DISTANCE_SCALE
+    return track
+
+
+def read_track_field(document: dict, field: str = "short_track") -> FloatArray:
+    """
+    Read a stored track from a brevet document, the packed copy if any, otherwise the list of point maps.
+
+    :param document: the brevet document dict
+    :param field: the point list field name, "track" or "short_track"
+    :return: an array of [latitude, longitude, 0, distance]
+    """
+    packed = document.get(PACKED_FIELDS.get(field, ""))
+    if packed:
+        return decode_track(packed)
+    return firestore_to_track(document.get(field) or [])
+
+
+def route_track_fields(
+    track: FloatArray, short_track: Sequence[RoutePoint], store_points: bool = False
+) -> Dict[str, Union[bytes, List[dict]]]:
+    """
+    Make the stored route fields of a brevet: short_track as point maps and the track packed into trackData.
+    The readers decode the track with read_track_field, the point list is only kept for the outside clients
+    not switched to trackData yet.
+
+    :param track: the route track array of [latitude, longitude, timestamp, distance]
+    :param short_track: the simplified route points
+    :param store_points: also store the full track as point maps
+    :return: a dict of the fields to write
+    """
+    fields: Dict[str, Union[bytes, List[dict]]] = {
+        "trackData": encode_track(track),
+        "short_track": [route_point_to_firestore(point) for point in short_track],
+    }
+    if store_points:
+        fields["track"] = [track_point_to_firestore(point) for point in np.asarray(track).tolist()]
+    return fields
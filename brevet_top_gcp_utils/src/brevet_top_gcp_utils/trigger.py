@@ -0,0 +1,166 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import SERVER_TIMESTAMP, Client
+
+# called with a brevet UID and the riders to update
+ResultsCall = Callable[[str, List[str]], None]
+# called with a brevet UID, a task name unique for the brevet and the interval and the time to run at (epoch seconds)
+ResultsSchedule = Callable[[str, str, float], None]
+
+# the collection of the riders waiting for a results update, a document per brevet with a "riders" map
+# of the rider UIDs to the marking times, apart from the brevet documents so marking does not fire the brevet triggers
+RESULTS_DIRTY = "resultsDirty"
+
+
+class ResultsTrigger:
+    """
+    Coalesce results rebuild requests: at most one call per brevet per interval.
+    A brevet requested within the interval after the last call is marked dirty with its riders
+    and called once when the interval ends, either by a background timer or by a later request.
+    The state is kept in the process, the zero interval calls synchronously every time.
+    An instance without CPU after the response may never flush, see TaskResultsTrigger for the functions.
+    """
+
+    def __init__(
+        self,
+        call: ResultsCall,
+        interval: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        background: bool = True,
+    ):
+        """
+        :param call: the results rebuild, e.g. the saveResults function call
+        :param interval: the minimum number of seconds between the calls for a brevet
+        :param clock: a monotonic clock in seconds
+        :param background: flush the dirty brevets by a timer when the interval ends
+        """
+        self.call = call
+        self.interval = interval
+        self.clock = clock
+        self.background = background
+        self._lock = threading.Lock()
+        self._last_call: Dict[str, float] = {}
+        self._dirty: Dict[str, Set[str]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+
+    def request(self, brevet_uid: str, rider_uids: Iterable[str] = ()) -> bool:
+        """
+        Ask for a results rebuild of the brevet.
+
+        :param brevet_uid: the brevet UID
+        :param rider_uids: the riders with new check-ins
+        :return: True if the call was made, False if it is postponed
+        """
+        with self._lock:
+            self._dirty.setdefault(brevet_uid, set()).update(rider_uids)
+            delay = self._last_call.get(brevet_uid, -self.interval) + self.interval - self.clock()
+            if delay > 0:
+                logging.debug(f"Results of {brevet_uid} are postponed for {delay:.1f} sec.")
+                if self.background and brevet_uid not in self._timers:
+                    timer = threading.Timer(delay, self.flush, kwargs={"brevet_uids": [brevet_uid], "force": True})
+                    timer.daemon = True
+                    self._timers[brevet_uid] = timer
+                    timer.start()
+                return False
+            rider_uids = self._take(brevet_uid)
+        self.call(brevet_uid, rider_uids)
+        return True
+
+    def flush(self, brevet_uids: Optional[Iterable[str]] = None, force: bool = False) -> int:
+        """
+        Call the dirty brevets whose interval is over.
+
+        :param brevet_uids: the brevets to check or None for all the dirty ones
+        :param force: do not wait for the interval end
+        :return: the number of calls
+        """
+        with self._lock:
+            now = self.clock()
+            due = {
+                brevet_uid: self._take(brevet_uid)
+                for brevet_uid in list(self._dirty if brevet_uids is None else brevet_uids)
+                if brevet_uid in self._dirty
+                and (force or self._last_call.get(brevet_uid, -self.interval) + self.interval <= now)
+            }
+        for brevet_uid, rider_uids in due.items():
+            try:
+                self.call(brevet_uid, rider_uids)
+            except Exception as error:
+                logging.exception(f"Results of {brevet_uid} failed: {error}")
+        return len(due)
+
+    def pending(self) -> List[str]:
+        """
+        :return: the dirty brevet UIDs
+        """
+        with self._lock:
+            return list(self._dirty)
+
+    def _take(self, brevet_uid: str) -> List[str]:
+        # the caller holds the lock
+        self._last_call[brevet_uid] = self.clock()
+        timer = self._timers.pop(brevet_uid, None)
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        return sorted(self._dirty.pop(brevet_uid, ()))
+
+
+class TaskResultsTrigger:
+    """
+    Coalesce results rebuild requests across the function instances: at most one call per brevet per interval.
+    The riders are marked in the brevet's RESULTS_DIRTY document and a delayed task is scheduled for the interval end,
+    its name is unique for the brevet and the interval so the repeated requests are deduplicated by the queue.
+    Every request renews the marking times, so the task is expected to update the dirty riders
+    and remove only the marks it has read, a rider marked again during the update stays for the next task.
+    The zero interval or a request without riders calls synchronously.
+    """
+
+    def __init__(
+        self,
+        db: Client,
+        call: ResultsCall,
+        schedule: ResultsSchedule,
+        interval: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param db: a client to use and share
+        :param call: the synchronous results rebuild, e.g. the saveResults function call
+        :param schedule: the delayed task creation, raising AlreadyExists for a known task name
+        :param interval: the minimum number of seconds between the calls for a brevet
+        :param clock: a wall clock in seconds since the epoch, shared by the instances
+        """
+        self.db = db
+        self.call = call
+        self.schedule = schedule
+        self.interval = interval
+        self.clock = clock
+
+    def request(self, brevet_uid: str, rider_uids: Iterable[str] = ()) -> bool:
+        """
+        Ask for a results rebuild of the brevet.
+
+        :param brevet_uid: the brevet UID
+        :param rider_uids: the riders with new check-ins
+        :return: True if the call was made, False if it is queued
+        """
+        rider_uids = list(rider_uids)
+        if self.interval <= 0 or not rider_uids:
+            self.call(brevet_uid, rider_uids)
+            return True
+
+        self.db.document(f"{RESULTS_DIRTY}/{brevet_uid}").set(
+            {"riders": {rider_uid: SERVER_TIMESTAMP for rider_uid in rider_uids}}, merge=True
+        )
+        # the end of the current interval, the same for all the instances
+        window = math.floor(self.clock() / self.interval) + 1
+        try:
+            self.schedule(brevet_uid, f"results-{brevet_uid}-{window}", window * self.interval)
+        except AlreadyExists:
+            logging.debug(f"Results of {brevet_uid} are queued already")
+        return False
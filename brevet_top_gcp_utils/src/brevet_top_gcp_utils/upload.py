@@ -0,0 +1,26 @@
+from base64 import b64decode
+from io import BytesIO
+from typing import BinaryIO, Optional, Tuple
+
+TRACK_DATA_PREFIX = "data:application/octet-stream;base64,"
+
+
+def read_upload(request) -> Tuple[dict, Optional[BinaryIO]]:
+    """
+    Extract the parameters and the track stream from the request.
+    JSON: {"data": {..., "track": "<base64>"}}, multipart: form fields and a "track" file,
+    otherwise the raw (optionally gzip / zstd compressed) body with the parameters in the query string.
+
+    :param request: HTTP request
+    :return: the parameters and the track stream
+    """
+    if request.is_json:
+        data: dict = request.get_json().get("data", {})
+        track: str = data.get("track", "")
+        if track.startswith(TRACK_DATA_PREFIX):
+            track = track[len(TRACK_DATA_PREFIX):]  # noqa: E203
+        return data, BytesIO(b64decode(track)) if track else None
+    if request.mimetype == "multipart/form-data":
+        file = request.files.get("track")
+        return request.form.to_dict(), file.stream if file else None
+    return request.args.to_dict(), request.stream if request.content_length != 0 else None
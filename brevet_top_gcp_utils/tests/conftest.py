@@ -0,0 +1 @@
+from brevet_top_gcp_utils.testing import fake_db  # noqa: F401
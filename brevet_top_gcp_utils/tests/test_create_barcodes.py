@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from brevet_top_gcp_utils import BATCH_LIMIT, barcode_id, create_barcodes, write_batches
+from brevet_top_gcp_utils.testing import FakeClient
+
+START = datetime(2024, 5, 1, 6, tzinfo=timezone.utc)
+CHECKINS = [(f"cp{i}", START + timedelta(hours=i)) for i in range(20)]
+
+
+def test_barcode_id():
+    # verification
+    assert len(barcode_id("r1", "b1", "cp1", START)) == 20
+    assert barcode_id("r1", "b1", "cp1", START) == barcode_id("r1", "b1", "cp1", START + timedelta(microseconds=10))
+    assert barcode_id("r1", "b1", "cp1", START) != barcode_id("r2", "b1", "cp1", START)
+    assert barcode_id("r1", "b1", "cp1", START) != barcode_id("r1", "b1", "cp1", START + timedelta(seconds=1))
+
+
+def barcode(rider_uid: str, code: str, time: datetime, message: str = "new") -> dict:
+    uid = barcode_id(rider_uid, "b1", code, time)
+    return {"uid": uid, "code": code, "control": rider_uid, "owner": rider_uid, "time": time, "message": message}
+
+
+def test_create_barcodes(fake_db: FakeClient):
+    # action
+    created = create_barcodes(["r1", "r2"], "b1", CHECKINS, db=fake_db)
+
+    # verification: a document per rider and check-in, in a read and a single batch instead of add + update each
+    expected = {
+        f"riders/{rider_uid}/barcodes/{data['uid']}": data
+        for rider_uid in ("r1", "r2")
+        for data in (barcode(rider_uid, code, time) for code, time in CHECKINS)
+    }
+    assert fake_db.documents == expected
+    assert sorted(created) == sorted(data["uid"] for data in expected.values())
+    assert fake_db.round_trips == 2
+    assert fake_db.batches == [40]
+
+
+def test_create_barcodes_retry(fake_db: FakeClient):
+    # setup: the first half is registered and processed by the backend
+    for code, time in CHECKINS[:10]:
+        data = barcode("r1", code, time, message="done")
+        fake_db.documents[f"riders/r1/barcodes/{data['uid']}"] = data
+    processed = dict(fake_db.documents)
+
+    # action
+    created = create_barcodes(["r1"], "b1", CHECKINS, db=fake_db)
+    repeated = create_barcodes(["r1"], "b1", CHECKINS, db=fake_db)
+
+    # verification: the processed check-ins are left untouched, the rest is added once
+    assert created == [barcode_id("r1", "b1", code, time) for code, time in CHECKINS[10:]]
+    assert repeated == []
+    assert fake_db.documents == {
+        **processed,
+        **{
+            f"riders/r1/barcodes/{data['uid']}": data
+            for data in (barcode("r1", code, time) for code, time in CHECKINS[10:])
+        },
+    }
+    assert fake_db.batches == [10]
+
+
+@pytest.mark.parametrize(
+    ("size", "batches"), [(0, []), (1, [1]), (BATCH_LIMIT, [BATCH_LIMIT]), (1200, [500, 500, 200])]
+)
+def test_write_batches(fake_db: FakeClient, size: int, batches: list):
+    # setup
+    fake_db.documents["docs/old"] = {"uid": "old"}
+
+    # action
+    count = write_batches(fake_db, [(fake_db.document(f"docs/d{i}"), {"uid": f"d{i}"}) for i in range(size)])
+
+    # verification: every write is committed, within the batch limit
+    assert fake_db.documents == {"docs/old": {"uid": "old"}, **{f"docs/d{i}": {"uid": f"d{i}"} for i in range(size)}}
+    assert count == len(batches)
+    assert fake_db.batches == batches
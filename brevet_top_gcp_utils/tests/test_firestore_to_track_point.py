@@ -1,7 +1,8 @@
+import numpy as np
 import pytest
 from google.cloud.firestore_v1 import GeoPoint
 
-from brevet_top_gcp_utils import firestore_to_track_point
+from brevet_top_gcp_utils import firestore_to_track, firestore_to_track_point
 from brevet_top_strava.track_point import StravaTrackPoint
 
 
@@ -18,3 +19,16 @@ from brevet_top_strava.track_point import StravaTrackPoint
 )
 def test_firestore_to_track_point(data: dict, point: StravaTrackPoint):
     assert firestore_to_track_point(data) == point
+
+
+def test_firestore_to_track():
+    # setup
+    points = [{}, {"distance": 0}, {"distance": 12.3, "coordinates": GeoPoint(60, 30)}, {"coordinates": GeoPoint(1, 2)}]
+
+    # action
+    track = firestore_to_track(points)
+
+    # verification
+    assert track.dtype == np.float64
+    assert track.tolist() == [list(firestore_to_track_point(point)) for point in points]
+    assert firestore_to_track([]).shape == (0, 4)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from google.cloud.firestore_v1 import GeoPoint
+
+from brevet_top_gcp_utils import BREVET_ALIGNMENT, BREVET_EXPORT, BREVET_METADATA, encode_track, get_brevet
+from brevet_top_gcp_utils.testing import FakeClient
+
+TRACK = np.zeros(shape=(20000, 4))
+TRACK[:, 0] = np.linspace(60, 61, 20000)
+TRACK[:, 3] = np.linspace(0, 200000, 20000)
+
+
+@pytest.fixture
+def db(fake_db: FakeClient) -> FakeClient:
+    fake_db.documents["brevets/b1"] = {
+        "uid": "b1",
+        "name": "Test 200",
+        "length": 200,
+        "mapUrl": "https://www.plotaroute.com/route/1",
+        "checkpoints": [{"uid": "cp1", "coordinates": GeoPoint(60, 30), "distance": 0}],
+        "short_track": [{"distance": 0, "coordinates": GeoPoint(60, 30)}] * 100,
+        "trackData": encode_track(TRACK),
+        "track": [{"distance": distance, "coordinates": GeoPoint(60, 30)} for distance in TRACK[:, 3]],
+        "results": {"r1": {"uid": "r1", "checkins": [None]}},
+    }
+    return fake_db
+
+
+@pytest.mark.parametrize(
+    ("fields", "keys"),
+    [
+        (None, {"uid", "name", "length", "mapUrl", "checkpoints", "short_track", "trackData", "track", "results"}),
+        (BREVET_EXPORT, {"uid", "name", "length", "mapUrl", "checkpoints", "track", "trackData", "results"}),
+        (BREVET_ALIGNMENT, {"uid", "name", "checkpoints", "short_track"}),
+        (BREVET_METADATA, {"uid", "name", "length", "mapUrl"}),
+    ],
+)
+def test_get_brevet(db: FakeClient, fields: tuple, keys: set):
+    # action
+    brevet = get_brevet(db.document("brevets/b1"), fields)
+
+    # verification: the stored values of the fields only, in a single read
+    assert set(brevet) == keys
+    assert brevet == {key: value for key, value in db.documents["brevets/b1"].items() if key in keys}
+    assert db.round_trips == 1
+
+
+def test_get_brevet_track(db: FakeClient):
+    # action
+    sizes = {}
+    for name, fields in [("full", None), ("alignment", BREVET_ALIGNMENT), ("metadata", BREVET_METADATA)]:
+        db.reset()
+        get_brevet(db.document("brevets/b1"), fields)
+        sizes[name] = db.bytes
+
+    # verification: the track is left on the server
+    assert sizes["metadata"] < 200
+    assert sizes["alignment"] < sizes["full"] / 50
+
+
+def test_get_brevet_missing(db: FakeClient):
+    # verification
+    assert get_brevet(db.document("brevets/none")) is None
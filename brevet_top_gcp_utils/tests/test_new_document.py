@@ -0,0 +1,29 @@
+from brevet_top_gcp_utils import create_document, new_document, write_batches
+from brevet_top_gcp_utils.testing import FakeClient
+
+
+def test_create_document(fake_db: FakeClient):
+    # action
+    uid = create_document("riders/r1/barcodes", {"code": "cp1"}, db=fake_db)
+
+    # verification: the uid is embedded, in a single write
+    assert fake_db.documents == {f"riders/r1/barcodes/{uid}": {"code": "cp1", "uid": uid}}
+    assert fake_db.writes == 1
+
+
+def test_new_document_batch(fake_db: FakeClient):
+    # setup
+    brevet, brevet_data = new_document(fake_db.collection("brevets"), {"name": "Test 200"})
+    writes = [new_document(brevet.collection("checkpoints"), {"distance": i * 50}) for i in range(5)]
+
+    # action
+    write_batches(fake_db, [(brevet, brevet_data)] + writes)
+
+    # verification: the brevet and its checkpoints in one commit
+    assert fake_db.documents[brevet.path] == {"name": "Test 200", "uid": brevet.id}
+    assert [fake_db.documents[ref.path] for ref, _ in writes] == [
+        {"distance": i * 50, "uid": ref.id} for i, (ref, _) in enumerate(writes)
+    ]
+    assert all(ref.path.startswith(f"{brevet.path}/checkpoints/") for ref, _ in writes)
+    assert len({ref.id for ref, _ in writes}) == 5
+    assert fake_db.batches == [6]
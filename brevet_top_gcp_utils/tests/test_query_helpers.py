@@ -0,0 +1,93 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from brevet_top_gcp_utils import BREVET_METADATA, get_dicts, query_dicts, query_subcollections
+from brevet_top_gcp_utils.testing import FakeClient, FakeQuery
+
+BARRIER_TIMEOUT = 10  # seconds, a query waits that long for a concurrent one
+
+
+@pytest.fixture
+def db(fake_db: FakeClient) -> FakeClient:
+    for i in range(10):
+        fake_db.documents[f"brevets/b{i}"] = {
+            "uid": f"b{i}",
+            "name": f"Brevet {i}",
+            "startDate": datetime(2024, 5, i + 1, tzinfo=timezone.utc),
+            "short_track": [{"distance": 0}] * 100,
+        }
+    fake_db.documents["private/r1"] = {"uid": "r1", "admin": True, "strava": {"athlete_id": 123}}
+    fake_db.documents["private/r2"] = {"uid": "r2", "strava": {"athlete_id": 123}}
+    fake_db.documents["private/r3"] = {"uid": "r3", "strava": {"athlete_id": 456}}
+    return fake_db
+
+
+def test_query_dicts(db: FakeClient):
+    # action
+    brevets = query_dicts(
+        db.collection("brevets").where("startDate", ">", datetime(2024, 5, 5, tzinfo=timezone.utc)),
+        BREVET_METADATA,
+    )
+    riders = query_dicts(db.collection("private").where("strava.athlete_id", "==", 123))
+
+    # verification: the data comes from the query snapshots, no document is read again
+    assert brevets == [
+        {key: db.documents[f"brevets/b{i}"][key] for key in ("uid", "name", "startDate")} for i in range(5, 10)
+    ]
+    assert riders == [db.documents["private/r1"], db.documents["private/r2"]]
+    assert db.round_trips == 2
+
+
+def test_get_dicts(db: FakeClient):
+    # action
+    rider, brevet, missing = get_dicts(db, ["private/r1", "brevets/b3", "brevets/none"], ["uid", "admin"])
+
+    # verification: a single batched read
+    assert rider == {"uid": "r1", "admin": True}
+    assert brevet == {"uid": "b3"}
+    assert missing is None
+    assert db.round_trips == 1
+
+
+def test_query_subcollections(db: FakeClient, monkeypatch: pytest.MonkeyPatch):
+    # setup
+    for i in range(10):
+        for j in range(i % 3):
+            db.documents[f"brevets/b{i}/checkpoints/r{j}"] = {"uid": f"r{j}", "time": [i], "name": "Rider"}
+    stream = FakeQuery.stream
+    # a query passes only when another one is running at the same time, sequential queries break the barrier
+    barrier = threading.Barrier(2, timeout=BARRIER_TIMEOUT)
+
+    def paired_stream(query: FakeQuery):
+        barrier.wait()
+        return stream(query)
+
+    monkeypatch.setattr(FakeQuery, "stream", paired_stream)
+    references = [db.document(f"brevets/b{i}") for i in range(10)]
+
+    # action
+    checkins = query_subcollections(references, "checkpoints", ["uid", "time"])
+
+    # verification: the selected fields of every subcollection, queried concurrently
+    assert checkins == [[{"uid": f"r{j}", "time": [i]} for j in range(i % 3)] for i in range(10)]
+    assert query_subcollections([], "checkpoints") == []
+    assert not barrier.broken
+    assert db.round_trips == 10
+
+
+def test_query_subcollections_filters(db: FakeClient):
+    # setup
+    for i in range(3):
+        for j in range(5):
+            db.documents[f"brevets/b{i}/checkpoints/c{i}{j}"] = {"uid": f"r{j}", "time": [i]}
+
+    # action
+    checkins = query_subcollections(
+        [db.document(f"brevets/b{i}") for i in range(3)], "checkpoints", ["uid"], filters=[("uid", "in", ["r1", "r3"])]
+    )
+
+    # verification
+    assert checkins == [[{"uid": "r1"}, {"uid": "r3"}]] * 3
+    assert db.round_trips == 3
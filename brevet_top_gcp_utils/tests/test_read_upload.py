@@ -0,0 +1,78 @@
+import io
+import json
+from base64 import b64encode
+from types import SimpleNamespace
+
+import pytest
+
+from brevet_top_gcp_utils.upload import read_upload
+
+TRACK = b"<gpx></gpx>"
+
+
+class Params(dict):
+    def to_dict(self) -> dict:
+        return dict(self)
+
+
+def make_request(mimetype: str, body: bytes = b"", form=None, files=None, args=None, content_length=None):
+    return SimpleNamespace(
+        is_json=mimetype == "application/json",
+        get_json=lambda: json.loads(body),
+        mimetype=mimetype,
+        form=Params(form or {}),
+        files=files or {},
+        args=Params(args or {}),
+        stream=io.BytesIO(body),
+        content_length=content_length,
+    )
+
+
+@pytest.mark.parametrize("prefix", ["", "data:application/octet-stream;base64,"])
+def test_read_upload_json(prefix: str):
+    # setup
+    track = prefix + b64encode(TRACK).decode()
+    request = make_request("application/json", json.dumps({"data": {"brevetUid": "b1", "track": track}}).encode())
+
+    # action
+    data, stream = read_upload(request)
+
+    # verification
+    assert data["brevetUid"] == "b1"
+    assert stream.read() == TRACK
+
+
+def test_read_upload_json_no_track():
+    # action
+    data, stream = read_upload(make_request("application/json", json.dumps({"data": {"brevetUid": "b1"}}).encode()))
+
+    # verification
+    assert data == {"brevetUid": "b1"}
+    assert stream is None
+
+
+def test_read_upload_multipart():
+    # setup
+    files = {"track": SimpleNamespace(stream=io.BytesIO(TRACK))}
+    request = make_request("multipart/form-data", form={"brevetUid": "b1"}, files=files)
+
+    # action
+    data, stream = read_upload(request)
+
+    # verification
+    assert data == {"brevetUid": "b1"}
+    assert stream.read() == TRACK
+
+
+@pytest.mark.parametrize("empty", [False, True])
+def test_read_upload_raw(empty: bool):
+    # setup
+    body, content_length = (b"", 0) if empty else (TRACK, None)
+    request = make_request("application/octet-stream", body, args={"brevetUid": "b1"}, content_length=content_length)
+
+    # action
+    data, stream = read_upload(request)
+
+    # verification
+    assert data == {"brevetUid": "b1"}
+    assert (stream is None) if empty else (stream.read() == TRACK)
@@ -0,0 +1,151 @@
+import time
+
+from google.api_core.exceptions import AlreadyExists
+
+from brevet_top_gcp_utils import RESULTS_DIRTY, ResultsTrigger, TaskResultsTrigger
+from brevet_top_gcp_utils.testing import FakeClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Queue:
+    """Keeps the scheduled tasks by name, the same as Cloud Tasks rejects a known name"""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def __call__(self, brevet_uid: str, task_name: str, run_at: float):
+        if task_name in self.tasks:
+            raise AlreadyExists(f"Task {task_name} exists")
+        self.tasks[task_name] = (brevet_uid, run_at)
+
+
+def test_results_trigger_synchronous():
+    # setup
+    calls = []
+    trigger = ResultsTrigger(lambda brevet_uid, rider_uids: calls.append((brevet_uid, rider_uids)))
+
+    # action
+    made = [trigger.request("b1", ["r1"]), trigger.request("b1", ["r2"]), trigger.request("b2")]
+
+    # verification: the zero interval falls back to a call every time
+    assert made == [True, True, True]
+    assert calls == [("b1", ["r1"]), ("b1", ["r2"]), ("b2", [])]
+    assert trigger.pending() == []
+
+
+def test_results_trigger_coalesce():
+    # setup
+    calls = []
+    clock = Clock()
+    trigger = ResultsTrigger(
+        lambda brevet_uid, rider_uids: calls.append((brevet_uid, rider_uids)),
+        interval=60,
+        clock=clock,
+        background=False,
+    )
+
+    # action: a finish rush of 300 riders within 5 minutes
+    for i in range(300):
+        clock.now = i
+        trigger.request("b1", [f"r{i % 150:03d}"])
+    trigger.request("b2", ["r998"])
+    trigger.request("b2", ["r999"])
+    flushed = trigger.flush()
+    clock.now = 400
+    late = trigger.flush(["b1"])
+
+    # verification: at most one call per brevet per minute, no rider is lost
+    assert flushed == 0
+    assert late == 1
+    assert [call[0] for call in calls] == ["b1"] * 5 + ["b2", "b1"]
+    assert [len(call[1]) for call in calls[:5]] == [1, 60, 60, 60, 60]
+    assert calls[-1][1] == sorted(f"r{i % 150:03d}" for i in range(241, 300))
+    assert trigger.pending() == ["b2"]
+    assert trigger.flush(force=True) == 1
+    assert calls[-1] == ("b2", ["r999"])
+
+
+def test_results_trigger_background():
+    # setup
+    calls = []
+    trigger = ResultsTrigger(lambda brevet_uid, rider_uids: calls.append((brevet_uid, rider_uids)), interval=0.1)
+
+    # action
+    trigger.request("b1", ["r1"])
+    trigger.request("b1", ["r2"])
+    trigger.request("b1", ["r3"])
+    time.sleep(0.3)
+
+    # verification: the trailing call is made by the timer
+    assert calls == [("b1", ["r1"]), ("b1", ["r2", "r3"])]
+    assert trigger.pending() == []
+
+
+def test_task_results_trigger(fake_db: FakeClient):
+    # setup
+    calls = []
+    clock = Clock()
+    queue = Queue()
+    fake_db.documents.update({"brevets/b1": {"uid": "b1"}, "brevets/b2": {"uid": "b2"}})
+    trigger = TaskResultsTrigger(
+        fake_db, lambda brevet_uid, rider_uids: calls.append((brevet_uid, rider_uids)), queue, interval=60, clock=clock
+    )
+
+    # action: a finish rush of 300 riders within 5 minutes, each request may come to another instance
+    for i in range(300):
+        clock.now = 1000 + i
+        trigger.request("b1", [f"r{i % 150:03d}"])
+    trigger.request("b2", ["r999"])
+    full = trigger.request("b2")
+
+    # verification: a task per brevet per minute, every rider is marked
+    assert full
+    assert calls == [("b2", [])]
+    assert queue.tasks == {
+        **{f"results-b1-{window}": ("b1", window * 60) for window in range(17, 23)},
+        "results-b2-22": ("b2", 1320),
+    }
+    assert sorted(fake_db.documents[f"{RESULTS_DIRTY}/b1"]["riders"]) == [f"r{i:03d}" for i in range(150)]
+    assert list(fake_db.documents[f"{RESULTS_DIRTY}/b2"]["riders"]) == ["r999"]
+    # the brevet documents are not written, so the brevet triggers do not fire
+    assert fake_db.documents["brevets/b1"] == {"uid": "b1"}
+
+
+def test_task_results_trigger_renew(fake_db: FakeClient):
+    # setup
+    trigger = TaskResultsTrigger(fake_db, lambda brevet_uid, rider_uids: None, Queue(), interval=60, clock=Clock())
+
+    # action
+    trigger.request("b1", ["r1"])
+    first = fake_db.documents[f"{RESULTS_DIRTY}/b1"]["riders"]["r1"]
+    trigger.request("b1", ["r2"])
+    trigger.request("b1", ["r1"])
+
+    # verification: a repeated request renews the rider's mark, the other marks are kept
+    marks = fake_db.documents[f"{RESULTS_DIRTY}/b1"]["riders"]
+    assert sorted(marks) == ["r1", "r2"]
+    assert first < marks["r2"] < marks["r1"]
+
+
+def test_task_results_trigger_synchronous(fake_db: FakeClient):
+    # setup
+    calls = []
+    queue = Queue()
+    fake_db.documents.update({"brevets/b1": {"uid": "b1"}})
+    trigger = TaskResultsTrigger(fake_db, lambda brevet_uid, rider_uids: calls.append((brevet_uid, rider_uids)), queue)
+
+    # action
+    made = [trigger.request("b1", ["r1"]), trigger.request("b1", ["r2"])]
+
+    # verification: the zero interval falls back to a call every time, nothing is stored
+    assert made == [True, True]
+    assert calls == [("b1", ["r1"]), ("b1", ["r2"])]
+    assert queue.tasks == {}
+    assert fake_db.documents == {"brevets/b1": {"uid": "b1"}}
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from google.cloud.firestore_v1 import GeoPoint
+
+from brevet_top_gcp_utils import decode_track, encode_track, read_track_field, route_track_fields
+from brevet_top_plot_a_route import RoutePoint
+
+COUNTER = 30000
+
+
+def make_route(size: int) -> np.ndarray:
+    index = np.arange(size, dtype=np.float64)
+    track = np.zeros(shape=(size, 4), dtype=np.float64)
+    track[:, 0] = np.round(60 + index * 2e-4 + np.sin(index / 40) * 2e-3, 6)
+    track[:, 1] = np.round(30 + index * 2e-4 + np.cos(index / 75) * 4e-3, 6)
+    track[:, 3] = index * 31.7
+    return track
+
+
+@pytest.mark.parametrize("size", [0, 1, COUNTER])
+def test_encode_track(size: int):
+    # setup
+    track = make_route(size)
+
+    # action
+    data = encode_track(track)
+    result = decode_track(data)
+
+    # verification
+    assert result.shape == (size, 4)
+    assert np.allclose(result[:, 0:2], track[:, 0:2], rtol=0, atol=5e-7)
+    assert np.allclose(result[:, 3], track[:, 3], rtol=0, atol=5e-3)
+    assert len(data) < 8 * size + 32
+
+
+def test_encode_track_negative():
+    # setup
+    track = [(-33.9, 151.2, 0, 0), (-33.8, -179.9, 0, 12.34), (89.9, 179.9, 0, 1.5e6)]
+
+    # verification
+    assert np.allclose(decode_track(encode_track(track)), np.array(track) * [1, 1, 0, 1])
+
+
+def test_decode_track_version():
+    with pytest.raises(ValueError) as error:
+        decode_track(b"\x02" + encode_track([])[1:])
+    assert "Unsupported track encoding 2" in str(error)
+
+
+def test_read_track_field():
+    # setup
+    track = make_route(3)
+    points = [{"distance": point[3], "coordinates": GeoPoint(point[0], point[1])} for point in track.tolist()]
+
+    # verification
+    assert np.allclose(read_track_field({"trackData": encode_track(track)}, "track"), track)
+    assert np.allclose(read_track_field({"track": points}, "track"), track)
+    assert np.allclose(read_track_field({"short_track": points}), track)
+    assert read_track_field({}).shape == (0, 4)
+    assert read_track_field({"track": None}, "track").shape == (0, 4)
+
+
+@pytest.mark.parametrize("store_points", [True, False])
+def test_route_track_fields(store_points: bool):
+    # setup
+    track = make_route(10)
+    short_track = [RoutePoint(lat=point[0], lng=point[1], distance=point[3]) for point in track[::3].tolist()]
+
+    # action
+    fields = route_track_fields(track, short_track, store_points=store_points)
+
+    # verification: the points are stored as they are, the packed copy is rounded
+    assert fields["short_track"] == [
+        {"distance": point.distance, "coordinates": GeoPoint(point.lat, point.lng)} for point in short_track
+    ]
+    assert np.allclose(decode_track(fields["trackData"]), track)
+    if store_points:
+        assert fields["track"] == [
+            {"distance": point[3], "coordinates": GeoPoint(point[0], point[1])} for point in track.tolist()
+        ]
+    else:
+        assert "track" not in fields
+
+
+def test_route_track_fields_default():
+    # action
+    fields = route_track_fields(make_route(10), [])
+
+    # verification: only the packed copy of the full track by default
+    assert sorted(fields) == ["short_track", "trackData"]
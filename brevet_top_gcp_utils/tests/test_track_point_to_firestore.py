@@ -0,0 +1,15 @@
+import numpy as np
+from google.cloud.firestore_v1 import GeoPoint
+
+from brevet_top_gcp_utils import track_point_to_firestore
+
+
+def test_track_point_to_firestore():
+    # setup
+    track = np.array([[60, 30, 0, 0], [60.1, 30.1, 0, 12428.2]], dtype=np.float64)
+
+    # verification
+    assert [track_point_to_firestore(point) for point in track] == [
+        {"coordinates": GeoPoint(latitude=60, longitude=30), "distance": 0},
+        {"coordinates": GeoPoint(latitude=60.1, longitude=30.1), "distance": 12428.2},
+    ]
@@ -1,4 +1,4 @@
-__version__ = '0.1.3'
+__version__ = '0.1.14'
 __author__ = 'Grigorii Batalov'
 __license__ = 'MIT'
 __description__ = 'NumPy utils for the brevet.top'
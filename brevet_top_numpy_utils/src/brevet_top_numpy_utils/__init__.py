@@ -1,3 +1,7 @@
 from .float_array import FloatArray  # noqa: F401
-from .main import (DISTANCE_FACTOR, build_array_from_fit, build_array_from_gpx, np_geo_distance,  # noqa: F401
-                   np_geo_distance_track)  # noqa: F401
+from .main import (DISTANCE_FACTOR, build_array_from_fit, build_array_from_gpx,  # noqa: F401
+                   np_cumulative_distance, np_geo_distance, np_geo_distance_matrix,  # noqa: F401
+                   np_geo_distance_steps, np_geo_distance_track)  # noqa: F401
+from .fit import FitRecordDecoder, build_array_from_fit_bytes  # noqa: F401
+from .gpx import GpxTrackDecoder, build_array_from_gpx_bytes  # noqa: F401
+from .ingest import TrackTooLarge, estimate_points, read_track  # noqa: F401
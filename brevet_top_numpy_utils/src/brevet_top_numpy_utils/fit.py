@@ -0,0 +1,270 @@
+from struct import Struct
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from .float_array import FloatArray
+from .main import GARMIN_FIT_BASE
+
+RECORD_MESG_NUM = 20
+TIMESTAMP_FIELD = 253
+# record field numbers
+POSITION_LAT_FIELD = 0
+POSITION_LONG_FIELD = 1
+DISTANCE_FIELD = 5
+DISTANCE_SCALE = 100
+
+FIT_EPOCH_S = 631065600  # 1989-12-31T00:00:00Z
+# FIT base types: numpy kind, size, invalid value, the same as in the SDK
+BASE_TYPES: Dict[int, Tuple[str, int, Union[int, float]]] = {
+    0x00: ("u", 1, 0xFF),  # enum
+    0x01: ("i", 1, 0x7F),  # sint8
+    0x02: ("u", 1, 0xFF),  # uint8
+    0x83: ("i", 2, 0x7FFF),  # sint16
+    0x84: ("u", 2, 0xFFFF),  # uint16
+    0x85: ("i", 4, 0x7FFFFFFF),  # sint32
+    0x86: ("u", 4, 0xFFFFFFFF),  # uint32
+    0x88: ("f", 4, 0xFFFFFFFF),  # float32
+    0x89: ("f", 8, 0xFFFFFFFFFFFFFFFF),  # float64
+    0x0A: ("u", 1, 0x00),  # uint8z
+    0x8B: ("u", 2, 0x0000),  # uint16z
+    0x8C: ("u", 4, 0x00000000),  # uint32z
+    0x0D: ("u", 1, 0xFF),  # byte
+    0x8E: ("i", 8, 0x7FFFFFFFFFFFFFFF),  # sint64
+    0x8F: ("u", 8, 0xFFFFFFFFFFFFFFFF),  # uint64
+    0x90: ("u", 8, 0x0000000000000000),  # uint64z
+}
+UINT32 = 0x86
+
+COMPRESSED_HEADER_MASK = 0x80
+DEFINITION_MASK = 0x40
+DEV_DATA_MASK = 0x20
+LOCAL_MESG_NUM_MASK = 0x0F
+COMPRESSED_TIME_MASK = 0x1F
+CRC_SIZE = 2
+
+
+class FieldLayout(NamedTuple):
+    offset: int  # from the message start, including the record header
+    dtype: np.dtype
+    invalid: Union[int, float]
+
+
+class Definition(NamedTuple):
+    size: int  # including the record header
+    record: bool
+    timestamp: Optional[Tuple[int, Struct]]
+    fields: Dict[int, FieldLayout]
+
+
+def _field_layout(offset: int, size: int, base_type: int, big_endian: bool) -> Optional[FieldLayout]:
+    """
+    Describe a single value field, arrays and unknown types are not supported.
+
+    :param offset: the field offset in the message
+    :param size: the field size
+    :param base_type: FIT base type
+    :param big_endian: the message architecture
+    :return: the layout or None
+    """
+    base = BASE_TYPES.get(base_type)
+    if base is None or base[1] != size:
+        return None
+    kind, _, invalid = base
+    return FieldLayout(offset, np.dtype(f"{'>' if big_endian else '<'}{kind}{size}"), invalid)
+
+
+class FitRecordDecoder:
+    """
+    Decode position, time and distance of FIT record messages, skipping everything else.
+    The data may be fed in chunks of any size, each call returns the points completed so far.
+    Chained FIT files, developer fields, both architectures and compressed timestamp headers are supported,
+    CRC is not checked.
+    """
+
+    def __init__(self) -> None:
+        self._tail = b""
+        self._definitions: Dict[int, Definition] = {}
+        self._remaining = 0  # data bytes left in the current file
+        self._crc = False  # expecting the file CRC
+        self._timestamp: Optional[int] = None  # the last known timestamp
+
+    def feed(self, chunk: bytes) -> FloatArray:
+        """
+        Decode the next piece of data.
+
+        :param chunk: the next FIT data bytes
+        :return: array of [latitude, longitude, timestamp, distance]
+        """
+        data = self._tail + chunk if self._tail else chunk
+        position, records = self._walk(data)
+        points = self._gather(data, records)
+        self._tail = bytes(data[position:])
+        return points
+
+    def close(self) -> FloatArray:
+        """
+        Finish decoding, an incomplete last message is dropped the same way as the SDK does.
+
+        :return: array of the remaining points (always empty)
+        """
+        self._tail = b""
+        return np.empty(shape=(0, 4), dtype=np.float64)
+
+    def _walk(self, data: bytes) -> Tuple[int, List[Tuple[Definition, int, float]]]:
+        """
+        Walk message headers till the end of the complete messages.
+
+        :param data: the buffer
+        :return: the unprocessed data offset and found records (definition, offset, timestamp)
+        """
+        records: List[Tuple[Definition, int, float]] = []
+        position, length = 0, len(data)
+        while position < length:
+            if self._crc:
+                if position + CRC_SIZE > length:
+                    break
+                position += CRC_SIZE
+                self._crc = False
+                continue
+
+            if self._remaining == 0:
+                header_size = data[position]
+                if position + header_size > length:
+                    break
+                if header_size not in (12, 14) or data[position + 8 : position + 12] != b".FIT":
+                    raise ValueError("The file is not a valid fit file")
+                self._remaining = int.from_bytes(data[position + 4 : position + 8], "little")
+                self._crc = self._remaining == 0
+                position += header_size
+                continue
+
+            header = data[position]
+            if header & DEFINITION_MASK and not header & COMPRESSED_HEADER_MASK:
+                size = self._define(data, position)
+                if size == 0:
+                    break
+            else:
+                compressed = header & COMPRESSED_HEADER_MASK
+                local_mesg_num = (header >> 5) & 0x03 if compressed else header & LOCAL_MESG_NUM_MASK
+                if local_mesg_num not in self._definitions:
+                    raise ValueError("Invalid local message number")
+                definition = self._definitions[local_mesg_num]
+                size = definition.size
+
+            if position + size > length:
+                break
+
+            if not header & DEFINITION_MASK or header & COMPRESSED_HEADER_MASK:
+                timestamp = np.nan
+                if header & COMPRESSED_HEADER_MASK:
+                    if self._timestamp is not None:
+                        offset = header & COMPRESSED_TIME_MASK
+                        last = self._timestamp
+                        self._timestamp = (last & ~COMPRESSED_TIME_MASK) + offset
+                        if offset < last & COMPRESSED_TIME_MASK:
+                            self._timestamp += COMPRESSED_TIME_MASK + 1
+                        timestamp = self._timestamp + FIT_EPOCH_S
+                elif definition.timestamp is not None:
+                    offset, reader = definition.timestamp
+                    (value,) = reader.unpack_from(data, position + offset)
+                    if value != BASE_TYPES[UINT32][2]:
+                        self._timestamp = value
+                        timestamp = value + FIT_EPOCH_S
+                if definition.record:
+                    records.append((definition, position, timestamp))
+
+            position += size
+            self._remaining -= size
+            self._crc = self._remaining <= 0
+            if self._crc:
+                self._remaining = 0
+        return position, records
+
+    def _define(self, data: bytes, position: int) -> int:
+        """
+        Parse a definition message.
+
+        :param data: the buffer
+        :param position: the message offset
+        :return: the definition message size or 0 if incomplete
+        """
+        header = data[position]
+        if position + 6 > len(data):
+            return 0
+        big_endian = data[position + 2] == 1
+        global_mesg_num = int.from_bytes(data[position + 3 : position + 5], "big" if big_endian else "little")
+        num_fields = data[position + 5]
+        size = 6 + num_fields * 3
+        num_dev_fields = 0
+        if header & DEV_DATA_MASK:
+            if position + size + 1 > len(data):
+                return 0
+            num_dev_fields = data[position + size]
+            size += 1 + num_dev_fields * 3
+        if position + size > len(data):
+            return 0
+
+        fields: Dict[int, FieldLayout] = {}
+        timestamp = None
+        offset = 1  # the record header
+        for i in range(position + 6, position + 6 + num_fields * 3, 3):
+            field_id, field_size, base_type = data[i], data[i + 1], data[i + 2]
+            layout = _field_layout(offset, field_size, base_type, big_endian)
+            if layout is not None:
+                if field_id == TIMESTAMP_FIELD and layout.dtype.kind == "u" and layout.dtype.itemsize == 4:
+                    timestamp = (offset, Struct(">I" if big_endian else "<I"))
+                fields[field_id] = layout
+            offset += field_size
+        for i in range(position + 7 + num_fields * 3, position + size, 3):
+            offset += data[i + 1]
+
+        self._definitions[header & LOCAL_MESG_NUM_MASK] = Definition(
+            offset, global_mesg_num == RECORD_MESG_NUM, timestamp, fields
+        )
+        return size
+
+    @staticmethod
+    def _gather(data: bytes, records: List[Tuple[Definition, int, float]]) -> FloatArray:
+        """
+        Extract the record fields with a single vectorized read per definition.
+
+        :param data: the buffer
+        :param records: found records (definition, offset, timestamp)
+        :return: array of [latitude, longitude, timestamp, distance]
+        """
+        points: FloatArray = np.zeros(shape=(len(records), 4), dtype=np.float64)
+        if not records:
+            return points
+        points[:, 2] = [timestamp for _, _, timestamp in records]
+
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        definitions = [definition for definition, _, _ in records]
+        offsets = np.array([position for _, position, _ in records])
+        for definition in {id(definition): definition for definition in definitions}.values():
+            rows = np.fromiter((d is definition for d in definitions), dtype=bool, count=len(definitions))
+            for column, field_id in ((0, POSITION_LAT_FIELD), (1, POSITION_LONG_FIELD), (3, DISTANCE_FIELD)):
+                layout = definition.fields.get(field_id)
+                if layout is None:
+                    continue
+                index = offsets[rows, np.newaxis] + layout.offset + np.arange(layout.dtype.itemsize)
+                values = buffer[index].view(layout.dtype).ravel()
+                # invalid values are missing, the same as in the SDK
+                valid = values != layout.invalid
+                target = np.flatnonzero(rows)[valid]
+                if field_id == DISTANCE_FIELD:
+                    # the same rounding as of the SDK path: scale to meters first, then to kilometers
+                    points[target, column] = values[valid] / DISTANCE_SCALE / 1000
+                else:
+                    points[target, column] = values[valid] / GARMIN_FIT_BASE
+        return points
+
+
+def build_array_from_fit_bytes(data: bytes) -> FloatArray:
+    """
+    Compose a track sequence out of FIT data without the SDK decoder.
+
+    :param data: the track data from the FIT file
+    :return: array of [latitude, longitude, timestamp, distance]
+    """
+    return FitRecordDecoder().feed(data)
@@ -0,0 +1,181 @@
+import re
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+from xml.etree.ElementTree import XMLParser
+
+import numpy as np
+
+from .float_array import FloatArray
+
+CHUNK_SIZE = 1 << 16  # bytes
+
+# the GPX time formats accepted by gpxpy
+TIMESTAMP = re.compile(
+    r"^([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})[T ]([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})(\.[0-9]{1,15})?"
+    r"(Z|[+\-\u2212][0-9]{2}:?(?:[0-9]{2})?)?$"
+)
+
+
+def _parse_zone(text: Optional[str]) -> Optional[timezone]:
+    if not text:
+        return None
+    if text == "Z":
+        return timezone.utc
+    digits = text[1:].replace(":", "")
+    minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+    return timezone(timedelta(minutes=-minutes if text[0] in "-\u2212" else minutes))
+
+
+def _parse_time(text: Optional[str]) -> Optional[datetime]:
+    """
+    Convert a GPX time to a datetime, a time without the timezone is local as in gpxpy.
+
+    :param text: the time element text
+    :return: the datetime or None if the time is missing or invalid
+    """
+    match = TIMESTAMP.match(text or "")
+    if match is None:
+        return None
+    fraction = (match.group(7) or ".")[1:7]
+    try:
+        return datetime(
+            *(int(match.group(i)) for i in range(1, 7)),
+            int(fraction + "0" * (6 - len(fraction))),
+            tzinfo=_parse_zone(match.group(8)),
+        )
+    except ValueError:
+        return None
+
+
+def _parse_timestamp(text: Optional[str], minutes: Dict[Tuple[str, Optional[str]], Optional[int]]) -> float:
+    """
+    Convert a GPX time to a timestamp the same way as gpxpy does, creating a datetime once a minute.
+
+    :param text: the time element text
+    :param minutes: a cache of timestamps (seconds) by the date, hours, minutes and the timezone
+    :return: the timestamp or NaN
+    """
+    match = TIMESTAMP.match(text or "")
+    if match is None or int(match.group(6)) > 59:
+        time = _parse_time(text)
+        return time.timestamp() if time else np.nan
+
+    key = (text[: match.end(5)], match.group(8))
+    if key not in minutes:
+        time = _parse_time(f"{key[0]}:00{key[1] or ''}")
+        minutes[key] = int(time.timestamp()) if time else None
+    base = minutes[key]
+    if base is None:
+        return np.nan
+    fraction = (match.group(7) or ".")[1:7]
+    micro = int(fraction + "0" * (6 - len(fraction)))
+    # the same rounding as of timedelta.total_seconds()
+    return ((base + int(match.group(6))) * 10**6 + micro) / 10**6
+
+
+class _TrackTarget:
+    """
+    XMLParser target collecting <trkpt> attributes and the <time> / <cmt> text into float64 columns.
+    No element tree is being built.
+    """
+
+    def __init__(self) -> None:
+        self.columns = [array("d") for _ in range(4)]
+        self._minutes: Dict[Tuple[str, Optional[str]], Optional[int]] = {}
+        self._point: Optional[Tuple[float, float]] = None
+        self._depth = 0  # inside the current point
+        self._field: Optional[str] = None
+        self._text: List[str] = []
+        self._time: Optional[str] = None
+        self._comment: Optional[str] = None
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        # skip the namespace
+        name = tag.rpartition("}")[2]
+        if self._point is None:
+            if name == "trkpt":
+                self._point = (float(attrib["lat"]), float(attrib["lon"]))
+                self._depth, self._time, self._comment = 0, None, None
+            return
+        self._depth += 1
+        # the first matching child wins, the same as in gpxpy
+        if self._depth == 1 and (name == "time" and self._time is None or name == "cmt" and self._comment is None):
+            self._field, self._text = name, []
+
+    def data(self, text: str) -> None:
+        if self._field is not None:
+            self._text.append(text)
+
+    def end(self, tag: str) -> None:
+        if self._point is None:
+            return
+        if self._depth == 0:
+            latitude, longitude, timestamp, distance = self.columns
+            latitude.append(self._point[0])
+            longitude.append(self._point[1])
+            timestamp.append(_parse_timestamp(self._time, self._minutes))
+            distance.append(float(self._comment or 0) / 1000)
+            self._point = None
+            return
+        if self._depth == 1 and self._field is not None:
+            if self._field == "time":
+                self._time = "".join(self._text)
+            else:
+                self._comment = "".join(self._text)
+            self._field = None
+        self._depth -= 1
+
+    def close(self) -> None:
+        pass
+
+
+class GpxTrackDecoder:
+    """
+    Decode <trkpt> elements of GPX data without building the GPX object model.
+    The data may be fed in chunks of any size, each call returns the points completed so far.
+    """
+
+    def __init__(self) -> None:
+        self._target = _TrackTarget()
+        self._parser = XMLParser(target=self._target)
+
+    def _flush(self) -> FloatArray:
+        columns = self._target.columns
+        self._target.columns = [array("d") for _ in range(4)]
+        return np.stack([np.frombuffer(column, dtype=np.float64) for column in columns], axis=1)
+
+    def feed(self, chunk: bytes) -> FloatArray:
+        """
+        Decode the next piece of data.
+
+        :param chunk: the next GPX data bytes
+        :return: array of [latitude, longitude, timestamp, distance]
+        """
+        self._parser.feed(chunk)
+        return self._flush()
+
+    def close(self) -> FloatArray:
+        """
+        Finish decoding, raises a ParseError on incomplete data.
+
+        :return: array of the remaining points
+        """
+        self._parser.close()
+        return self._flush()
+
+
+def build_array_from_gpx_bytes(data: Union[bytes, BinaryIO], chunk_size: int = CHUNK_SIZE) -> FloatArray:
+    """
+    Compose a track sequence out of GPX data without building the GPX object model.
+    Reads <trkpt> elements one by one, the result is the same as of build_array_from_gpx.
+
+    :param data: the GPX file contents or a binary stream
+    :param chunk_size: the stream read size
+    :return: array of [latitude, longitude, timestamp, distance]
+    """
+    decoder = GpxTrackDecoder()
+    if isinstance(data, (bytes, bytearray)):
+        return np.concatenate((decoder.feed(data), decoder.close()))
+    parts = [decoder.feed(chunk) for chunk in iter(lambda: data.read(chunk_size), b"")]
+    return np.concatenate(parts + [decoder.close()])
@@ -0,0 +1,251 @@
+import zlib
+from itertools import chain
+from typing import BinaryIO, Iterator, List, Optional, Union
+from xml.etree.ElementTree import ParseError
+
+import numpy as np
+
+from .fit import FitRecordDecoder
+from .float_array import FloatArray
+from .gpx import CHUNK_SIZE, GpxTrackDecoder
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+HEADER_SIZE = 12  # enough to tell FIT from GPX
+# admission control
+FIT_POINT_SIZE = 32  # bytes per record, a typical 1 second recording
+GPX_POINT_SIZE = 150  # bytes per <trkpt>
+MAX_STRIDE = 64  # seconds
+# decompressed to compressed bytes, GPX and FIT tracks compress up to 20 times, a compression bomb - 1000 times
+MAX_COMPRESSION_RATIO = 100
+DECODE_ERRORS = (zlib.error, ParseError, KeyError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class _HeadStream:
+    """
+    A stream with the bytes already read put back in front.
+    """
+
+    def __init__(self, head: bytes, stream: BinaryIO) -> None:
+        self._head = head
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._stream.read(size)
+        if size < 0:
+            data, self._head = self._head + self._stream.read(), b""
+        else:
+            data, self._head = self._head[:size], self._head[size:]
+        return data
+
+
+class _CountingStream:
+    """
+    A stream counting the bytes read.
+    """
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.size = 0
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.size += len(data)
+        return data
+
+
+def _decompress(stream: BinaryIO, chunk_size: int, max_ratio: int = MAX_COMPRESSION_RATIO) -> Iterator[bytes]:
+    """
+    Read the stream in chunks, decompressing gzip or zstd data (picked by the magic bytes).
+
+    :param stream: a binary stream
+    :param chunk_size: the stream read size and the maximal decompressed piece size
+    :param max_ratio: the maximal number of decompressed bytes per a byte read (at least a chunk read)
+    :return: decompressed pieces of data
+    :raises TrackTooLarge: if the data decompresses more than max_ratio times
+
+    Uncompressed data is never refused, its size is bounded by the upload one.
+    """
+    counted = _CountingStream(stream)
+    total = 0
+    for data in _decompress_pieces(counted, chunk_size):
+        total += len(data)
+        if total > max_ratio * max(counted.size, chunk_size):
+            raise TrackTooLarge(f"Track data decompresses more than {max_ratio} times")
+        yield data
+
+
+def _decompress_pieces(stream: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    head = b""
+    while len(head) < len(ZSTD_MAGIC):
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        head += chunk
+    chunks = chain([head], iter(lambda: stream.read(chunk_size), b""))
+
+    if head.startswith(GZIP_MAGIC):
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            # keep the decompressed pieces small whatever the compression ratio is
+            while chunk:
+                yield decompressor.decompress(chunk, chunk_size)
+                chunk = decompressor.unconsumed_tail
+                if decompressor.eof:
+                    # the next member of a multi-member file
+                    yield decompressor.flush()
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        yield decompressor.flush()
+    elif head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstd compression is not supported")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            _HeadStream(head, stream), read_size=chunk_size, read_across_frames=True
+        )
+        # the output is bounded by the read size whatever the compression ratio is
+        yield from iter(lambda: reader.read(chunk_size), b"")
+    else:
+        yield from chunks
+
+
+def _decoder(head: bytes) -> Union[FitRecordDecoder, GpxTrackDecoder]:
+    """
+    Pick a track decoder by the file header.
+
+    :param head: the first decompressed bytes
+    :return: a new decoder
+    """
+    if head[8:12] == b".FIT":
+        return FitRecordDecoder()
+    if head.lstrip().startswith(b"<"):
+        return GpxTrackDecoder()
+    raise ValueError("Unsupported file type")
+
+
+class TrackTooLarge(ValueError):
+    pass
+
+
+def estimate_points(head: bytes, size: Optional[int]) -> Optional[int]:
+    """
+    Estimate the number of track points by the FIT header or the upload size.
+
+    :param head: the first decompressed bytes
+    :param size: the upload size in bytes, if known
+    :return: the estimate or None
+    """
+    if head[8:12] == b".FIT":
+        return int.from_bytes(head[4:8], "little") // FIT_POINT_SIZE
+    if size:
+        return size // GPX_POINT_SIZE
+    return None
+
+
+class _Decimator:
+    """
+    Keep the first point of every time stride (seconds), doubling the stride whenever the budget is exceeded.
+    The strides are powers of 2, so the points kept with a larger stride are a subset of the ones with a smaller.
+    """
+
+    def __init__(self, budget: int, estimate: Optional[int]) -> None:
+        self.budget = budget
+        # assuming 1 second recording for the estimate, the worst case
+        self.stride = 2 ** int(np.ceil(np.log2(estimate / budget))) if estimate and estimate > budget else 1
+        self._parts: List[FloatArray] = []
+        self._count = 0
+        self._last = np.nan  # the last kept time stride
+        self._end: Optional[FloatArray] = None  # the last point seen
+
+    def add(self, points: FloatArray) -> None:
+        if len(points) > 0:
+            self._end = points[-1]
+        kept = self._filter(points)
+        self._parts.append(kept)
+        self._count += len(kept)
+        while self._count > self.budget:
+            self.stride *= 2
+            if self.stride > MAX_STRIDE:
+                raise TrackTooLarge(f"More than {self.budget} points with {MAX_STRIDE} seconds between them")
+            self._last = np.nan
+            kept = self._filter(np.concatenate(self._parts))
+            self._parts, self._count = [kept], len(kept)
+
+    def result(self) -> FloatArray:
+        kept = np.concatenate(self._parts) if self._parts else np.empty(shape=(0, 4), dtype=np.float64)
+        # the finish is always kept
+        if self._end is not None and not np.array_equal(kept[-1], self._end, equal_nan=True):
+            kept = np.concatenate((kept, [self._end]))
+        return kept
+
+    def _filter(self, points: FloatArray) -> FloatArray:
+        if len(points) == 0:
+            return points
+        strides = np.floor(points[:, 2] / self.stride)
+        # points with no time are always kept (NaN is not equal to anything)
+        keep = strides != np.concatenate(([self._last], strides[:-1]))
+        self._last = strides[-1]
+        return points[keep]
+
+
+def read_track(
+    stream: BinaryIO,
+    chunk_size: int = CHUNK_SIZE,
+    budget: Optional[int] = None,
+    size: Optional[int] = None,
+    max_ratio: int = MAX_COMPRESSION_RATIO,
+) -> FloatArray:
+    """
+    Decode a GPX or FIT track from a stream, optionally gzip or zstd compressed.
+    The stream is read and decoded in chunks, so only the resulting points are kept in memory.
+    With a budget, the points are decimated on the fly by a time stride
+    chosen by the estimated size and doubled whenever the budget is exceeded.
+
+    :param stream: a binary stream (file, HTTP request body, etc.)
+    :param chunk_size: the stream read size
+    :param budget: the maximal number of points to return, None - no limit
+    :param size: the upload size in bytes (to estimate the number of points), if known
+    :param max_ratio: the maximal compression ratio, a compression bomb is refused early
+    :return: array of [latitude, longitude, timestamp, distance]
+    :raises TrackTooLarge: if the track does not fit into the budget even with the largest stride
+        or the data decompresses more than max_ratio times
+    :raises ValueError: on unsupported or broken data
+    """
+    parts: List[FloatArray] = []
+    decoder = None
+    decimator = None
+    head = b""
+    try:
+        for data in _decompress(stream, chunk_size, max_ratio):
+            if decoder is None:
+                head += data
+                if len(head) < HEADER_SIZE:
+                    continue
+                decoder, data = _decoder(head), head
+                if budget is not None:
+                    decimator = _Decimator(budget, estimate_points(head, size))
+            points = decoder.feed(data)
+            if decimator is None:
+                parts.append(points)
+            else:
+                decimator.add(points)
+
+        if decoder is None:
+            if not head:
+                return np.empty(shape=(0, 4), dtype=np.float64)
+            decoder = _decoder(head)
+            parts.append(decoder.feed(head))
+        if decimator is None:
+            parts.append(decoder.close())
+        else:
+            decimator.add(decoder.close())
+            parts.append(decimator.result())
+    except DECODE_ERRORS as error:
+        raise ValueError(f"Broken track data: {error}") from error
+    return np.concatenate(parts)
@@ -36,6 +36,30 @@ def np_geo_distance(
     )
 
 
+def np_geo_distance_matrix(
+    points: FloatArray,
+    track: FloatArray,
+    factor: np.float64 = DISTANCE_FACTOR,
+) -> FloatArray:
+    """
+    Calculate distances from each of the given points to each point of the track at once.
+    The same measure as of np_geo_distance, but close points give zero instead of NaN.
+
+    :param points: the subject points as a list of [latitude, longitude, altitude, distance from the start]
+    :param track: the track as a list of points
+    :param factor: "distance from the start" multiplier
+    :return: a matrix of distances, a row per subject point
+    """
+    point_latitude, point_longitude = radians(points.T[0:2, :, np.newaxis]).astype(np.float64)
+    latitude_radians, longitude_radians = radians(track.T[0:2]).astype(np.float64)
+
+    distance_shift = abs(track.T[3] - points.T[3, :, np.newaxis]) * factor
+    cosine = sin(point_latitude) * sin(latitude_radians) + cos(point_latitude) * cos(latitude_radians) * cos(
+        longitude_radians - point_longitude
+    )
+    return distance_shift + EARTH_RADIUS * arccos(np.clip(cosine, -1.0, 1.0))
+
+
 def np_geo_distance_track(
     source: FloatArray,
     target: FloatArray,
@@ -87,6 +111,43 @@ def build_array_from_gpx(data: GPX) -> FloatArray:
     return draft
 
 
+def np_geo_distance_steps(track: FloatArray) -> FloatArray:
+    """
+    Calculate distances between consecutive track points.
+    Note: altitude is being ignored.
+
+    :param track: the track as a list of points
+    :return: a list of distances, one less than the points
+    """
+    latitude_radians, longitude_radians = radians(track.T[0:2]).astype(np.float64)
+    # haversine, the arccos form loses precision on close points and gives a NaN on identical ones
+    haversine = (
+        sin(np.diff(latitude_radians) / 2) ** 2
+        + cos(latitude_radians[:-1]) * cos(latitude_radians[1:]) * sin(np.diff(longitude_radians) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(haversine, 1.0)))
+
+
+def np_cumulative_distance(track: FloatArray) -> FloatArray:
+    """
+    Fill in missing (zero) distances from the start.
+    Non-zero distances are kept as anchors, the following points continue from them.
+
+    :param track: the track as a list of points [latitude, longitude, timestamp, distance]
+    :return: the distance column
+    """
+    distance: FloatArray = track[:, 3].copy()
+    if len(track) < 2:
+        return distance
+    path: FloatArray = np.concatenate(([0.0], np.cumsum(np_geo_distance_steps(track))))
+    index = np.arange(len(track))
+    # the nearest anchor at or before each point, the first point is always one
+    anchors = np.maximum.accumulate(np.where((distance != 0) | (index == 0), index, 0))
+    missing = distance == 0
+    distance[missing] = distance[anchors[missing]] + path[missing] - path[anchors[missing]]
+    return distance
+
+
 def build_array_from_fit(data: bytes) -> FloatArray:
     """
     Compose a track sequence out of FIT data.
@@ -0,0 +1,106 @@
+import struct
+
+import numpy as np
+import pytest
+from garmin_fit_sdk.crc_calculator import CrcCalculator
+from garmin_fit_sdk.fit import BASE_TYPE_DEFINITIONS
+from garmin_fit_sdk.util import FIT_EPOCH_S
+
+from brevet_top_numpy_utils import FitRecordDecoder, build_array_from_fit, build_array_from_fit_bytes
+from brevet_top_numpy_utils import fit
+
+COUNTER = 20000
+START = 1000000000  # FIT time
+
+
+def definition(
+    local: int, global_mesg_num: int, fields: list, big_endian: bool = False, dev_fields: list = None
+) -> bytes:
+    header = 0x40 | local | (0x20 if dev_fields else 0)
+    data = struct.pack(">BBBHB" if big_endian else "<BBBHB", header, 0, int(big_endian), global_mesg_num, len(fields))
+    data += b"".join(bytes(field) for field in fields)
+    if dev_fields:
+        data += bytes([len(dev_fields)]) + b"".join(bytes(field) for field in dev_fields)
+    return data
+
+
+def fit_file(messages: bytes) -> bytes:
+    header = struct.pack("<BBHI4s", 14, 0x20, 2163, len(messages), b".FIT")
+    header += struct.pack("<H", CrcCalculator.calculate_crc(header, 0, 12))
+    data = header + messages
+    return data + struct.pack("<H", CrcCalculator.calculate_crc(data, 0, len(data)))
+
+
+def make_fit(size: int) -> bytes:
+    # timestamp, lat, long, heart rate, distance
+    messages = definition(0, 20, [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (3, 1, 0x02), (5, 4, 0x86)])
+    # event: timestamp, data
+    messages += definition(1, 21, [(253, 4, 0x86), (3, 4, 0x86)])
+    # big endian record with a developer field and no distance
+    messages += definition(2, 20, [(0, 4, 0x85), (1, 4, 0x85), (253, 4, 0x86)], True, [(0, 2, 0)])
+    for i in range(size):
+        latitude = 0x7FFFFFFF if i % 11 == 0 else int((60 + i * 1e-5) * 11930465)
+        longitude = int((30 + i * 2e-5) * 11930465)
+        if i % 7 == 0:
+            messages += struct.pack(">Biii", 2, latitude, longitude, START + i) + b"\x01\x02"
+        else:
+            distance = 0xFFFFFFFF if i % 13 == 0 else i * 537
+            messages += struct.pack("<BIiiBI", 0, START + i, latitude, longitude, 120, distance)
+        if i % 5 == 0:
+            messages += struct.pack("<BII", 1, START + i, i)
+    return fit_file(messages)
+
+
+@pytest.mark.parametrize("size", [1, COUNTER])
+def test_build_array_from_fit_bytes(size: int):
+    # setup
+    data = make_fit(size)
+
+    # action
+    track = build_array_from_fit_bytes(data)
+    expected = build_array_from_fit(data)
+
+    # verification
+    assert track.shape == (size, 4)
+    assert np.array_equal(track, expected)
+
+
+def test_fit_record_decoder_chunks():
+    # setup
+    data = make_fit(100) + make_fit(50)
+    decoder = FitRecordDecoder()
+
+    # action
+    track = np.concatenate([decoder.feed(data[i : i + 7]) for i in range(0, len(data), 7)])
+
+    # verification
+    assert np.array_equal(track, build_array_from_fit_bytes(data))
+    assert np.array_equal(track[:100], build_array_from_fit(make_fit(100)))
+
+
+def test_fit_record_decoder_compressed_timestamp():
+    # setup
+    messages = definition(0, 20, [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85)])
+    messages += definition(1, 20, [(0, 4, 0x85), (1, 4, 0x85)])
+    messages += struct.pack("<BIii", 0, START + 30, 0, 0)
+    # time offset 2 (wraps over 32 seconds) and 3
+    messages += struct.pack("<Bii", 0x80 | 0x20 | 2, 0, 0) + struct.pack("<Bii", 0x80 | 0x20 | 3, 0, 0)
+
+    # action
+    track = build_array_from_fit_bytes(fit_file(messages))
+
+    # verification
+    assert (track[:, 2] - START - 631065600).tolist() == [30, 34, 35]
+
+
+def test_base_types():
+    # setup
+    expected = {
+        base_type: ("f" if base["type_code"] in "fd" else "i" if base["signed"] else "u", base["size"], base["invalid"])
+        for base_type, base in BASE_TYPE_DEFINITIONS.items()
+        if base["type_code"] != "s"
+    }
+
+    # verification
+    assert fit.BASE_TYPES == expected
+    assert fit.FIT_EPOCH_S == FIT_EPOCH_S
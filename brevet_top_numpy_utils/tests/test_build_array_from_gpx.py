@@ -0,0 +1,85 @@
+import gpxpy
+import numpy as np
+import pytest
+
+from brevet_top_numpy_utils import build_array_from_gpx, build_array_from_gpx_bytes
+
+COUNTER = 20000
+
+
+def make_gpx(size: int) -> bytes:
+    points = "".join(
+        f'<trkpt lat="{60 + i * 1e-5:.7f}" lon="{30 + i * 2e-5:.7f}"><ele>12.5</ele>'
+        f"<time>2021-08-14T04:{i // 60 % 60:02}:{i % 60:02}{'.250' if i % 3 else ''}"
+        f"{'Z' if i % 2 else '+03:00' if i % 7 else ''}</time>"
+        f"{f'<cmt>{i * 1.7:.1f}</cmt>' if i % 5 else ''}"
+        "<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>120</gpxtpx:hr></gpxtpx:TrackPointExtension></extensions>"
+        "</trkpt>"
+        for i in range(size)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1"'
+        ' xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">'
+        '<wpt lat="1.0" lon="2.0"><time>2021-08-14T04:00:00Z</time></wpt>'
+        f"<trk><trkseg>{points}</trkseg><trkseg>{points}</trkseg></trk>"
+        "</gpx>"
+    ).encode()
+
+
+@pytest.mark.parametrize("size", [1, COUNTER])
+def test_build_array_from_gpx_bytes(size: int):
+    # setup
+    data = make_gpx(size)
+
+    # action
+    track = build_array_from_gpx_bytes(data)
+    expected = build_array_from_gpx(gpxpy.parse(data))
+
+    # verification
+    assert track.shape == (size * 2, 4)
+    assert np.array_equal(track, expected)
+
+
+def make_point_gpx(time: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        f'<trk><trkseg><trkpt lat="60.0" lon="30.0"><time>{time}</time></trkpt></trkseg></trk>'
+        "</gpx>"
+    ).encode()
+
+
+@pytest.mark.parametrize(
+    "time",
+    [
+        "2021-08-14T04:05:06Z",
+        "2021-08-14T04:05:06.25+03:00",
+        "2021-8-4 4:05:06.1234567+0300",
+        "2021-08-14T04:05:06-03",
+        "2021-08-14T04:05:06\u221203:30",
+        "2021-08-14T04:05:06",
+    ],
+)
+def test_build_array_from_gpx_bytes_time(time: str):
+    # setup
+    data = make_point_gpx(time)
+
+    # action
+    track = build_array_from_gpx_bytes(data)
+    expected = build_array_from_gpx(gpxpy.parse(data))
+
+    # verification
+    assert np.array_equal(track, expected)
+
+
+@pytest.mark.parametrize("time", ["2021-08-14T04:05:60Z", "2021-02-30T04:05:06Z", "2021-08-14", ""])
+def test_build_array_from_gpx_bytes_invalid_time(time: str):
+    # setup
+    data = make_point_gpx(time)
+
+    # action
+    track = build_array_from_gpx_bytes(data)
+
+    # verification
+    assert np.array_equal(track, [[60.0, 30.0, np.nan, 0.0]], equal_nan=True)
@@ -0,0 +1,71 @@
+from math import acos, cos, radians, sin
+
+import numpy as np
+
+from brevet_top_numpy_utils import np_cumulative_distance
+
+COUNTER = 30000
+
+
+def geo_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    if lat1 == lat2 and lon1 == lon2:
+        return 0
+    return 6371e3 * acos(
+        sin(radians(lat1)) * sin(radians(lat2)) + cos(radians(lat1)) * cos(radians(lat2)) * cos(radians(lon2 - lon1))
+    )
+
+
+def fill_distance(track: np.ndarray) -> np.ndarray:
+    draft = track.copy()
+    for i in range(1, len(draft)):
+        lat1, lng1, _, distance1 = draft[i - 1]
+        lat2, lng2, _, distance2 = draft[i]
+        if distance2:
+            continue
+        draft[i][3] = distance1 + geo_distance(lat1, lng1, lat2, lng2)
+    return draft[:, 3]
+
+
+def test_np_cumulative_distance():
+    # setup
+    track = np.array(
+        [
+            (60.0, 30.0, 0, 0),
+            (60.001, 30.0, 0, 0),
+            (60.001, 30.0, 0, 0),
+            (60.002, 30.0, 0, 500.0),
+            (60.003, 30.0, 0, 0),
+            (60.003, 30.000001, 0, 0),
+        ]
+    )
+
+    # action
+    distance = np_cumulative_distance(track)
+
+    # verification
+    assert np.around(distance, 3).tolist() == [0.0, 111.195, 111.195, 500.0, 611.195, 611.251]
+
+
+def test_np_cumulative_distance_loop():
+    # setup
+    rng = np.random.default_rng(1)
+    track = np.zeros(shape=(COUNTER, 4))
+    track[:, 0] = 60 + np.cumsum(rng.normal(0, 1e-4, COUNTER))
+    track[:, 1] = 30 + np.cumsum(rng.normal(0, 1e-4, COUNTER))
+    # stops and anchors
+    track[1::10, 0:2] = track[0:-1:10, 0:2]
+    track[::1000, 3] = np.arange(0, COUNTER, 1000) * 10
+
+    # action
+    distance = np_cumulative_distance(track)
+    expected = fill_distance(track)
+
+    # verification
+    # the scalar arccos form is off by up to 0.1 m on close points
+    assert np.allclose(distance, expected, rtol=0, atol=0.2)
+
+
+def test_np_cumulative_distance_short():
+    # verification
+    assert np_cumulative_distance(np.array([(60.0, 30.0, 0, 0)])).tolist() == [0.0]
+    assert np_cumulative_distance(np.empty(shape=(0, 4))).tolist() == []
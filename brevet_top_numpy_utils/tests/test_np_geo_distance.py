@@ -1,6 +1,6 @@
 import numpy as np
 
-from brevet_top_numpy_utils.main import np_geo_distance
+from brevet_top_numpy_utils.main import np_geo_distance, np_geo_distance_matrix
 
 
 def test_np_geo_distance():
@@ -20,3 +20,22 @@ def test_np_geo_distance():
     distance = np_geo_distance(point, track)
 
     assert np.around(distance, 3).tolist() == expected
+
+
+def test_np_geo_distance_matrix():
+    track = np.array(
+        [
+            (50, 20, 0, 0),
+            (60, 20, 0, 0),
+            (60, 20, 0, 150),
+            (60, 30, 0, 200),
+            (0, 0, 0, 0),
+        ]
+    )
+    points = np.array([(60, 20, 0, 150), (50, 20, 0, 0), (59.9, 29.9, 0, 0)])
+
+    distance = np_geo_distance_matrix(points, track)
+
+    assert distance.shape == (3, 5)
+    for point, row in zip(points, distance):
+        assert np.allclose(row, np_geo_distance(point, track))
@@ -0,0 +1,205 @@
+import gzip
+import io
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from test_build_array_from_fit import make_fit
+from test_build_array_from_gpx import make_gpx
+
+from brevet_top_numpy_utils import (
+    TrackTooLarge,
+    build_array_from_fit_bytes,
+    build_array_from_gpx_bytes,
+    ingest,
+    read_track,
+)
+from brevet_top_numpy_utils.ingest import _decompress
+
+START = 1628915400
+
+
+class ChunkedStream(io.RawIOBase):
+    """Returns less data than requested, the same as a network stream may do"""
+
+    def __init__(self, data: bytes, size: int):
+        self._data = io.BytesIO(data)
+        self._size = size
+
+    def read(self, size: int = -1) -> bytes:
+        return self._data.read(min(size, self._size) if size >= 0 else self._size)
+
+
+@pytest.fixture
+def gpx() -> bytes:
+    return make_gpx(1000)
+
+
+@pytest.fixture
+def fit() -> bytes:
+    return make_fit(1000)
+
+
+def compress(data: bytes, method: str) -> bytes:
+    if method == "gzip":
+        return gzip.compress(data)
+    if method == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+@pytest.mark.parametrize("method", ["none", "gzip", "zstd"])
+def test_read_track_gpx(gpx: bytes, method: str):
+    # action
+    track = read_track(io.BytesIO(compress(gpx, method)), chunk_size=1000)
+
+    # verification
+    assert np.array_equal(track, build_array_from_gpx_bytes(gpx))
+
+
+@pytest.mark.parametrize("method", ["none", "gzip", "zstd"])
+def test_read_track_fit(fit: bytes, method: str):
+    # action
+    track = read_track(ChunkedStream(compress(fit, method), 3), chunk_size=1000)
+
+    # verification
+    assert np.array_equal(track, build_array_from_fit_bytes(fit))
+
+
+def test_read_track_empty():
+    # verification
+    assert read_track(io.BytesIO(b"")).shape == (0, 4)
+
+
+def test_read_track_unsupported():
+    # action
+    with pytest.raises(ValueError):
+        read_track(io.BytesIO(b"PK\x03\x04 not a track"))
+
+
+@pytest.mark.parametrize("method", ["none", "gzip"])
+def test_read_track_broken(gpx: bytes, method: str):
+    # action
+    with pytest.raises(ValueError):
+        read_track(io.BytesIO(compress(gpx[: len(gpx) // 2], method)[:-10]))
+
+
+# a Garmin point is about 280 bytes with the extensions
+EXTENSIONS = (
+    "<ele>100.0</ele><extensions><gpxtpx:TrackPointExtension><gpxtpx:atemp>18.0</gpxtpx:atemp>"
+    "<gpxtpx:hr>142</gpxtpx:hr><gpxtpx:cad>85</gpxtpx:cad></gpxtpx:TrackPointExtension><power>180</power></extensions>"
+)
+
+
+def make_ride(size: int, extensions: str = "") -> bytes:
+    """1 second recording"""
+    times = (datetime.fromtimestamp(START + i, tz=timezone.utc) for i in range(size))
+    points = "".join(
+        f'<trkpt lat="{60 + i * 1e-5:.7f}" lon="30.0"><time>{time:%Y-%m-%dT%H:%M:%SZ}</time>{extensions}</trkpt>'
+        for i, time in enumerate(times)
+    )
+    namespace = "http://www.garmin.com/xmlschemas/TrackPointExtension/v1"
+    return (
+        f'<?xml version="1.0"?><gpx version="1.1" xmlns:gpxtpx="{namespace}"><trk><trkseg>{points}</trkseg></trk></gpx>'
+    ).encode()
+
+
+@pytest.mark.parametrize("size", [None, 20000 * 150])
+def test_read_track_budget(size: int):
+    # setup
+    gpx = make_ride(20000)
+
+    # action
+    track = read_track(io.BytesIO(gpx), chunk_size=10000, budget=5000, size=size)
+
+    # verification
+    assert len(track) <= 5001
+    assert track[0, 2] == START
+    assert track[-1, 2] == START + 19999
+    assert np.unique(np.diff(track[:-1, 2])).tolist() == [4.0]
+
+
+def test_read_track_fit_budget(fit: bytes):
+    # action
+    track = read_track(io.BytesIO(fit), budget=300)
+
+    # verification
+    assert np.array_equal(track[:-1], build_array_from_fit_bytes(fit)[:-1:4])
+
+
+def test_read_track_too_large():
+    # action
+    with pytest.raises(TrackTooLarge):
+        read_track(io.BytesIO(make_ride(10000)), budget=100)
+
+
+def test_read_track_gzip_members(gpx: bytes):
+    # setup
+    half = len(gpx) // 2
+    data = gzip.compress(gpx[:half]) + gzip.compress(gpx[half:])
+
+    # action
+    track = read_track(ChunkedStream(data, 7), chunk_size=1000)
+
+    # verification
+    assert np.array_equal(track, build_array_from_gpx_bytes(gpx))
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_decompress_bounded(method: str):
+    # setup
+    data = compress(b"\0" * 10_000_000, method)
+
+    # action
+    pieces = [len(piece) for piece in _decompress(io.BytesIO(data), 1000, max_ratio=100_000)]
+
+    # verification
+    assert max(pieces) <= 1000
+    assert sum(pieces) == 10_000_000
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_decompress_too_large(method: str):
+    # setup
+    data = compress(b"\0" * 10_000_000, method)
+
+    # action
+    with pytest.raises(TrackTooLarge):
+        for _ in _decompress(io.BytesIO(data), 1000):
+            pass
+
+
+def test_decompress_plain():
+    # action: the upload size is the data size
+    pieces = [len(piece) for piece in _decompress(io.BytesIO(b"\0" * 10_000_000), 1000, max_ratio=1)]
+
+    # verification
+    assert sum(pieces) == 10_000_000
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_read_track_bomb(method: str):
+    # setup: a valid GPX start padded with 16 MB of spaces, about 20 KB compressed
+    data = compress(b'<?xml version="1.0"?><gpx version="1.1"><trk><trkseg>' + b" " * (16 << 20), method)
+
+    # action
+    with pytest.raises(TrackTooLarge):
+        read_track(io.BytesIO(data), budget=200000, size=len(data))
+
+    # verification: refused by the compression ratio, not by the upload size
+    assert len(data) < (16 << 20) // ingest.MAX_COMPRESSION_RATIO
+
+
+def test_read_track_long_ride():
+    # setup: 100 hours recorded every second, about 100 MB of GPX
+    gpx = make_ride(100 * 3600, EXTENSIONS)
+
+    # action
+    track = read_track(io.BytesIO(gpx), budget=200000, size=len(gpx))
+
+    # verification: decimated, not refused
+    assert len(gpx) > 100_000_000
+    assert len(track) <= 200001
+    assert track[0, 2] == START
+    assert track[-1, 2] == START + 100 * 3600 - 1
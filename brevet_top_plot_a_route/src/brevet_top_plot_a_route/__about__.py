@@ -1,4 +1,4 @@
-__version__ = '0.2.0'
+__version__ = '0.3.7'
 __author__ = 'Grigorii Batalov'
 __license__ = 'MIT'
 __description__ = 'Utils for Plot-a-route service in the brevet.top'
@@ -1,4 +1,4 @@
 from .check_point import CheckPoint  # noqa: F401
 from .route_point import RoutePoint  # noqa: F401
-from .main import get_route_info  # noqa: F401
+from .main import UNCHANGED_TRACKS, get_route_info  # noqa: F401
 from .utils import ROUTE_PREFIX  # noqa: F401
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Optional, Tuple
+
+
+class RouteCache:
+    """
+    A least recently used cache with expiring entries.
+    Lives as long as the process (a warm cloud function instance).
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        """
+        :param size: the maximal number of entries
+        :param ttl: the entry lifetime in seconds
+        """
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Find a live entry.
+
+        :param key: the entry key
+        :return: the value or None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store an entry, dropping the least recently used ones over the size limit.
+
+        :param key: the entry key
+        :param value: the value
+        """
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,28 +1,101 @@
+import hashlib
+import json
 import logging
+from copy import deepcopy
 from typing import Optional
 
 from brevet_top_plot_a_route.utils import get_map_id_from_url, download_data
 
+from .cache import RouteCache
 from .exceptions import RouteNotFound
 from .route import Route
 
 API_PREFIX: str = "https://www.plotaroute.com/get_route.asp"
+DOWNLOAD_CACHE_TTL = 600  # seconds, route edits show up after that
+ROUTE_CACHE_TTL = 3600  # seconds
+ROUTE_CACHE_SIZE = 16  # routes
+# the fields left out for a route matching the known fingerprint
+UNCHANGED_TRACKS = {"checkpoints": None, "track": None, "short_track": None}
 
+# downloaded data by the map ID
+downloads = RouteCache(size=ROUTE_CACHE_SIZE, ttl=DOWNLOAD_CACHE_TTL)
+# processed routes by the downloaded data hash
+routes = RouteCache(size=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
 
-def get_route_info(url: str) -> Optional[dict]:
+
+def get_route_info(url: str, fingerprint: Optional[str] = None) -> Optional[dict]:
     """
     Download the route details using Plot A Route API. Returns track, short_track, checkpoints, etc.
+    Both the downloads and the processed routes are cached for the process lifetime.
+    When the route matches the known fingerprint, it is not processed: the metadata (name, length, etc.) is returned
+    and track, short_track, checkpoints are None.
 
     :param url: original route link
+    :param fingerprint: optional routeFingerprint of the previously processed route
     :return: a dict with the route details or None
     """
     # allow ids like 12345.6 - the server is rounding to int
     map_id: int = get_map_id_from_url(url)
 
-    route_data: dict = download_data(f"{API_PREFIX}?RouteID={map_id}")
-    if "Error" in route_data:
-        raise RouteNotFound(route_data["Error"])
-    route = Route.from_dict(route_data)
+    route_data: Optional[dict] = downloads.get(map_id)
+    if route_data is None:
+        route_data = download_data(f"{API_PREFIX}?RouteID={map_id}")
+        if "Error" in route_data:
+            raise RouteNotFound(route_data["Error"])
+        downloads.put(map_id, route_data)
+
+    digest = hashlib.sha256(json.dumps(route_data, sort_keys=True).encode()).hexdigest()
+    info: Optional[dict] = routes.get(digest)
+    if info is None:
+        route = Route.from_dict(route_data)
+        if fingerprint is not None and route.fingerprint() == fingerprint:
+            return unchanged_route_info(route, url)
+        info = build_route_info(route, url)
+        if info is None:
+            return None
+        routes.put(digest, info)
+    elif fingerprint is not None and info["routeFingerprint"] == fingerprint:
+        return {**info, **UNCHANGED_TRACKS, "mapUrl": url}
+
+    # the checkpoints are mutable objects, the arrays are not changed by the callers
+    return {**info, "checkpoints": deepcopy(info["checkpoints"]), "mapUrl": url}
+
+
+def route_metadata(route: Route, url: str) -> dict:
+    """
+    Describe a route with the scalar details only, the ones to save even if the track is unchanged.
+
+    :param route: a route with the track read
+    :param url: original route link
+    :return: a dict with the route name, length, etc.
+    """
+    return {
+        "name": route.route_name,
+        "length": round(route.distance / 1000),  # km
+        "mapUrl": url,
+        "routeFingerprint": route.fingerprint(),
+    }
+
+
+def unchanged_route_info(route: Route, url: str) -> dict:
+    """
+    Describe a route without building the tracks and the checkpoints.
+
+    :param route: a route with the track read
+    :param url: original route link
+    :return: a dict with the route details
+    """
+    return {**route_metadata(route, url), **UNCHANGED_TRACKS}
+
+
+def build_route_info(route: Route, url: str) -> Optional[dict]:
+    """
+    Build the tracks and find the checkpoints of a downloaded route.
+
+    :param route: a route as of Plot A Route API response
+    :param url: original route link
+    :return: a dict with the route details or None
+    """
     try:
         route.make_tracks()
     except ValueError as error:
@@ -36,9 +109,7 @@ def get_route_info(url: str) -> Optional[dict]:
 
     return {
         "checkpoints": route.checkpoints,
-        "name": route.route_name,
-        "length": round(route.distance / 1000),  # km
-        "mapUrl": url,
         "track": route.track,
         "short_track": route.short_track,
+        **route_metadata(route, url),
     }
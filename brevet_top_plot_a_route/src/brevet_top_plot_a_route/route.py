@@ -1,34 +1,41 @@
+import hashlib
 import json
 import logging
 from dataclasses import dataclass, field
-from itertools import accumulate
 from typing import Union, List, Optional, Tuple
 
 import numpy as np
 from dataclasses_json import dataclass_json, LetterCase, config
 
-from brevet_top_numpy_utils import FloatArray, np_geo_distance
+from brevet_top_numpy_utils import FloatArray, np_geo_distance_matrix, np_geo_distance_steps
 from brevet_top_plot_a_route.check_point import CheckPoint
-from brevet_top_plot_a_route.route_point import PlotARoutePoint, RoutePoint
-from brevet_top_plot_a_route.utils import geo_distance, simplify_route, route_down_sample_factor
+from brevet_top_plot_a_route.route_point import RoutePoint
+from brevet_top_plot_a_route.utils import simplify_track
 
 EPILOG_MAX_LENGTH = 500  # meters
+# the Strava alignment input, about 100 points as the former two pass RDP gave
+SHORT_TRACK_SIZE = 100  # points at most
+SHORT_TRACK_TOLERANCE = 100.0  # meters, close to the former RDP epsilon of 0.001-0.002 degrees
+LABEL_CHUNK_SIZE = 1 << 14  # route points compared to all the labels at once
 
 
 @dataclass_json(letter_case=LetterCase.PASCAL)
 @dataclass
 class Route:
     route_id: int = field(metadata=config(field_name="RouteID"), default=-1)
-    route_data: Union[str, List[PlotARoutePoint]] = ""
+    route_data: Union[str, List[dict]] = ""
     route_name: str = ""
     distance: float = 0
-    track: Optional[List[RoutePoint]] = None
+    # [latitude, longitude, 0, distance] rows
+    track: Optional[FloatArray] = None
     short_track: Optional[List[RoutePoint]] = None
+    # the start and the control points of the track
+    controls: Optional[List[RoutePoint]] = None
     checkpoints: Optional[List[CheckPoint]] = None
 
     def __post_init__(self):
         if self.route_data and type(self.route_data) is str:
-            self.route_data = [PlotARoutePoint(**p) for p in json.loads(self.route_data)]
+            self.route_data = json.loads(self.route_data)
         else:
             self.route_data = []
 
@@ -37,96 +44,135 @@ class Route:
 
     def make_tracks(self):
         """
-        Transform a route from Plot A Route format to internal one adding distance.
+        Transform a route from Plot A Route format to internal one adding distance (unless done already).
         Create a short (simplified) version too.
         """
         if len(self.route_data) == 0:
             return []
-        first_point = RoutePoint.from_plot_a_route(self.route_data.pop(0), distance=0)
-
-        self.track = list(accumulate(self.route_data, self._build_point, initial=first_point))
-        if len(self.track) < 1:
-            raise ValueError("Empty route")
+        if self.track is None:
+            self.make_track()
 
-        route = simplify_route(self.track)
-        self.short_track = simplify_route(
-            self.track, factor=route_down_sample_factor(len(self.track), len(route))
-        )
+        short_mask = simplify_track(self.track, size=SHORT_TRACK_SIZE, tolerance=SHORT_TRACK_TOLERANCE)
+        self.short_track = [
+            RoutePoint(lat=point[0], lng=point[1], distance=point[3]) for point in self.track[short_mask].tolist()
+        ]
         logging.info(
             f"The route has been simplified from {len(self.track)}"
-            f" points to {len(route)} / {len(self.short_track)}"
+            f" points to {len(self.short_track)}"
         )
 
-    @staticmethod
-    def _build_point(route: RoutePoint, point: PlotARoutePoint) -> RoutePoint:
-        try:
-            distance = geo_distance(
-                route.lat,
-                route.lng,
-                point.lat,
-                point.lng,
-            )
-            return RoutePoint.from_plot_a_route(point, distance=route.distance + distance)
-        except ValueError:
-            # points are way too close, skip one
-            return route
+    def make_track(self):
+        """
+        Transform a route from Plot A Route format to internal one adding distance.
+        Only the start and the control points become RoutePoint objects, the rest stays in the track array.
+        """
+        if len(self.route_data) == 0:
+            return
+
+        coordinates: FloatArray = np.array(
+            [(point.get("lat") or 0, point.get("lng") or 0) for point in self.route_data], dtype=np.float64
+        ).reshape(-1, 2)
+        self.track = np.zeros(shape=(len(coordinates), 4), dtype=np.float64)
+        self.track[:, 0:2] = coordinates
+        self.track[1:, 3] = np.cumsum(np_geo_distance_steps(self.track))
+
+        self.controls = [self._route_point(0)]
+        for index, point in enumerate(self.route_data):
+            # the cheap test first, most points have no description
+            if index > 0 and (point.get("dir") or point.get("labtxt")):
+                route_point = self._route_point(index)
+                if route_point.is_control():
+                    self.controls.append(route_point)
+
+    def fingerprint(self) -> Optional[str]:
+        """
+        Hash the route coordinates to tell an unchanged route without processing it.
+
+        :return: a hex digest or None for an empty route
+        """
+        if self.track is None:
+            self.make_track()
+        if self.track is None:
+            return None
+        return hashlib.sha256(np.ascontiguousarray(self.track[:, 0:2]).tobytes()).hexdigest()
+
+    def _route_point(self, index: int) -> RoutePoint:
+        """
+        Build a RoutePoint with all the Plot A Route attributes.
+
+        :param index: the point index in the route data and the track
+        :return: a new RoutePoint
+        """
+        return RoutePoint(**{**self.route_data[index], "distance": self.track[index, 3].item()})
 
     def find_checkpoints(self):
         """
         Trace the route and find checkpoints.
         """
-        if type(self.track) is not list or len(self.track) < 1:
+        if self.track is None or len(self.track) < 1 or not self.controls:
             raise ValueError("Empty route")
 
         checkpoints: List[CheckPoint] = []
 
-        first_point = CheckPoint.from_route_point(self.track.pop(0), name="Start")
+        first_point = CheckPoint.from_route_point(self.controls[0], name="Start")
         checkpoints.append(first_point)
 
-        # search along other route points
-        for point in self.track:
-            if point.is_control():
-                checkpoints.append(CheckPoint.from_route_point(point))
+        # other control points along the route
+        checkpoints.extend(CheckPoint.from_route_point(point) for point in self.controls[1:])
 
         labels: List[CheckPoint] = []
         # search for symlabs checkpoints
         labels.extend(label for label in first_point.find_labels() if label.is_control())
 
-        self._attach_labels(labels, [(p.lat, p.lng, 0, p.distance) for p in self.track])
+        self._attach_labels(labels, self.track[1:])
         checkpoints.extend(labels)
 
         return self._add_last_checkpoint(checkpoints)
 
     @staticmethod
-    def _attach_labels(labels: List[CheckPoint], points: List[Tuple[float, float, float, float]]):
+    def _attach_labels(labels: List[CheckPoint], points: Union[FloatArray, List[Tuple[float, float, float, float]]]):
         """
         Find best matching route points and update distance from the route start.
+        All the labels are compared to a chunk of the route at once, so the memory stays bounded.
 
         :param labels: a list of CheckPoint
-        :param points: a list of route points to compare
+        :param points: route points to compare as [latitude, longitude, 0, distance]
         """
-        for label in labels:
-            step_away: FloatArray = np_geo_distance(
-                np.array([label.lat, label.lng, 0.0, 0.0], dtype=np.float64),
-                np.array(points, dtype=np.float64),
-            )
-            offset: int = np.argmin(step_away)  # noqa: E711
-            if not label.distance:
-                label.distance = round(points[offset][3] / 1000)
+        labels = [label for label in labels if not label.distance]
+        if len(points) == 0 or not labels:
+            return
+        points = np.asarray(points, dtype=np.float64)
+        targets = np.array([[label.lat, label.lng, 0.0, 0.0] for label in labels], dtype=np.float64)
+
+        nearest = np.full(shape=len(labels), fill_value=np.inf)
+        offsets = np.zeros(shape=len(labels), dtype=np.intp)
+        rows = np.arange(len(labels))
+        for start in range(0, len(points), LABEL_CHUNK_SIZE):
+            step_away: FloatArray = np_geo_distance_matrix(targets, points[start : start + LABEL_CHUNK_SIZE])
+            chunk_offsets = np.argmin(step_away, axis=1)
+            distance = step_away[rows, chunk_offsets]
+            # keep the first of equally close points
+            closer = distance < nearest
+            nearest[closer] = distance[closer]
+            offsets[closer] = start + chunk_offsets[closer]
+
+        for label, offset in zip(labels, offsets.tolist()):
+            label.distance = round(points[offset, 3] / 1000)
 
     def _add_last_checkpoint(self, checkpoints: Optional[List[CheckPoint]] = None) -> Optional[List[CheckPoint]]:
         """
         Compare the route and checkpoint list and add a new CheckPoint if the route is longer.
         """
-        if not self.track:
+        if self.track is None or len(self.track) == 0:
             return checkpoints
-        finish = self.track[-1]
+        latitude, longitude, _, distance = self.track[-1].tolist()
         # add the last point from the route if too far from the last control
         if (
                 checkpoints is not None
                 and len(checkpoints) > 0
-                and finish.distance > checkpoints[-1].distance * 1000 + EPILOG_MAX_LENGTH
+                and distance > checkpoints[-1].distance * 1000 + EPILOG_MAX_LENGTH
         ):
+            finish = RoutePoint(lat=latitude, lng=longitude, distance=distance)
             checkpoint = CheckPoint.from_route_point(finish, name="End")
             checkpoints.append(checkpoint)
         return checkpoints
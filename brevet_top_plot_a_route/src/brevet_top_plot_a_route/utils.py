@@ -1,19 +1,16 @@
 import logging
-from itertools import compress
-from typing import List, Optional
+from heapq import heappop, heappush
+from typing import List, Optional, Tuple
 
 import cloudscraper
 import numpy as np
-from rdp import rdp
 
-from .route_point import RoutePoint
+from brevet_top_numpy_utils import FloatArray
 
 ROUTE_PREFIX: str = "https://www.plotaroute.com/route/"
 
-ROUTE_SIMPLIFY_FACTOR = 0.001
-ROUTE_SIMPLIFY_DIVIDER = (
-    20000.0  # used as (sqrt(len) / divider) to reduce to ~100 points
-)
+ROUTE_SIMPLIFY_TOLERANCE = 100.0  # meters
+EARTH_RADIUS = 6371e3  # meters
 
 
 def get_map_id_from_url(url: Optional[str]) -> Optional[int]:
@@ -30,67 +27,125 @@ def get_map_id_from_url(url: Optional[str]) -> Optional[int]:
     return int(float(url.removeprefix(ROUTE_PREFIX).split("?")[0]))
 
 
-def download_data(route_url: str) -> dict:
-    """
-    Generic HTTP request.
+_scraper: Optional[cloudscraper.CloudScraper] = None
 
-    :param route_url: a link to GET
-    :return: JSON with results
+
+def get_scraper() -> cloudscraper.CloudScraper:
     """
-    config = {
-        'browser': {
-            'browser': 'firefox',
-            'platform': 'windows',
-            'desktop': True
-        },
-        'delay': 20
-    }
-    try:
-        scraper = cloudscraper.create_scraper(**config)
+    Create the scraper once per process, so the anti-bot clearance cookies and the connections are reused.
 
-        scraper.headers.update({
+    :return: the shared scraper
+    """
+    global _scraper
+    if _scraper is None:
+        config = {
+            'browser': {
+                'browser': 'firefox',
+                'platform': 'windows',
+                'desktop': True
+            },
+            'delay': 20
+        }
+        _scraper = cloudscraper.create_scraper(**config)
+
+        _scraper.headers.update({
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
             'Cache-Control': 'max-age=0',
         })
+    return _scraper
 
-        response = scraper.get(route_url)
+
+def download_data(route_url: str) -> dict:
+    """
+    Generic HTTP request.
+
+    :param route_url: a link to GET
+    :return: JSON with results
+    """
+    global _scraper
+    try:
+        response = get_scraper().get(route_url)
         response.raise_for_status()
         return response.json()
     except Exception as error:
         logging.error(f"HTTP error: {error}")
+        # start over with a new session and a new challenge next time
+        _scraper = None
         raise
 
 
-def route_down_sample_factor(source: int, target: int) -> float:
+def project_track(track: FloatArray) -> FloatArray:
     """
-    Simple Ramer-Douglas-Peucker (rdp) epsilon calculator based on point number ratio.
-    The target sequence is expected to be reduced by the rdp previously.
+    Project track coordinates to a plane in meters (equirectangular, scaled at the mean latitude).
+    Good enough for the route scale, the distortion is below 1% within ±100 km of the mean latitude.
 
-    :param source: the source number of points
-    :param target: the target number of points
-    :return: down-sampling factor (epsilon)
+    :param track: a track as an array of [latitude, longitude, ...]
+    :return: array of [x, y] in meters
     """
-    factor = 0.0002 * target / source + target / 50000
-    logging.info(f"Route down-sampling factor for {source} / {target} is {factor}")
-    return factor
+    latitude, longitude = np.radians(track[:, 0:2].T)
+    scale = np.cos(np.mean(latitude)) if len(latitude) > 0 else 1.0
+    return np.stack((EARTH_RADIUS * longitude * scale, EARTH_RADIUS * latitude), axis=1)
 
 
-def simplify_route(
-        points: List[RoutePoint], factor: float = ROUTE_SIMPLIFY_FACTOR
-) -> List[RoutePoint]:
+def _farthest_point(plane: FloatArray, start: int, end: int) -> Tuple[int, float]:
     """
-    Reduce number of route points with Ramer-Douglas-Peucker algorithm.
+    Find the point between start and end farthest from the segment connecting them.
 
-    :param points: a source list of points as [RoutePoint]
-    :param factor: optional down-sample factor (epsilon in RDP algorithm)
-    :return: reduced list of points as [RoutePoint]
+    :param plane: projected points as an array of [x, y]
+    :param start: the segment start index
+    :param end: the segment end index, at least start + 2
+    :return: the point index and the distance in meters
+    """
+    origin = plane[start]
+    segment = plane[end] - origin
+    points = plane[start + 1 : end] - origin
+    length = segment @ segment
+    # the projection onto the segment, not the infinite line - loops start and end at the same point
+    position = np.clip(points @ segment / length, 0, 1) if length > 0 else np.zeros(len(points))
+    distance = np.hypot(*(points - position[:, np.newaxis] * segment).T)
+    offset = int(np.argmax(distance))
+    return start + 1 + offset, float(distance[offset])
+
+
+def simplify_track(
+    track: FloatArray, size: Optional[int] = None, tolerance: float = ROUTE_SIMPLIFY_TOLERANCE
+) -> FloatArray:
+    """
+    Reduce number of track points with Ramer-Douglas-Peucker algorithm in a single pass.
+    The segments are split in the order of their deviation (the worst first), so the procedure may stop
+    at the target number of points as well as at the tolerance.
+
+    :param track: a source track as an array of [latitude, longitude, ...]
+    :param size: optional target number of points
+    :param tolerance: the maximal deviation of the removed points from the simplified track (meters)
+    :return: a boolean mask of the points to keep
     """
-    coordinates: List[List[float]] = [[p.lat or 0, p.lng or 0] for p in points]
-    simple_mask = rdp(coordinates, factor, algo="iter", return_mask=True)
-    return list(compress(points, simple_mask))
+    mask = np.zeros(shape=len(track), dtype=bool)
+    if len(track) == 0:
+        return mask
+    mask[[0, -1]] = True
+    plane = project_track(track)
+
+    queue: List[Tuple[float, int, int, int]] = []
+
+    def split(start: int, end: int):
+        if end - start > 1:
+            index, distance = _farthest_point(plane, start, end)
+            if distance > tolerance:
+                heappush(queue, (-distance, start, end, index))
+
+    split(0, len(track) - 1)
+    kept = int(np.count_nonzero(mask))
+    while queue and (size is None or kept < size):
+        _, start, end, index = heappop(queue)
+        mask[index] = True
+        kept += 1
+        split(start, index)
+        split(index, end)
+    return mask
 
 
 # noinspection NonAsciiCharacters
@@ -1,6 +1,7 @@
+import numpy as np
+
 from brevet_top_plot_a_route.check_point import CheckPoint
 from brevet_top_plot_a_route.route import Route
-from brevet_top_plot_a_route.route_point import RoutePoint
 
 
 def test_add_last_checkpoint_no_track():
@@ -16,7 +17,7 @@ def test_add_last_checkpoint_no_track():
 
 def test_add_last_checkpoint_no_checkpoints():
     # setup
-    route = Route(track=[RoutePoint(lat=40.78, lng=43.86, distance=0)])
+    route = Route(track=np.array([[40.78, 43.86, 0, 0]]))
 
     # action
     result = route._add_last_checkpoint()
@@ -27,7 +28,7 @@ def test_add_last_checkpoint_no_checkpoints():
 
 def test_add_last_checkpoint_empty():
     # setup
-    route = Route(checkpoints=[], track=[RoutePoint(lat=40.78, lng=43.86, distance=0)])
+    route = Route(checkpoints=[], track=np.array([[40.78, 43.86, 0, 0]]))
 
     # action
     result = route._add_last_checkpoint()
@@ -39,7 +40,7 @@ def test_add_last_checkpoint_empty():
 def test_add_last_checkpoint_close():
     # setup
     checkpoint = CheckPoint(lat=60, lng=30, distance=2, name="test")
-    route = Route(checkpoints=[checkpoint], track=[RoutePoint(lat=40.78, lng=43.86, distance=2400)])
+    route = Route(checkpoints=[checkpoint], track=np.array([[40.78, 43.86, 0, 2400]]))
 
     # action
     result = route._add_last_checkpoint(route.checkpoints)
@@ -51,7 +52,7 @@ def test_add_last_checkpoint_close():
 def test_add_last_checkpoint_add():
     # setup
     checkpoint = CheckPoint(lat=60, lng=30, distance=2, name="test")
-    route = Route(checkpoints=[checkpoint], track=[RoutePoint(lat=40.78, lng=43.86, distance=5000)])
+    route = Route(checkpoints=[checkpoint], track=np.array([[40.78, 43.86, 0, 5000]]))
 
     # action
     result = route._add_last_checkpoint(route.checkpoints)
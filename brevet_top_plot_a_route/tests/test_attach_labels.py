@@ -1,4 +1,8 @@
+from unittest.mock import patch
+
+import numpy as np
 import pytest
+from brevet_top_numpy_utils import np_geo_distance
 
 from brevet_top_plot_a_route.check_point import CheckPoint
 from brevet_top_plot_a_route.route import Route
@@ -39,3 +43,25 @@ def test_attach_labels(labels):
 
     # verification
     assert [label.distance for label in labels] == [3, 6]
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 14])
+def test_attach_labels_chunks(chunk_size: int):
+    # setup
+    index = np.arange(5000, dtype=np.float64)
+    # a loop - the first pass is preferred
+    points = np.stack(
+        (60 + np.sin(index / 800) * 0.1, 30 + np.cos(index / 800) * 0.2, np.zeros(5000), index * 25), axis=1
+    )
+    labels = [CheckPoint(lat=60 + i * 1e-3, lng=30.1 + i * 2e-3, name=f"CP{i}") for i in range(50)]
+    expected = [
+        round(points[np.argmin(np_geo_distance(np.array([label.lat, label.lng, 0, 0]), points)), 3] / 1000)
+        for label in labels
+    ]
+
+    # action
+    with patch("brevet_top_plot_a_route.route.LABEL_CHUNK_SIZE", chunk_size):
+        Route._attach_labels(labels, points)
+
+    # verification
+    assert [label.distance for label in labels] == expected
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+
+from brevet_top_plot_a_route.cache import RouteCache
+
+
+@patch("brevet_top_plot_a_route.cache.monotonic", return_value=100.0)
+def test_route_cache_ttl(mock_time):
+    # setup
+    cache = RouteCache(size=2, ttl=10)
+    cache.put(1, "a")
+
+    # verification
+    assert cache.get(1) == "a"
+    mock_time.return_value = 111.0
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_route_cache_size():
+    # setup
+    cache = RouteCache(size=2, ttl=10)
+    cache.put(1, "a")
+    cache.put(2, "b")
+
+    # action
+    cache.get(1)
+    cache.put(3, "c")
+
+    # verification
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
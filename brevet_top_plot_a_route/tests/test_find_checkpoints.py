@@ -1,6 +1,7 @@
 from typing import List
 from unittest.mock import patch
 
+import numpy as np
 import pytest
 
 from brevet_top_plot_a_route.check_point import CheckPoint
@@ -24,7 +25,8 @@ def test_find_checkpoints_empty(mock_route):
 
 def test_find_checkpoints_single(mock_route):
     # setup
-    mock_route.track = [RoutePoint(lat=1, lng=2)]
+    mock_route.track = np.array([[1, 2, 0, 0]], dtype=np.float64)
+    mock_route.controls = [RoutePoint(lat=1, lng=2)]
     expected: List[CheckPoint] = [CheckPoint(lat=1, lng=2, name="Start")]
 
     # action
@@ -37,19 +39,27 @@ def test_find_checkpoints_single(mock_route):
 @patch("brevet_top_plot_a_route.check_point.CheckPoint.find_labels", return_value=[])
 def test_find_checkpoints_many(mock_find_labels, mock_route):
     # setup
-    mock_route.track = [
+    mock_route.track = np.array(
+        [
+            [1, 2, 0, 0],
+            [3, 4, 0, 1234567],
+            [5, 6, 0, 1500000],
+            [7, 8, 0, 2345678],
+            [9, 0, 0, 3000000],
+            [2, 3, 0, 3456789],
+        ],
+        dtype=np.float64,
+    )
+    mock_route.controls = [
         RoutePoint(lat=1, lng=2),
         RoutePoint(lat=3, lng=4, dir="CP1", distance=1234567),
-        RoutePoint(lat=5, lng=6),
         RoutePoint(lat=7, lng=8, labtxt="CP2", distance=2345678),
-        RoutePoint(lat=9, lng=0),
-        RoutePoint(lat=2, lng=3, labtxt="home", distance=3456789),
     ]
     expected: List[CheckPoint] = [
         CheckPoint(lat=1, lng=2, name="Start"),
         CheckPoint(lat=3, lng=4, name="CP1", distance=1235),
         CheckPoint(lat=7, lng=8, name="CP2", distance=2346),
-        CheckPoint(lat=2, lng=3, name="End", distance=3457),
+        CheckPoint(lat=2.0, lng=3.0, name="End", distance=3457),
     ]
 
     # action
@@ -23,7 +23,7 @@ def test_get_route_data_success(data_good):
     route = Route.from_dict(data_good)
 
     # verification
-    assert str(route.route_data) == "[<PlotARoutePoint lat=1 lng=2>]"
+    assert route.route_data == [{"lat": 1, "lng": 2}]
 
 
 def test_get_route_data_empty(data_short):
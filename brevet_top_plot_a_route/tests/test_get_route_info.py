@@ -1,13 +1,12 @@
 import json
-from unittest.mock import patch, call
+from unittest.mock import ANY, patch
 
 import pytest
 
 from brevet_top_plot_a_route.check_point import CheckPoint
 from brevet_top_plot_a_route.exceptions import RouteNotFound
-from brevet_top_plot_a_route.main import get_route_info
+from brevet_top_plot_a_route.main import downloads, get_route_info, routes
 from brevet_top_plot_a_route.route_point import RoutePoint
-from brevet_top_plot_a_route.utils import route_down_sample_factor
 
 mock_track = [
     {
@@ -82,6 +81,12 @@ mock_checkpoints = [
 ]
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    downloads.clear()
+    routes.clear()
+
+
 @patch("brevet_top_plot_a_route.route.Route.find_checkpoints", return_value=mock_checkpoints)
 @patch("brevet_top_plot_a_route.route.Route.make_tracks")
 @patch("brevet_top_plot_a_route.main.download_data", return_value=mock_download)
@@ -98,6 +103,7 @@ def test_get_route_info(
         "mapUrl": "https://www.plotaroute.com/route/123",
         "track": None,
         "short_track": None,
+        "routeFingerprint": ANY,
     }
 
     # action
@@ -123,3 +129,82 @@ def test_get_route_info_exception(mock_downloader):
     mock_downloader.assert_called_once_with(
         "https://www.plotaroute.com/get_route.asp?RouteID=123"
     )
+
+
+@patch("brevet_top_plot_a_route.main.download_data", return_value=mock_download)
+def test_get_route_info_cache(mock_downloader):
+    # action
+    first = get_route_info("https://www.plotaroute.com/route/123")
+    with patch("brevet_top_plot_a_route.main.Route.from_dict") as mock_route:
+        second = get_route_info("https://www.plotaroute.com/route/123?units=km")
+
+    # verification
+    mock_downloader.assert_called_once()
+    mock_route.assert_not_called()
+    assert second["mapUrl"] == "https://www.plotaroute.com/route/123?units=km"
+    assert str(second["checkpoints"]) == str(first["checkpoints"])
+    assert second["checkpoints"][0] is not first["checkpoints"][0]
+    assert second["track"] is first["track"]
+
+
+@patch("brevet_top_plot_a_route.main.download_data", return_value=mock_download)
+def test_get_route_info_same_content(mock_downloader):
+    # setup
+    get_route_info("https://www.plotaroute.com/route/123")
+    downloads.clear()
+
+    # action
+    with patch("brevet_top_plot_a_route.main.Route.from_dict") as mock_route:
+        info = get_route_info("https://www.plotaroute.com/route/123")
+
+    # verification
+    assert mock_downloader.call_count == 2
+    mock_route.assert_not_called()
+    assert info["name"] == "Jogging"
+
+
+@patch("brevet_top_plot_a_route.main.download_data", return_value=mock_download)
+def test_get_route_info_fingerprint(mock_downloader):
+    # setup
+    fingerprint = get_route_info("https://www.plotaroute.com/route/123")["routeFingerprint"]
+    routes.clear()
+
+    # action
+    with patch("brevet_top_plot_a_route.route.Route.make_tracks") as mock_tracks:
+        info = get_route_info("https://www.plotaroute.com/route/123", fingerprint=fingerprint)
+    cached = get_route_info("https://www.plotaroute.com/route/123", fingerprint="other")
+    unchanged = get_route_info("https://www.plotaroute.com/route/123", fingerprint=fingerprint)
+
+    # verification
+    mock_tracks.assert_not_called()
+    assert info == {
+        "checkpoints": None,
+        "name": "Jogging",
+        "length": 3,
+        "mapUrl": "https://www.plotaroute.com/route/123",
+        "track": None,
+        "short_track": None,
+        "routeFingerprint": fingerprint,
+    }
+    assert cached["routeFingerprint"] == fingerprint
+    assert len(cached["track"]) == len(mock_track)
+    assert unchanged == info
+
+
+def test_get_route_info_fingerprint_renamed():
+    # setup
+    with patch("brevet_top_plot_a_route.main.download_data", return_value=mock_download):
+        fingerprint = get_route_info("https://www.plotaroute.com/route/123")["routeFingerprint"]
+    downloads.clear()
+    routes.clear()
+
+    # action
+    renamed = {**mock_download, "RouteName": "Running", "Distance": 4100.0}
+    with patch("brevet_top_plot_a_route.main.download_data", return_value=renamed):
+        info = get_route_info("https://www.plotaroute.com/route/123", fingerprint=fingerprint)
+
+    # verification: the metadata is fresh, the tracks are skipped
+    assert info["name"] == "Running"
+    assert info["length"] == 4
+    assert info["routeFingerprint"] == fingerprint
+    assert info["track"] is None and info["short_track"] is None and info["checkpoints"] is None
@@ -1,6 +1,9 @@
+import json
+
+import numpy as np
 import pytest
 
-from brevet_top_plot_a_route.route import Route
+from brevet_top_plot_a_route.route import SHORT_TRACK_SIZE, Route
 from brevet_top_plot_a_route.route_point import RoutePoint
 
 
@@ -9,12 +12,12 @@ from brevet_top_plot_a_route.route_point import RoutePoint
     [
         ("", None),
         ("[]", None),
-        ('[{"lat": 0, "lng": 0}]', [RoutePoint(lat=0, lng=0, distance=0)]),
+        ('[{"lat": 0, "lng": 0}]', [[0, 0, 0, 0]]),
         (
             '[{"lat": 60, "lng": 30}, {"lat": 60.1, "lng": 30.1}]',
             [
-                RoutePoint(lat=60, lng=30, distance=0),
-                RoutePoint(lat=60.1, lng=30.1, distance=12428.210486152113),
+                [60, 30, 0, 0],
+                [60.1, 30.1, 0, 12428.210486152113],
             ],
         ),
         (
@@ -24,9 +27,9 @@ from brevet_top_plot_a_route.route_point import RoutePoint
                 {"lat": 60.2, "lng": 30.2}
             ]""",
             [
-                RoutePoint(lat=60, lng=30, distance=0),
-                RoutePoint(lat=60.1, lng=30.1, distance=12428.210486152113),
-                RoutePoint(lat=60.2, lng=30.2, distance=24848.915263829265),
+                [60, 30, 0, 0],
+                [60.1, 30.1, 0, 12428.210486152113],
+                [60.2, 30.2, 0, 24848.915263829265],
             ],
         ),
     ],
@@ -37,4 +40,64 @@ def test_convert_route_points(track, expected):
     route.make_tracks()
 
     # verification
-    assert route.track == expected
+    if expected is None:
+        assert route.track is None
+    else:
+        assert np.allclose(route.track, expected)
+
+
+def test_make_tracks_controls():
+    # setup
+    route = Route(
+        route_data="""[
+            {"lat": 60, "lng": 30, "dir": "Start", "symlabs": [{"lat": 60.1, "lng": 30}]},
+            {"lat": 60.05, "lng": 30.05, "dir": "Turn left"},
+            {"lat": 60.1, "lng": 30.1, "labtxt": "CP1: shop"},
+            {"lat": 60.2, "lng": 30.2, "dir": "КП2", "unknown": 1},
+            {"lat": 60.3, "lng": 30.3}
+        ]"""
+    )
+
+    # action
+    route.make_tracks()
+
+    # verification
+    assert route.controls == [
+        RoutePoint(lat=60, lng=30, distance=0),
+        RoutePoint(lat=60.1, lng=30.1, distance=route.track[2, 3]),
+        RoutePoint(lat=60.2, lng=30.2, distance=route.track[3, 3]),
+    ]
+    assert route.controls[0].symlabs == [{"lat": 60.1, "lng": 30}]
+    assert [point.labtxt or point.dir for point in route.controls[1:]] == ["CP1: shop", "КП2"]
+    assert route.short_track[0] == RoutePoint(lat=60, lng=30, distance=0)
+    assert route.short_track[-1] == RoutePoint(lat=60.3, lng=30.3, distance=route.track[-1, 3])
+    assert np.all(np.diff(route.track[:, 3]) > 0)
+
+
+def test_make_tracks_short_track_size():
+    # setup: a winding 600 km route, a point every 60 meters
+    index = np.arange(10000)
+    points = [
+        {"lat": 60 + i * 4e-4 + np.sin(i / 40) * 1e-2, "lng": 30 + i * 4e-4 + np.cos(i / 75) * 2e-2} for i in index
+    ]
+    route = Route(route_data=json.dumps(points))
+
+    # action
+    route.make_tracks()
+
+    # verification: the same size as the alignment always had
+    assert len(route.short_track) == SHORT_TRACK_SIZE == 100
+    assert route.short_track[-1].distance == route.track[-1, 3]
+
+
+def test_route_fingerprint():
+    # setup
+    route = Route(route_data='[{"lat": 60, "lng": 30}, {"lat": 60.1, "lng": 30.1, "dir": "CP1"}]')
+    renamed = Route(route_data='[{"lat": 60, "lng": 30}, {"lat": 60.1, "lng": 30.1, "dir": "CP2"}]')
+    moved = Route(route_data='[{"lat": 60, "lng": 30}, {"lat": 60.1, "lng": 30.2, "dir": "CP1"}]')
+
+    # verification
+    assert route.fingerprint() == renamed.fingerprint()
+    assert route.fingerprint() != moved.fingerprint()
+    assert route.short_track is None
+    assert Route(route_data="[]").fingerprint() is None
@@ -1,5 +1,3 @@
-from brevet_top_plot_a_route.route_point import PlotARoutePoint
-
 from brevet_top_plot_a_route.route import Route
 
 
@@ -25,4 +23,4 @@ def test_full():
     # verification
     assert repr(a) == "<Route name=test distance=123.45>"
     assert a.route_id == 12345
-    assert a.route_data == [PlotARoutePoint(lat=40.78, lng=43.86, dir="Start on a square")]
+    assert a.route_data == [{"lat": 40.78, "lng": 43.86, "dir": "Start on a square"}]
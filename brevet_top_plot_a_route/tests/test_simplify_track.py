@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from brevet_top_plot_a_route.utils import _farthest_point, project_track, simplify_track
+
+
+def make_route(size: int) -> np.ndarray:
+    # a winding road heading north-east, about 30 meters between points
+    index = np.arange(size, dtype=np.float64)
+    track = np.zeros(shape=(size, 4), dtype=np.float64)
+    track[:, 0] = 60 + index * 2e-4 + np.sin(index / 40) * 2e-3
+    track[:, 1] = 30 + index * 2e-4 + np.cos(index / 75) * 4e-3
+    return track
+
+
+def max_deviation(track: np.ndarray, mask: np.ndarray) -> float:
+    plane = project_track(track)
+    kept = np.flatnonzero(mask)
+    deviation = 0.0
+    for start, end in zip(kept[:-1], kept[1:]):
+        if end - start > 1:
+            deviation = max(deviation, _farthest_point(plane, start, end)[1])
+    return deviation
+
+
+@pytest.mark.parametrize(
+    ("track", "expected"),
+    [
+        ([], []),
+        ([[60, 30]], [True]),
+        ([[60, 30], [60.1, 30.1]], [True, True]),
+        ([[60, 30], [60.1, 30.1], [60.1, 30.1]], [True, False, True]),
+        ([[60, 30], [60.1, 30.1], [60.2, 30.2]], [True, False, True]),
+        ([[60, 30], [60.3, 30.1], [60.2, 30.2]], [True, True, True]),
+        # a loop
+        ([[60, 30], [60.1, 30.1], [60, 30]], [True, True, True]),
+    ],
+)
+def test_simplify_track_small(track: list, expected: list):
+    # setup
+    array = np.array(track, dtype=np.float64).reshape(-1, 2)
+
+    # verification
+    assert simplify_track(array).tolist() == expected
+
+
+def test_simplify_track_tolerance():
+    # setup
+    track = make_route(3000)
+
+    # action
+    mask = simplify_track(track, tolerance=50)
+
+    # verification
+    assert mask[0] and mask[-1]
+    assert max_deviation(track, mask) <= 50
+
+
+def test_simplify_track_rdp():
+    # setup: the classic recursive RDP is a dev only dependency
+    rdp = pytest.importorskip("rdp").rdp
+    track = make_route(3000)
+    plane = project_track(track)
+
+    # action
+    mask = simplify_track(track, tolerance=50)
+
+    # verification: the same as the classic recursive RDP in meters
+    assert np.array_equal(mask, rdp(plane, 50, algo="iter", return_mask=True))
+
+
+@pytest.mark.parametrize("size", [2, 10, 200])
+def test_simplify_track_size(size: int):
+    # setup
+    track = make_route(5000)
+
+    # action
+    mask = simplify_track(track, size=size, tolerance=0)
+    coarse = simplify_track(track, size=size // 2, tolerance=0)
+
+    # verification
+    assert np.count_nonzero(mask) == size
+    assert mask[0] and mask[-1]
+    # the worst segments are split first, so a smaller target is a subset
+    assert not np.any(coarse & ~mask)
+
+
+def test_simplify_track_long():
+    # setup
+    rdp = pytest.importorskip("rdp").rdp
+    track = make_route(30000)
+    plane = project_track(track)
+
+    # action
+    mask = simplify_track(track[:3000], tolerance=100)
+    expected = rdp(plane[:3000], 100, algo="iter", return_mask=True)
+    full = simplify_track(track, size=200, tolerance=100)
+
+    # verification
+    assert np.array_equal(mask, expected)
+    assert np.count_nonzero(full) <= 200
+    assert max_deviation(track, full) <= 100
@@ -1,6 +1,9 @@
+from unittest.mock import patch
+
 import pytest
 
-from brevet_top_plot_a_route.utils import get_map_id_from_url, route_down_sample_factor
+from brevet_top_plot_a_route import utils
+from brevet_top_plot_a_route.utils import download_data, get_map_id_from_url
 
 
 @pytest.mark.parametrize(
@@ -20,25 +23,21 @@ def test_get_map_id_from_url(url: str, map_id: float):
     assert get_map_id_from_url(url) == map_id
 
 
-@pytest.mark.parametrize(
-    ("size", "length", "factor"),
-    [
-        (8000, 500, 0.01001),
-        (8000, 300, 0.00601),
-        (8000, 200, 0.004),
-        (4000, 300, 0.00602),
-        (4000, 200, 0.00401),
-        (2000, 200, 0.00402),
-        (2000, 100, 0.00201),
-        (2000, 50, 0.00101),
-        (1000, 100, 0.00202),
-        (1000, 50, 0.00101),
-        (500, 100, 0.00204),
-        (500, 50, 0.00102),
-        (200, 100, 0.0021),
-        (200, 50, 0.00105),
-        (100, 50, 0.0011),
-    ],
-)
-def test_route_down_sample_factor(size: int, length: int, factor: float):
-    assert round(route_down_sample_factor(size, length), 5) == factor
+@patch("brevet_top_plot_a_route.utils.cloudscraper.create_scraper")
+def test_download_data_scraper(mock_create):
+    # setup
+    utils._scraper = None
+    scraper = mock_create.return_value
+    scraper.get.return_value.json.return_value = {"RouteID": 1}
+
+    # action
+    download_data("https://example.com/1")
+    result = download_data("https://example.com/2")
+    scraper.get.return_value.raise_for_status.side_effect = IOError("403")
+    with pytest.raises(IOError):
+        download_data("https://example.com/3")
+
+    # verification
+    assert result == {"RouteID": 1}
+    mock_create.assert_called_once()
+    assert utils._scraper is None
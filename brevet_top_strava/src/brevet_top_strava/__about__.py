@@ -1,4 +1,4 @@
-__version__ = '0.1.8'
+__version__ = '0.1.21'
 __author__ = 'Grigorii Batalov'
 __license__ = 'MIT'
 __description__ = 'Utils for Strava service in the brevet.top'
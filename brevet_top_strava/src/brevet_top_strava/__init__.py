@@ -1,18 +1,19 @@
 import logging
 from timeit import default_timer as timer
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
-from brevet_top_numpy_utils import FloatArray, np_geo_distance_track
+from brevet_top_numpy_utils import FloatArray, np_geo_distance, np_geo_distance_track
 
 from .api import (auth_token, get_activities, get_activity, get_track_points,  # noqa: F401
                   refresh_tokens, TimeWindow, time_window, tokens_expired)  # noqa: F401
 from .build import build_checkpoint_list  # noqa: F401
 from .exceptions import ActivityError, ActivityNotFound, AthleteNotFound  # noqa: F401
-from .math import np_align_track_to_route
-from .simplify import (clear_stops, cut_off_epilog, cut_off_prolog,
-                       down_sample_mask)
+from .math import (np_align_segments, np_align_track_to_route, np_attach_windows, np_checkpoints_cost,
+                   np_control_windows, np_geo_distance_windowed, np_merge_checkpoints, np_refine_checkpoints)
+from .simplify import (DOWN_SAMPLE_INTERVAL, STOP_SPEED_MPS, clear_stops, collapse_stops, cut_off_epilog,
+                       cut_off_prolog, down_sample_mask)
 
 TRACK_SIMPLIFY_FACTOR: float = 0.0005
 TRACK_DEVIATION_MAX: int = 200
@@ -41,11 +42,37 @@ def track_alignment(
     brevet: dict,
     draft: FloatArray,
     checkpoints: FloatArray,
+    workers: int = 0,
+    window_slack: Optional[float] = None,
+    interval: int = DOWN_SAMPLE_INTERVAL,
+    refine: Optional[bool] = None,
+    collapse: bool = False,
+    stop_speed_mps: float = STOP_SPEED_MPS,
 ) -> FloatArray:
+    """
+    Compare the track to the brevet route and find check-in / check-out points.
+
+    :param brevet: a dict with the brevet details, short_track as an (n, 4) array or a list of points
+    :param draft: the track as [latitude, longitude, timestamp, distance] points
+    :param checkpoints: the checkpoint list (see build_checkpoint_list)
+    :param workers: align segments between controls in that many processes (0 - a single pass)
+    :param window_slack: seconds to extend the control time windows by, or None to match at any time
+    :param interval: down-sampling interval (meters) for the alignment
+    :param refine: look for the check-in / check-out points in the full resolution track afterwards
+        (None - only if the interval is larger than the default one)
+    :param collapse: collapse stationary runs of the track before the alignment
+    :param stop_speed_mps: the track is considered stationary below that speed (meters per second)
+    :return: a list of matching track points, one per checkpoint
+    """
     logging.info(f"Full track length {len(draft)}")
 
     start = timer()
-    down_sample = down_sample_mask(draft)
+    if collapse:
+        collapsed: FloatArray = collapse_stops(draft, stop_speed_mps)
+        logging.info(f"Stops collapsed, {len(draft) - len(collapsed)} points removed")
+        draft = collapsed
+
+    down_sample = down_sample_mask(draft, interval=interval)
 
     shortened: FloatArray = clear_stops(
         draft[down_sample]
@@ -63,9 +90,31 @@ def track_alignment(
         logging.error(message)
         raise ActivityNotFound(message)
 
-    # evaluate route / track similarity TODO: rename to shortTrack
-    short_track = brevet.get('short_track', [])
-    cost, reduced = np_align_track_to_route(np.array(short_track), shortened)
+    # evaluate route and checkpoints / track similarity in a single pass TODO: rename to shortTrack
+    route: FloatArray = np.asarray(brevet.get('short_track', []), dtype=np.float64).reshape(-1, 4)
+    merged, mask = np_merge_checkpoints(route, checkpoints)
+    aligned, cost_function = merged, np_geo_distance
+    if window_slack is not None and brevet.get("startDate"):
+        # limit check-in / check-out candidates to the control time windows: the segments are sliced by time,
+        # a single pass penalizes the points outside the windows instead
+        windows = np_control_windows(checkpoints, brevet["startDate"].timestamp(), window_slack)
+        aligned = np_attach_windows(merged, mask, windows)
+        if workers <= 1:
+            cost_function = np_geo_distance_windowed
+    cost, matched = (
+        np_align_segments(aligned, mask, shortened, workers, cost_function)
+        if workers > 1
+        else np_align_track_to_route(aligned, shortened, cost_function)
+    )
+    route = merged[~mask]
+    reduced: FloatArray = matched[~mask]
+    cp_reduced: FloatArray = matched[mask]
+
+    # exclude the checkpoint part from the total cost, the skipped checkpoints took the deletion cost
+    cost -= np_checkpoints_cost(aligned[mask], cp_reduced, cost_function)
+    skipped = int(np.count_nonzero(np.isnan(cp_reduced[:, 0])))
+    if skipped:
+        logging.info(f"{skipped} checkpoints skipped")
     # WARNING: Strava distances differ from local calculation
     if cost < -brevet.get("trackDeviation", len(reduced) * TRACK_DEVIATION_MAX):
         message = f"Track deviation {cost}"
@@ -73,29 +122,27 @@ def track_alignment(
         raise ActivityError(message)
 
     # re-calculate the cost ignoring distance from the start
-    cost_reviewed = np_geo_distance_track(np.array(short_track), reduced, factor=np.float64(0))
-    track_time = timer()
-    logging.info(f"Total track difference {cost} / {cost_reviewed}, took {track_time-start} sec.")
+    cost_reviewed = np_geo_distance_track(route, reduced, factor=np.float64(0))
+    logging.info(f"Total track difference {cost} / {cost_reviewed}")
 
     if cost_reviewed > brevet.get("trackDeviation", len(reduced) * TRACK_DEVIATION_MIN):
         message = f"Track deviation {cost_reviewed}"
         logging.error(message)
         raise ActivityError(message)
 
-    # TODO: include checkpoints in the route and compare to the reduced track instead of shortened
-    # evaluate checkpoints / track similarity
-    cost, reduced = np_align_track_to_route(np.array(checkpoints), shortened)
+    if refine or (refine is None and interval > DOWN_SAMPLE_INTERVAL):
+        cp_reduced = np_refine_checkpoints(draft, shortened, checkpoints, cp_reduced)
+
     # re-calculate the cost ignoring distance from the start
-    cost_reviewed = np_geo_distance_track(np.array(checkpoints), reduced, np.float64(0))
-    cp_time = timer()
-    logging.info(f"Total checkpoint difference {cost_reviewed}, took {cp_time-track_time} sec.")
+    cost_reviewed = np_geo_distance_track(checkpoints, cp_reduced, np.float64(0))
+    logging.info(f"Total checkpoint difference {cost_reviewed}, took {timer() - start} sec.")
 
     if cost_reviewed > brevet.get("controlDeviation", (len(checkpoints) / 2.0 + 1) * CONTROL_DEVIATION_FACTOR):
         message = f"Control point deviation {cost_reviewed}"
         logging.error(message)
         raise ActivityError(message)
 
-    if len(reduced) < len(checkpoints) / 2.0 + 1:
+    if len(cp_reduced) - skipped < len(checkpoints) / 2.0 + 1:
         message = "Checkpoint missing"
         logging.error(message)
         raise ActivityError(message)
@@ -106,7 +153,7 @@ def track_alignment(
     # plt.show()
 
     # report controls / timestamps
-    return reduced.tolist()
+    return cp_reduced.tolist()
 
 
 if __name__ == "__main__":
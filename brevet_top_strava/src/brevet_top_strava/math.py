@@ -1,18 +1,35 @@
-from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, List, Optional, Tuple
 
+import numpy as np
+import numpy.typing
 from numpy_hirschberg import align
 
+from brevet_top_misc_utils import get_control_window
 from brevet_top_numpy_utils import FloatArray, np_geo_distance
 
+from .simplify import DOWN_SAMPLE_INTERVAL, clear_stops, down_sample_mask
+
 MAX_POINT_DISTANCE = 3000
+CONTROL_MERGE_RADIUS = 500  # meters
+CONTROL_MERGE_DISTANCE = 2000  # meters along the route
+SPLIT_DISTANCE_FACTOR = np.float64(0.01)
+# worse than skipping the route point
+WINDOW_PENALTY = MAX_POINT_DISTANCE * 10
 
 
-def np_align_track_to_route(route: FloatArray, track: FloatArray) -> Tuple[float, FloatArray]:
+def np_align_track_to_route(
+    route: FloatArray,
+    track: FloatArray,
+    cost_function: Callable[[FloatArray, FloatArray], FloatArray] = np_geo_distance,
+) -> Tuple[float, FloatArray]:
     """
     Compare route and track sequences.
 
     :param route: original sequence to compare to
     :param track: GPS recorded points
+    :param cost_function: point to track distance calculator
     :return: a tuple (score, points)
 
     Use the score to decide if the match is good enough.
@@ -24,9 +41,303 @@ def np_align_track_to_route(route: FloatArray, track: FloatArray) -> Tuple[float
         track,
         deletion_cost=-MAX_POINT_DISTANCE,
         insertion_cost=0,
-        cost_function=np_geo_distance,
+        cost_function=cost_function,
     )
     mask = first.all(axis=1) != None  # noqa: E711
     second = second[mask]
     # second = second[second.all(axis=1) != None]  # noqa: E711
     return distance, second.astype(float)
+
+
+def np_checkpoints_cost(
+    checkpoints: FloatArray,
+    points: FloatArray,
+    cost_function: Callable[[FloatArray, FloatArray], FloatArray] = np_geo_distance,
+) -> float:
+    """
+    Calculate the part of the alignment score the checkpoints took.
+
+    :param checkpoints: the checkpoint rows of the aligned route (see np_merge_checkpoints)
+    :param points: the matching track points, NaN for the checkpoints the alignment skipped
+    :param cost_function: the point to track distance calculator the alignment used
+    :return: the score, negative as the alignment one
+
+    A matched checkpoint costs its distance to the track point, a skipped one costs the deletion.
+    """
+    skipped = np.isnan(points[:, 0])
+    distances = [
+        cost_function(checkpoint, point.reshape(1, -1))[0]
+        for checkpoint, point in zip(checkpoints[~skipped], points[~skipped])
+    ]
+    return -float(np.nansum(distances)) - MAX_POINT_DISTANCE * int(np.count_nonzero(skipped))
+
+
+def np_route_checkpoints(checkpoints: FloatArray) -> FloatArray:
+    """
+    Reorder the checkpoint columns to the route ones, so the checkpoints can stand among the route points.
+
+    :param checkpoints: the checkpoint list [latitude, longitude, distance, 0] (see build_checkpoint_list)
+    :return: array of [latitude, longitude, 0, distance]
+    """
+    return checkpoints.reshape(-1, 4)[:, [0, 1, 3, 2]]
+
+
+def np_merge_checkpoints(
+    route: FloatArray,
+    checkpoints: FloatArray,
+) -> Tuple[FloatArray, numpy.typing.NDArray[np.bool_]]:
+    """
+    Insert checkpoints into the route so both could be aligned to a track at once.
+
+    :param route: the route points [latitude, longitude, timestamp, distance]
+    :param checkpoints: the checkpoint list (see build_checkpoint_list)
+    :return: a tuple (merged points in the route form, mask of the checkpoints among them)
+
+    Each checkpoint goes next to the closest route point considering the distance from the start.
+    The checkpoint order is kept, so the masked points come in the original sequence.
+    Route points standing at a checkpoint are replaced by it not to compete for the same track points.
+    """
+    route = route.reshape(-1, 4)
+    checkpoints = np_route_checkpoints(checkpoints)
+    if len(route) < 1:
+        return checkpoints, np.full(shape=(len(checkpoints)), fill_value=True, dtype=bool)
+
+    offsets = np.array([np.argmin(np_geo_distance(cp, route)) for cp in checkpoints], dtype=int)
+    # insert after the closest point if the checkpoint is further along the route
+    offsets += checkpoints[:, 3] >= route[offsets, 3]
+    # keep the checkpoint order even if the route is tangled
+    offsets = np.maximum.accumulate(offsets)
+
+    covered = np.full(shape=(len(route)), fill_value=False, dtype=bool)
+    for cp in checkpoints:
+        covered |= (np_geo_distance(cp, route, factor=np.float64(0)) < CONTROL_MERGE_RADIUS) & (
+            abs(route[:, 3] - cp[3]) < CONTROL_MERGE_DISTANCE
+        )
+
+    merged: FloatArray = np.insert(route, offsets, checkpoints, axis=0)
+    mask = np.insert(np.full(shape=(len(route)), fill_value=False, dtype=bool), offsets, True)
+    keep = ~np.insert(covered, offsets, False)
+    return merged[keep], mask[keep]
+
+
+def np_align_segments(
+    route: FloatArray,
+    mask: numpy.typing.NDArray[np.bool_],
+    track: FloatArray,
+    workers: Optional[int] = None,
+    cost_function: Callable[[FloatArray, FloatArray], FloatArray] = np_geo_distance,
+) -> Tuple[float, FloatArray]:
+    """
+    Split the route and the track at the checkpoints and align the segments in parallel.
+
+    :param route: the route with checkpoints merged in
+    :param mask: the checkpoints mask for the route
+    :param track: GPS recorded points
+    :param workers: number of processes to run (defaults to the number of CPUs, 0 - one by one in this process)
+    :param cost_function: point to track distance calculator
+    :return: a tuple (score, points) the same as a single pass alignment gives
+
+    The route is being cut after the check-out copy of each intermediate control.
+    The track is being cut after the departure from the control.
+    If the route has the time window columns (see np_attach_windows), each track segment is also sliced
+    to the points recorded between the opening of the previous control and the closing of the segment's last one,
+    so the alignment only scans the points the controls could be matched to.
+    """
+    # check-out copies of the intermediate controls
+    controls = np.flatnonzero(mask)[2:-1:2]
+    if len(controls) < 1:
+        return np_align_track_to_route(route, track, cost_function)
+
+    track_cuts = np.array([_split_offset(route[i], track) for i in controls], dtype=int)
+    track_cuts = np.maximum.accumulate(track_cuts)
+
+    route_segments = np.split(route, controls + 1)
+    track_segments = np.split(track, track_cuts)
+    if route.shape[1] > 4:
+        track_segments = _window_segments(route, mask, controls, track_segments)
+
+    if workers == 0:
+        results = list(map(_align_segment, route_segments, track_segments, repeat(cost_function)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    _align_segment,
+                    route_segments,
+                    track_segments,
+                    repeat(cost_function),
+                )
+            )
+    return sum(cost for cost, _ in results), np.concatenate([points for _, points in results])
+
+
+def _align_segment(
+    route: FloatArray,
+    track: FloatArray,
+    cost_function: Callable[[FloatArray, FloatArray], FloatArray],
+) -> Tuple[float, FloatArray]:
+    if len(track) < 1:
+        return -MAX_POINT_DISTANCE * len(route), np.full(shape=(len(route), track.shape[1]), fill_value=np.nan)
+    return np_align_track_to_route(route, track, cost_function)
+
+
+def _window_segments(
+    route: FloatArray,
+    mask: numpy.typing.NDArray[np.bool_],
+    controls: numpy.typing.NDArray[np.int_],
+    track_segments: List[FloatArray],
+) -> List[FloatArray]:
+    """
+    Slice the track segments by time: a segment opens with the previous control's window
+    (the start one for the first segment) and closes with the window of its last control.
+    """
+    windows = route[mask, 4:6]
+    last = np.searchsorted(np.flatnonzero(mask), np.append(controls, len(route) - 1), side="right") - 1
+    openings = np.append(windows[0, 0], route[controls, 4])
+    bounds = [
+        (np.searchsorted(segment[:, 2], opening), np.searchsorted(segment[:, 2], closing, side="right"))
+        for segment, opening, closing in zip(track_segments, openings, windows[last, 1])
+    ]
+    return [segment[start:end] for segment, (start, end) in zip(track_segments, bounds)]
+
+
+def _split_offset(point: FloatArray, track: FloatArray) -> int:
+    """
+    Find the track position to cut at: after the departure from the point.
+    The point is a merged route row (see np_merge_checkpoints), so its distance is in the route column
+    and tells apart the passes of a loop by the same control.
+    The points around the control are cleared, so the stop shows up as a time gap next to the closest point.
+    The search is limited to the control time window if given.
+    """
+    start, end = 0, len(track)
+    if len(point) > 4:
+        start, end = np.searchsorted(track[:, 2], point[4]), np.searchsorted(track[:, 2], point[5], side="right")
+        if start >= end:
+            start, end = 0, len(track)
+    offset = start + int(np.argmin(np_geo_distance(point, track[start:end], factor=SPLIT_DISTANCE_FACTOR)))
+    if offset < 1 or offset >= len(track) - 1:
+        return offset + 1
+    before, after = np.diff(track[offset - 1 : offset + 2, 2])  # noqa: E203
+    return offset + 1 if before > after else offset + 2
+
+
+def np_control_windows(checkpoints: FloatArray, start: float, slack: float) -> FloatArray:
+    """
+    Calculate the time windows of the checkpoints.
+
+    :param checkpoints: the checkpoint list [latitude, longitude, distance, 0] (see build_checkpoint_list)
+    :param start: the brevet start timestamp
+    :param slack: extra seconds before the opening and after the closing
+    :return: array of [opening, closing] timestamps, unlimited beyond the control window table
+    """
+    distances = np_route_checkpoints(checkpoints)[:, 3]
+    hours: FloatArray = np.array([get_control_window(d / 1000) for d in distances], dtype=np.float64).reshape(-1, 2)
+    windows: FloatArray = start + hours * 3600 + np.array([-slack, slack])
+    # get_control_window falls back to (0, 0) beyond 2000 km, no window there
+    windows[(hours == 0).all(axis=1)] = (-np.inf, np.inf)
+    return windows
+
+
+def np_attach_windows(route: FloatArray, mask: numpy.typing.NDArray[np.bool_], windows: FloatArray) -> FloatArray:
+    """
+    Append [opening, closing] columns to the route points. Only checkpoints are limited in time.
+
+    :param route: the route with checkpoints merged in
+    :param mask: the checkpoints mask for the route
+    :param windows: the checkpoint time windows
+    :return: array of [latitude, longitude, timestamp, distance, opening, closing]
+    """
+    bounds: FloatArray = np.full(shape=(len(route), 2), fill_value=(-np.inf, np.inf), dtype=np.float64)
+    bounds[mask] = windows
+    return np.hstack((route, bounds))
+
+
+def np_geo_distance_windowed(point: FloatArray, track: FloatArray) -> FloatArray:
+    """
+    Calculate a distance from the given point to each point of the track.
+    Track points recorded outside the point's time window are penalized.
+
+    :param point: the subject point as [latitude, longitude, timestamp, distance, opening, closing]
+    :param track: the track as a list of points
+    :return: a list of distances
+    """
+    distance: FloatArray = np_geo_distance(point, track)
+    distance[(track.T[2] < point[4]) | (track.T[2] > point[5])] = WINDOW_PENALTY
+    return distance
+
+
+def np_refine_checkpoints(
+    draft: FloatArray,
+    track: FloatArray,
+    checkpoints: FloatArray,
+    points: FloatArray,
+    interval: int = DOWN_SAMPLE_INTERVAL,
+) -> FloatArray:
+    """
+    Look for better check-in / check-out points in the full resolution track.
+
+    :param draft: the full resolution track
+    :param track: the down-sampled track the points were matched to
+    :param checkpoints: the checkpoint list (see build_checkpoint_list)
+    :param points: the matching track points, one per checkpoint
+    :param interval: the down-sampling interval (meters) of the candidates
+    :return: the refined points
+
+    The candidates are the draft points a default interval alignment would see: down-sampled and cleared
+    around the checkpoints. The search is limited to the candidates between the neighbours of the matched points
+    in the down-sampled track and recorded after the previous check-in.
+    The check-in / check-out copies of a control are matched together to consecutive candidates
+    with the least total distance to the control, the same as the alignment does.
+    """
+    candidates: FloatArray = clear_stops(draft[down_sample_mask(draft, interval=interval)], checkpoints)
+    refined: FloatArray = points.copy()
+    previous = -np.inf
+    i = 0
+    while i < len(checkpoints):
+        if np.isnan(points[i, 2]):
+            i += 1
+            continue
+        # the copies of the same control
+        group = i + 1
+        while (
+            group < len(checkpoints)
+            and not np.isnan(points[group, 2])
+            and np.array_equal(checkpoints[group, 0:2], checkpoints[i, 0:2])
+        ):
+            group += 1
+
+        first = np.searchsorted(track[:, 2], points[i, 2])
+        last = np.searchsorted(track[:, 2], points[group - 1, 2])
+        before = track[first - 1, 2] if first > 0 else -np.inf
+        after = track[last + 1, 2] if last + 1 < len(track) else np.inf
+        start = np.searchsorted(candidates[:, 2], max(before, previous), side="right" if previous >= before else "left")
+        end = np.searchsorted(candidates[:, 2], after, side="right")
+        if end - start >= group - i:
+            window = candidates[start:end]
+            distance = np_geo_distance(checkpoints[i], window, factor=np.float64(0))
+            for j, best in zip(range(i, group), _best_sequence(distance, group - i)):
+                matched = min(np.searchsorted(draft[:, 2], points[j, 2]), len(draft) - 1)
+                refined[j, 0:3] = window[best, 0:3]
+                # the distance column of the points is shifted by the prolog cut-off
+                refined[j, 3] += window[best, 3] - draft[matched, 3]
+        previous = refined[group - 1, 2]
+        i = group
+    return refined
+
+
+def _best_sequence(distance: FloatArray, size: int) -> List[int]:
+    """
+    Choose increasing offsets of that many points with the least total distance.
+    """
+    offsets = np.arange(len(distance))
+    total = distance.copy()
+    choices = []
+    for _ in range(1, size):
+        # the best previous choice up to each offset
+        best = np.minimum.accumulate(total)
+        choices.append(np.maximum.accumulate(np.where(total == best, offsets, 0)))
+        total = np.append(np.inf, best[:-1] + distance[1:])
+    sequence = [int(np.argmin(total))]
+    for choice in reversed(choices):
+        sequence.append(int(choice[sequence[-1] - 1]))
+    return sequence[::-1]
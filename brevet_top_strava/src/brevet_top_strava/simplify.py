@@ -7,6 +7,7 @@ from brevet_top_numpy_utils import FloatArray, np_geo_distance
 CHECKPOINT_RADIUS = 100  # meters
 DOWN_SAMPLE_INTERVAL = 100  # meters
 LOOKUP_AHEAD_POINTS = 200
+STOP_SPEED_MPS = 0.5  # meters per second, a walking pace is about 1.4
 
 
 def clear_stops(track: FloatArray, checkpoints: FloatArray) -> FloatArray:
@@ -23,6 +24,29 @@ def clear_stops(track: FloatArray, checkpoints: FloatArray) -> FloatArray:
     return track[mask]
 
 
+def collapse_stops(track: FloatArray, stop_speed_mps: float = STOP_SPEED_MPS) -> FloatArray:
+    """
+    Collapse stationary runs (cafés, traffic lights, hotels) leaving only the first and the last point of each.
+
+    :param track: the track points
+    :param stop_speed_mps: segments slower than that (meters per second) are considered stationary
+    :return: reduced track
+
+    The speed is only known for the segments with both timestamps set and increasing,
+    the others (equal, missing or reordered timestamps) are never stationary.
+    """
+    if len(track) < 3:
+        return track
+    timestamps = track[:, 2]
+    elapsed = np.diff(timestamps)
+    timed = (elapsed > 0) & (timestamps[:-1] > 0)
+    stationary = timed & (np.diff(track[:, 3]) < stop_speed_mps * np.where(timed, elapsed, 0))
+    mask = np.full(shape=(track.shape[0]), fill_value=True, dtype=bool)
+    # drop the points surrounded by stationary segments
+    mask[1:-1] = ~(stationary[:-1] & stationary[1:])
+    return track[mask]
+
+
 def cut_off_epilog(track: FloatArray, end: FloatArray) -> FloatArray:
     """
     Remove points after the last route point.
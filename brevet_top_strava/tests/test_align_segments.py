@@ -0,0 +1,151 @@
+import csv
+import pathlib
+
+import numpy as np
+import pytest
+
+from brevet_top_numpy_utils import FloatArray
+from brevet_top_strava import build_checkpoint_list
+from brevet_top_strava.math import _split_offset, np_align_segments, np_align_track_to_route, np_merge_checkpoints
+from brevet_top_strava.simplify import clear_stops, cut_off_epilog, cut_off_prolog, down_sample_mask
+
+CONTROLS = [
+    {"uid": "start", "coordinates": [61.794567, 34.376714], "distance": 0},
+    {"uid": "cp1", "coordinates": [62.4756046, 33.8108947], "distance": 102},
+    {"uid": "cp2", "coordinates": [61.8990356, 34.2402839], "distance": 186},
+    {"uid": "cp3", "coordinates": [61.8451562, 33.2059313], "distance": 250},
+    {"uid": "cp4", "coordinates": [62.0858942, 32.3777768], "distance": 312},
+    {"uid": "cp5", "coordinates": [61.6315222, 33.1801236], "distance": 400},
+    {"uid": "cp6", "coordinates": [61.6601033, 31.3930076], "distance": 511},
+    {"uid": "cp7", "coordinates": [61.9088612, 30.6221674], "distance": 577},
+    {"uid": "finish", "coordinates": [61.700979, 30.689884], "distance": 604},
+]
+CHECKPOINTS, _ = build_checkpoint_list(CONTROLS)
+
+
+def read_csv(file_name: str) -> FloatArray:
+    file_path = pathlib.Path(__file__).parent.absolute() / "files" / "track_n_route" / file_name
+    with open(file_path, newline="", encoding="utf-8") as csv_file:
+        table = csv.reader(csv_file, delimiter=",", quotechar='"')
+        return np.array([row for row in table], dtype=np.float64)
+
+
+def control(uid: str, latitude: float, longitude: float, distance: float) -> dict:
+    return {"uid": uid, "coordinates": [latitude, longitude], "distance": distance}
+
+
+def shorten(track: FloatArray, checkpoints: FloatArray) -> FloatArray:
+    # the same as track_alignment does
+    draft = track[down_sample_mask(track)]
+    return clear_stops(cut_off_prolog(cut_off_epilog(draft, checkpoints[-1]), checkpoints[0]), checkpoints)
+
+
+@pytest.fixture
+def route() -> FloatArray:
+    return read_csv("route.csv")
+
+
+@pytest.fixture
+def track() -> FloatArray:
+    return shorten(read_csv("track.csv"), CHECKPOINTS)
+
+
+def test_align_segments_workers(route: FloatArray, track: FloatArray):
+    # setup
+    merged, mask = np_merge_checkpoints(route, CHECKPOINTS)
+
+    # action
+    cost, points = np_align_segments(merged, mask, track, workers=0)
+    cost_parallel, points_parallel = np_align_segments(merged, mask, track, workers=2)
+
+    # verification: the processes change nothing
+    assert cost == cost_parallel
+    assert np.array_equal(points, points_parallel, equal_nan=True)
+    assert points.shape == (len(merged), 4)
+
+
+def test_align_segments_single_pass(route: FloatArray, track: FloatArray):
+    # setup
+    merged, mask = np_merge_checkpoints(route, CHECKPOINTS)
+
+    # action
+    _, points = np_align_segments(merged, mask, track, workers=0)
+    _, expected = np_align_track_to_route(merged, track)
+
+    # verification: the same check-ins as the whole track gives
+    assert points[mask].tolist() == expected[mask].tolist()
+
+
+def test_align_segments_no_intermediate_controls(route: FloatArray, track: FloatArray):
+    # setup
+    checkpoints, _ = build_checkpoint_list([CONTROLS[0], CONTROLS[-1]])
+    merged, mask = np_merge_checkpoints(route, checkpoints)
+
+    # action
+    cost, points = np_align_segments(merged, mask, track, workers=0)
+    expected_cost, expected = np_align_track_to_route(merged, track)
+
+    # verification: a single pass
+    assert cost == expected_cost
+    assert points.tolist() == expected.tolist()
+
+
+def test_align_segments_unfinished(route: FloatArray, track: FloatArray):
+    # setup: the track ends after cp6
+    merged, mask = np_merge_checkpoints(route, CHECKPOINTS)
+    unfinished = track[track[:, 2] < 1629029000]
+
+    # action
+    _, points = np_align_segments(merged, mask, unfinished, workers=0)
+    _, expected = np_align_segments(merged, mask, track, workers=0)
+
+    # verification: cp7 and the finish are skipped, the rest is matched as usual
+    assert np.isnan(points[mask][-3:]).all()
+    assert points[mask][:-3].tolist() == expected[mask][:-3].tolist()
+
+
+def test_split_offset_loop():
+    # setup: the loop passes the control twice, the rider stops there each time
+    route = np.array(
+        [
+            (60.0, 30.0, 0.0, 0.0),
+            (60.05, 30.0, 0.0, 5000.0),
+            (60.1, 30.0, 0.0, 10000.0),
+            (60.1, 30.1, 0.0, 15000.0),
+            (60.15, 30.05, 0.0, 20000.0),
+            (60.1, 30.0, 0.0, 25000.0),
+            (60.05, 30.0, 0.0, 30000.0),
+            (60.0, 30.0, 0.0, 35000.0),
+        ]
+    )
+    track = np.array(
+        [
+            (60.0, 30.0, 0.0, 0.0),
+            (60.05, 30.0, 600.0, 5000.0),
+            (60.1, 30.0, 1200.0, 10000.0),
+            (60.1, 30.0, 2400.0, 10000.0),
+            (60.1, 30.1, 3000.0, 15000.0),
+            (60.15, 30.05, 3600.0, 20000.0),
+            (60.1, 30.0, 4200.0, 25000.0),
+            (60.1, 30.0, 5400.0, 25000.0),
+            (60.05, 30.0, 6000.0, 30000.0),
+            (60.0, 30.0, 6600.0, 35000.0),
+        ]
+    )
+    checkpoints, _ = build_checkpoint_list(
+        [
+            control("start", 60.0, 30.0, 0),
+            control("cp1", 60.1, 30.0, 10),
+            control("cp2", 60.1, 30.0, 25),
+            control("finish", 60.0, 30.0, 35),
+        ]
+    )
+    merged, mask = np_merge_checkpoints(route, checkpoints)
+    controls = np.flatnonzero(mask)[2:-1:2]
+
+    # action
+    cuts = [_split_offset(merged[i], track) for i in controls]
+
+    # verification: each control cuts the track after the departure from its own pass
+    assert merged[controls, 3].tolist() == [10000.0, 25000.0]
+    assert cuts == [4, 8]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from brevet_top_numpy_utils import np_geo_distance
+from brevet_top_strava.math import MAX_POINT_DISTANCE, WINDOW_PENALTY, np_checkpoints_cost, np_geo_distance_windowed
+
+CHECKPOINTS = np.array(
+    [
+        (60.0, 30.0, 0.0, 0.0),
+        (60.1, 30.1, 0.0, 12000.0),
+        (60.1, 30.1, 0.0, 12000.0),
+        (60.2, 30.2, 0.0, 24000.0),
+    ]
+)
+POINTS = np.array(
+    [
+        (60.0, 30.001, 1000.0, 0.0),
+        (60.1, 30.101, 2000.0, 12000.0),
+        (60.1, 30.102, 2600.0, 12100.0),
+        (60.2, 30.201, 4000.0, 24000.0),
+    ]
+)
+
+
+def test_checkpoints_cost():
+    # setup
+    expected = -sum(
+        np_geo_distance(checkpoint, point.reshape(1, -1))[0] for checkpoint, point in zip(CHECKPOINTS, POINTS)
+    )
+
+    # action
+    cost = np_checkpoints_cost(CHECKPOINTS, POINTS)
+
+    # verification
+    assert np.isclose(cost, expected)
+    assert -300 < cost < 0
+
+
+def test_checkpoints_cost_skipped():
+    # setup: the rider skipped the intermediate control, the alignment deleted both copies
+    points = POINTS.copy()
+    points[1:3] = np.nan
+
+    # action
+    cost = np_checkpoints_cost(CHECKPOINTS, points)
+
+    # verification
+    assert np.isclose(cost, np_checkpoints_cost(CHECKPOINTS[[0, 3]], POINTS[[0, 3]]) - 2 * MAX_POINT_DISTANCE)
+
+
+def test_checkpoints_cost_windowed():
+    # setup: the check-out is recorded after the control closing
+    windows = np.array([(0.0, 1000.0), (1000.0, 2500.0), (1000.0, 2500.0), (3000.0, 5000.0)])
+    checkpoints = np.hstack((CHECKPOINTS, windows))
+
+    # action
+    cost = np_checkpoints_cost(checkpoints, POINTS, np_geo_distance_windowed)
+
+    # verification: the penalty the alignment took
+    assert np.isclose(cost, np_checkpoints_cost(CHECKPOINTS[[0, 1, 3]], POINTS[[0, 1, 3]]) - WINDOW_PENALTY)
@@ -0,0 +1,78 @@
+import numpy as np
+
+from brevet_top_strava.simplify import collapse_stops
+
+TRACK = np.array(
+    [
+        (60.0, 30.0, 1234567890.0, 0.0),
+        (60.1, 30.1, 1234567900.0, 100.0),
+        (60.1, 30.1, 1234567910.0, 101.0),
+        (60.1, 30.1, 1234567920.0, 101.0),
+        (60.1, 30.1, 1234567930.0, 102.0),
+        (60.2, 30.2, 1234567940.0, 200.0),
+        (60.2, 30.2, 1234567940.0, 200.0),
+        (60.3, 30.3, 1234567950.0, 300.0),
+    ]
+)
+
+
+def test_collapse_stops():
+    # setup
+    expected = [
+        [60.0, 30.0, 1234567890.0, 0.0],
+        [60.1, 30.1, 1234567900.0, 100.0],
+        [60.1, 30.1, 1234567930.0, 102.0],
+        [60.2, 30.2, 1234567940.0, 200.0],
+        [60.2, 30.2, 1234567940.0, 200.0],
+        [60.3, 30.3, 1234567950.0, 300.0],
+    ]
+
+    # action
+    reduced = collapse_stops(TRACK)
+
+    # verification
+    assert reduced.tolist() == expected
+
+
+def test_collapse_stops_short():
+    # action
+    reduced = collapse_stops(TRACK[:2])
+
+    # verification
+    assert reduced.tolist() == TRACK[:2].tolist()
+
+
+def test_collapse_stops_speed():
+    # action: 0.1 m/s of GPS drift is a movement now, a single standing segment is kept
+    reduced = collapse_stops(TRACK, stop_speed_mps=0.05)
+
+    # verification
+    assert reduced.tolist() == TRACK.tolist()
+
+
+def test_collapse_stops_no_timestamps():
+    # setup
+    zeros = TRACK.copy()
+    zeros[:, 2] = 0
+    missing = TRACK.copy()
+    missing[:, 2] = np.nan
+
+    # action
+    reduced_zeros = collapse_stops(zeros)
+    reduced_missing = collapse_stops(missing)
+
+    # verification
+    assert reduced_zeros.tolist() == zeros.tolist()
+    assert len(reduced_missing) == len(missing)
+
+
+def test_collapse_stops_partial_timestamps():
+    # setup: the device got the time fix in the middle of the stop
+    track = TRACK.copy()
+    track[:3, 2] = 0
+
+    # action
+    reduced = collapse_stops(track)
+
+    # verification: no speed is made up across the missing timestamps
+    assert reduced.tolist() == track.tolist()
@@ -0,0 +1,118 @@
+import numpy as np
+
+from brevet_top_strava import build_checkpoint_list
+from brevet_top_strava.math import (
+    WINDOW_PENALTY,
+    _window_segments,
+    np_attach_windows,
+    np_control_windows,
+    np_geo_distance_windowed,
+)
+
+START = 1628915400.0
+
+
+def test_control_windows():
+    # setup
+    checkpoints, _ = build_checkpoint_list(
+        [
+            {"uid": "start", "coordinates": [60.0, 30.0], "distance": 0},
+            {"uid": "cp1", "coordinates": [60.1, 30.1], "distance": 200},
+            {"uid": "finish", "coordinates": [60.2, 30.2], "distance": 300},
+        ]
+    )
+
+    # action
+    windows = np_control_windows(checkpoints, START, slack=600)
+
+    # verification
+    assert np.around((windows - START) / 3600, 3).tolist() == [
+        [-0.167, 1.167],
+        [5.724, 13.508],
+        [5.724, 13.508],
+        [8.849, 20.175],
+    ]
+
+
+def test_control_windows_beyond_table():
+    # setup
+    checkpoints, _ = build_checkpoint_list(
+        [
+            {"uid": "start", "coordinates": [60.0, 30.0], "distance": 0},
+            {"uid": "cp1", "coordinates": [60.1, 30.1], "distance": 1900},
+            {"uid": "cp2", "coordinates": [60.2, 30.2], "distance": 2100},
+            {"uid": "finish", "coordinates": [60.3, 30.3], "distance": 2200},
+        ]
+    )
+
+    # action
+    windows = np_control_windows(checkpoints, START, slack=600)
+
+    # verification
+    assert np.isfinite(windows[:3]).all()
+    assert windows[3:].tolist() == [[-np.inf, np.inf]] * 3
+
+
+def test_attach_windows():
+    # setup
+    route = np.array(
+        [
+            (60.0, 30.0, 0.0, 0.0),
+            (60.05, 30.05, 0.0, 6000.0),
+            (60.1, 30.1, 0.0, 12000.0),
+        ]
+    )
+    mask = np.array([True, False, True])
+    windows = np.array([(100.0, 200.0), (300.0, 400.0)])
+
+    # action
+    limited = np_attach_windows(route, mask, windows)
+
+    # verification
+    assert limited[:, 4:].tolist() == [[100.0, 200.0], [-np.inf, np.inf], [300.0, 400.0]]
+    assert limited[:, :4].tolist() == route.tolist()
+
+
+def test_geo_distance_windowed():
+    # setup
+    point = np.array([60.0, 30.0, 0.0, 0.0, 110.0, 130.0])
+    track = np.array(
+        [
+            (60.0, 30.0, 100.0, 0.0),
+            (60.0, 30.0, 110.0, 0.0),
+            (60.0, 30.0, 120.0, 0.0),
+            (60.0, 30.0, 130.0, 0.0),
+            (60.0, 30.0, 140.0, 0.0),
+        ]
+    )
+
+    # action
+    distance = np_geo_distance_windowed(point, track)
+
+    # verification
+    assert distance.tolist() == [WINDOW_PENALTY, 0.0, 0.0, 0.0, WINDOW_PENALTY]
+
+
+def test_window_segments():
+    # setup: start, a control (check-in, check-out) and finish with the route points between
+    route = np.array(
+        [
+            (60.0, 30.0, 0.0, 0.0, 100.0, 200.0),
+            (60.05, 30.05, 0.0, 6000.0, -np.inf, np.inf),
+            (60.1, 30.1, 0.0, 12000.0, 300.0, 400.0),
+            (60.1, 30.1, 0.0, 12000.0, 300.0, 400.0),
+            (60.15, 30.15, 0.0, 18000.0, -np.inf, np.inf),
+            (60.2, 30.2, 0.0, 24000.0, 500.0, 600.0),
+        ]
+    )
+    mask = np.array([True, False, True, True, False, True])
+    track = np.zeros(shape=(12, 4))
+    track[:, 2] = np.arange(12) * 60.0  # 0 ... 660
+    segments = np.split(track, [5])
+
+    # action
+    limited = _window_segments(route, mask, np.array([3]), segments)
+
+    # verification: the first segment is limited to [100, 400], the second one to [300, 600]
+    assert limited[0][:, 2].tolist() == [120.0, 180.0, 240.0]
+    assert limited[1][:, 2].tolist() == [300.0, 360.0, 420.0, 480.0, 540.0, 600.0]
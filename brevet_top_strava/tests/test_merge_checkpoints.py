@@ -0,0 +1,86 @@
+import numpy as np
+
+from brevet_top_strava import build_checkpoint_list
+from brevet_top_strava.math import np_merge_checkpoints, np_route_checkpoints
+
+ROUTE = np.array(
+    [
+        (60.0, 30.0, 0.0, 0.0),
+        (60.05, 30.05, 0.0, 6000.0),
+        (60.1, 30.1, 0.0, 12000.0),
+        (60.15, 30.15, 0.0, 18000.0),
+        (60.2, 30.2, 0.0, 24000.0),
+    ]
+)
+
+
+def control(uid: str, latitude: float, longitude: float, distance: float) -> dict:
+    return {"uid": uid, "coordinates": [latitude, longitude], "distance": distance}
+
+
+def test_route_checkpoints():
+    # setup
+    checkpoints, _ = build_checkpoint_list([control("start", 60.0, 30.0, 0), control("finish", 60.2, 30.2, 24)])
+
+    # action
+    points = np_route_checkpoints(checkpoints)
+
+    # verification: the distance goes to the route column
+    assert checkpoints.tolist() == [[60.0, 30.0, 0.0, 0.0], [60.2, 30.2, 24000.0, 0.0]]
+    assert points.tolist() == [[60.0, 30.0, 0.0, 0.0], [60.2, 30.2, 0.0, 24000.0]]
+
+
+def test_merge_checkpoints_empty_route():
+    # setup
+    checkpoints, _ = build_checkpoint_list([control("start", 60.0, 30.0, 0), control("finish", 60.2, 30.2, 24)])
+
+    # action
+    merged, mask = np_merge_checkpoints(np.array([]), checkpoints)
+
+    # verification
+    assert merged.tolist() == np_route_checkpoints(checkpoints).tolist()
+    assert mask.tolist() == [True, True]
+
+
+def test_merge_checkpoints():
+    # setup
+    checkpoints, _ = build_checkpoint_list(
+        [control("start", 60.0, 30.0, 0), control("cp1", 60.102, 30.102, 12), control("finish", 60.2, 30.2, 24)]
+    )
+    expected = [
+        [60.0, 30.0, 0.0, 0.0],
+        [60.05, 30.05, 0.0, 6000.0],
+        [60.102, 30.102, 0.0, 12000.0],
+        [60.102, 30.102, 0.0, 12000.0],
+        [60.15, 30.15, 0.0, 18000.0],
+        [60.2, 30.2, 0.0, 24000.0],
+    ]
+
+    # action
+    merged, mask = np_merge_checkpoints(ROUTE, checkpoints)
+
+    # verification
+    assert merged.tolist() == expected
+    assert mask.tolist() == [True, False, True, True, False, True]
+    assert merged[mask].tolist() == np_route_checkpoints(checkpoints).tolist()
+
+
+def test_merge_checkpoints_out_and_back():
+    # setup
+    route = np.array(
+        [
+            (60.0, 30.0, 0.0, 0.0),
+            (60.1, 30.1, 0.0, 12000.0),
+            (60.2, 30.2, 0.0, 24000.0),
+            (60.1, 30.1, 0.0, 36000.0),
+            (60.0, 30.0, 0.0, 48000.0),
+        ]
+    )
+    checkpoints, _ = build_checkpoint_list([control("turn", 60.2, 30.2, 24), control("finish", 60.0, 30.0, 48)])
+
+    # action
+    merged, mask = np_merge_checkpoints(route, checkpoints)
+
+    # verification: the finish goes after the second pass by the start
+    assert merged[:, 3].tolist() == [0.0, 12000.0, 24000.0, 36000.0, 48000.0]
+    assert mask.tolist() == [False, False, True, False, True]
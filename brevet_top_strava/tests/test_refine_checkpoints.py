@@ -0,0 +1,108 @@
+import csv
+import pathlib
+from typing import Tuple
+
+import numpy as np
+import pytest
+
+from brevet_top_numpy_utils import FloatArray
+from brevet_top_strava import build_checkpoint_list
+from brevet_top_strava.math import _best_sequence, np_align_track_to_route, np_merge_checkpoints, np_refine_checkpoints
+from brevet_top_strava.simplify import clear_stops, cut_off_epilog, cut_off_prolog, down_sample_mask
+
+CONTROLS = [
+    {"uid": "start", "coordinates": [61.794567, 34.376714], "distance": 0},
+    {"uid": "cp1", "coordinates": [62.4756046, 33.8108947], "distance": 102},
+    {"uid": "cp2", "coordinates": [61.8990356, 34.2402839], "distance": 186},
+    {"uid": "cp3", "coordinates": [61.8451562, 33.2059313], "distance": 250},
+    {"uid": "cp4", "coordinates": [62.0858942, 32.3777768], "distance": 312},
+    {"uid": "cp5", "coordinates": [61.6315222, 33.1801236], "distance": 400},
+    {"uid": "cp6", "coordinates": [61.6601033, 31.3930076], "distance": 511},
+    {"uid": "cp7", "coordinates": [61.9088612, 30.6221674], "distance": 577},
+    {"uid": "finish", "coordinates": [61.700979, 30.689884], "distance": 604},
+]
+CHECKPOINTS, _ = build_checkpoint_list(CONTROLS)
+
+# the default interval alignment check-ins
+CHECKINS = [
+    1628915466,
+    1628930227,
+    1628930240,
+    1628946837,
+    1628949524,
+    1628963275,
+    1628966872,
+    1628977002,
+    1628977206,
+    1629000504,
+    1629001103,
+    1629028901,
+    1629028919,
+    1629043779,
+    1629044813,
+    1629051792,
+]
+
+
+def read_csv(file_name: str) -> FloatArray:
+    file_path = pathlib.Path(__file__).parent.absolute() / "files" / "track_n_route" / file_name
+    with open(file_path, newline="", encoding="utf-8") as csv_file:
+        table = csv.reader(csv_file, delimiter=",", quotechar='"')
+        return np.array([row for row in table], dtype=np.float64)
+
+
+@pytest.fixture
+def draft() -> FloatArray:
+    return read_csv("track.csv")
+
+
+def align(draft: FloatArray, interval: int) -> Tuple[FloatArray, FloatArray]:
+    # the same as track_alignment does, returns the down-sampled track and the check-in points
+    track = draft[down_sample_mask(draft, interval=interval)]
+    track = clear_stops(cut_off_prolog(cut_off_epilog(track, CHECKPOINTS[-1]), CHECKPOINTS[0]), CHECKPOINTS)
+    merged, mask = np_merge_checkpoints(read_csv("route.csv"), CHECKPOINTS)
+    _, matched = np_align_track_to_route(merged, track)
+    return track, matched[mask]
+
+
+@pytest.mark.parametrize("interval", [100, 250, 500])
+def test_refine_checkpoints(draft: FloatArray, interval: int):
+    # setup
+    track, points = align(draft, interval)
+
+    # action
+    refined = np_refine_checkpoints(draft, track, CHECKPOINTS, points)
+
+    # verification: as accurate as the default interval, the check-ins are the recorded points
+    assert [int(point[2]) for point in refined] == CHECKINS
+    assert all(np.any(np.all(draft[:, 0:3] == point[0:3], axis=1)) for point in refined)
+
+
+def test_refine_checkpoints_skipped(draft: FloatArray):
+    # setup: cp3 was not matched
+    track, points = align(draft, 500)
+    points[5:7] = np.nan
+
+    # action
+    refined = np_refine_checkpoints(draft, track, CHECKPOINTS, points)
+
+    # verification: the skipped control stays skipped, the neighbours are refined as usual
+    assert np.isnan(refined[5:7]).all()
+    assert [int(point[2]) for point in np.delete(refined, [5, 6], axis=0)] == CHECKINS[:5] + CHECKINS[7:]
+
+
+@pytest.mark.parametrize(
+    ("distance", "size", "expected"),
+    [
+        ([5, 3, 4], 1, [1]),
+        # arrival and departure around a stop
+        ([300, 109, 114, 173], 2, [1, 2]),
+        ([432, 190, 168, 280], 2, [1, 2]),
+        # the closest point can't be used twice
+        ([500, 100, 400, 450], 2, [1, 2]),
+        ([100, 500, 400, 90], 3, [0, 2, 3]),
+    ],
+)
+def test_best_sequence(distance: list, size: int, expected: list):
+    # verification
+    assert _best_sequence(np.array(distance, dtype=np.float64), size) == expected
@@ -0,0 +1,160 @@
+import csv
+import logging
+import pathlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from brevet_top_numpy_utils import FloatArray
+from brevet_top_strava import ActivityError, build_checkpoint_list, track_alignment
+
+CONTROLS = [
+    {"uid": "start", "coordinates": [61.794567, 34.376714], "distance": 0},
+    {"uid": "cp1", "coordinates": [62.4756046, 33.8108947], "distance": 102},
+    {"uid": "cp2", "coordinates": [61.8990356, 34.2402839], "distance": 186},
+    {"uid": "cp3", "coordinates": [61.8451562, 33.2059313], "distance": 250},
+    {"uid": "cp4", "coordinates": [62.0858942, 32.3777768], "distance": 312},
+    {"uid": "cp5", "coordinates": [61.6315222, 33.1801236], "distance": 400},
+    {"uid": "cp6", "coordinates": [61.6601033, 31.3930076], "distance": 511},
+    {"uid": "cp7", "coordinates": [61.9088612, 30.6221674], "distance": 577},
+    {"uid": "finish", "coordinates": [61.700979, 30.689884], "distance": 604},
+]
+# the same as the functions pass: [latitude, longitude, distance, 0], the intermediate controls twice
+CHECKPOINTS, _ = build_checkpoint_list(CONTROLS)
+
+CHECKINS = [
+    1628915466,
+    1628930227,
+    1628930240,
+    1628946837,
+    1628949524,
+    1628963275,
+    1628966872,
+    1628977002,
+    1628977206,
+    1629000504,
+    1629001103,
+    1629028901,
+    1629028919,
+    1629043779,
+    1629044813,
+    1629051792,
+]
+
+# seconds the refined sparse alignment may differ by
+SPARSE_TOLERANCE = 60
+
+
+def read_csv(file_name: str) -> FloatArray:
+    file_path = pathlib.Path(__file__).parent.absolute() / "files" / "track_n_route" / file_name
+    with open(file_path, newline="", encoding="utf-8") as csv_file:
+        table = csv.reader(csv_file, delimiter=",", quotechar='"')
+        return np.array([row for row in table], dtype=np.float64)
+
+
+@pytest.fixture
+def brevet() -> dict:
+    return {"short_track": read_csv("route.csv").tolist()}
+
+
+@pytest.fixture
+def track() -> FloatArray:
+    return read_csv("track.csv")
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_track_alignment(brevet: dict, track: FloatArray, workers: int):
+    # action
+    points = track_alignment(brevet, track, CHECKPOINTS, workers=workers)
+
+    # verification
+    assert [int(point[2]) for point in points] == CHECKINS
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_track_alignment_windows(brevet: dict, track: FloatArray, workers: int):
+    # setup
+    brevet["startDate"] = datetime.fromtimestamp(1628915400, tz=timezone.utc)
+
+    # action
+    points = track_alignment(
+        brevet, track, CHECKPOINTS, workers=workers, window_slack=1800
+    )
+
+    # verification
+    assert [int(point[2]) for point in points] == CHECKINS
+
+
+@pytest.mark.parametrize("interval", [250, 500])
+def test_track_alignment_sparse(brevet: dict, track: FloatArray, interval: int):
+    # action
+    points = track_alignment(brevet, track, CHECKPOINTS, interval=interval)
+
+    # verification: refined on the full track as accurate as the default interval
+    assert np.allclose([point[2] for point in points], CHECKINS, rtol=0, atol=SPARSE_TOLERANCE)
+
+
+def test_track_alignment_collapse(brevet: dict, track: FloatArray):
+    # action
+    points = track_alignment(brevet, track, CHECKPOINTS, collapse=True)
+
+    # verification
+    assert [int(point[2]) for point in points] == CHECKINS
+
+
+def test_track_alignment_route_array(track: FloatArray):
+    # setup
+    brevet = {"short_track": read_csv("route.csv")}
+
+    # action
+    points = track_alignment(brevet, track, CHECKPOINTS)
+
+    # verification
+    assert [int(point[2]) for point in points] == CHECKINS
+
+
+def skipped_checkpoints() -> FloatArray:
+    # cp3 is moved 8 km off the track, the rider never got there
+    checkpoints, _ = build_checkpoint_list(
+        [dict(control, coordinates=[61.8, 33.35]) if control["uid"] == "cp3" else control for control in CONTROLS]
+    )
+    return checkpoints
+
+
+@pytest.mark.parametrize("workers", [0, 4])
+def test_track_alignment_skipped_control(brevet: dict, track: FloatArray, workers: int):
+    # setup
+    brevet["controlDeviation"] = 10000
+
+    # action
+    points = track_alignment(brevet, track, skipped_checkpoints(), workers=workers)
+
+    # verification: both copies of cp3 are skipped, the rest is matched as usual
+    assert np.isnan([point[2] for point in points[5:7]]).all()
+    assert [int(point[2]) for point in points[:5] + points[7:]] == CHECKINS[:5] + CHECKINS[7:]
+
+
+def test_track_alignment_skipped_control_deviation(brevet: dict, track: FloatArray):
+    # action / verification: a skipped control costs as much as a distant one
+    with pytest.raises(ActivityError, match="Control point deviation"):
+        track_alignment(brevet, track, skipped_checkpoints())
+
+
+def test_track_alignment_skipped_control_cost(brevet: dict, track: FloatArray, caplog: pytest.LogCaptureFixture):
+    # setup
+    brevet["controlDeviation"] = 10000
+    without, _ = build_checkpoint_list([control for control in CONTROLS if control["uid"] != "cp3"])
+
+    def route_cost(checkpoints: FloatArray) -> float:
+        caplog.clear()
+        with caplog.at_level(logging.INFO):
+            track_alignment(brevet, track, checkpoints)
+        message = next(message for message in caplog.messages if message.startswith("Total track difference"))
+        return float(message.split()[3])
+
+    # action
+    skipped, expected = route_cost(skipped_checkpoints()), route_cost(without)
+
+    # verification: the skipped control adds nothing to the route deviation
+    assert np.isclose(skipped, expected)
@@ -0,0 +1,2 @@
+# the fixtures shared by the function tests
+from brevet_top_gcp_utils.testing import fake_db  # noqa: F401
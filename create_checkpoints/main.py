@@ -9,7 +9,7 @@ from brevet_top_misc_utils import get_control_window
 from flask import Request, json
 from flask_cors import cross_origin
 
-from brevet_top_gcp_utils import route_point_to_firestore
+from brevet_top_gcp_utils import get_dicts, new_document, route_point_to_firestore, write_batches
 from brevet_top_gcp_utils.auth_decorator import authenticated
 from brevet_top_plot_a_route import CheckPoint, get_route_info
 
@@ -37,24 +37,24 @@ def create_checkpoints(request: Request, auth: dict):
     # get a source info
     data: dict = request.get_json().get("data", {})
 
-    rider_dict = db_client.document(f"private/{auth['uid']}").get().to_dict()
+    doc_uid: str = data["brevetUid"]
+
+    # the rider and the brevet in a single round trip
+    rider_dict, brevet_dict = get_dicts(db_client, [f"private/{auth['uid']}", f"brevets/{doc_uid}"])
     if not rider_dict["admin"]:
         return (
             json.dumps({"data": {"message": "Forbidden operation", "error": 403}}),
             403,
         )
 
-    doc_uid: str = data["brevetUid"]
     logging.info(f"Create checkpoints for brevet {doc_uid}")
-
-    # retrieve document
     doc = db_client.document(f"brevets/{doc_uid}")
-    brevet_dict = doc.get().to_dict()
 
     try:
         info: dict = get_route_info(brevet_dict["mapUrl"])
         checkpoints: List[CheckPoint] = info.pop("checkpoints")
         checkpoint_list = []
+        writes = []
 
         for cp in checkpoints:
             start, end = get_control_window(cp.distance)
@@ -67,26 +67,18 @@ def create_checkpoints(request: Request, auth: dict):
                 "name": brevet_dict["name"],
                 "length": brevet_dict["length"],
             }
-            (timestamp, ref) = doc.collection("checkpoints").add(control_data)
+            ref, control_data = new_document(doc.collection("checkpoints"), control_data)
             logging.debug(f"New checkpoint {ref.id} / {cp.name} {cp.distance} km")
-            doc.collection("checkpoints").document(ref.id).set(
-                {
-                    "uid": ref.id,
-                },
-                merge=True,
-            )
+            writes.append((ref, control_data))
             checkpoint_list.append({
                 "uid": ref.id,
                 "name": cp.name,
                 "distance": cp.distance,
                 "coordinates": control_data["coordinates"],
             })
-        doc.set(
-            {
-                "checkpoints": checkpoint_list
-            },
-            merge=True,
-        )
+        # the checkpoints and the brevet list in a single commit
+        writes.append((doc, {"checkpoints": checkpoint_list}))
+        write_batches(db_client, writes, merge=True)
 
     except Exception as error:
         return json.dumps({"message": str(error)}), 500
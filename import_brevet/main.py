@@ -1,4 +1,5 @@
 import logging
+import os
 from datetime import timedelta
 
 import dateutil.parser
@@ -10,7 +11,7 @@ from flask import Request, json
 from flask_cors import cross_origin
 from google.cloud.firestore_v1 import GeoPoint
 
-from brevet_top_gcp_utils import route_point_to_firestore
+from brevet_top_gcp_utils import new_document, route_track_fields, write_batches
 from brevet_top_plot_a_route import ROUTE_PREFIX, get_route_info
 
 log_client = google.cloud.logging.Client()
@@ -22,6 +23,8 @@ firebase_admin.initialize_app()
 db_client = google.cloud.firestore.Client()
 
 EARLY_START = 32  # hours before
+# store the full route as point maps besides the packed trackData, for the clients still reading the point list
+STORE_TRACK_POINTS = os.getenv("STORE_TRACK_POINTS", "").lower() in ("1", "true", "yes")
 
 
 @cross_origin(methods="POST")
@@ -49,13 +52,8 @@ def import_brevet(request: Request):
             openDate=dateutil.parser.isoparse(open_date) if open_date else start_date - timedelta(hours=EARLY_START),
             skip_trim=data.get("skip_trim", False),
         )
-        (timestamp, doc) = db_client.collection("brevets").add(brevet_data)
-        db_client.collection("brevets").document(doc.id).set(
-            {
-                "uid": doc.id,
-            },
-            merge=True,
-        )
+        doc, brevet_data = new_document(db_client.collection("brevets"), brevet_data)
+        writes = []
 
         brevet_checkpoints = []
         for cp in data.get("checkpoints"):
@@ -75,14 +73,9 @@ def import_brevet(request: Request):
                 },
             }
 
-            (timestamp, ref) = doc.collection("checkpoints").add(control_data)
+            ref, control_data = new_document(doc.collection("checkpoints"), control_data)
             logging.debug(f"New checkpoint {ref.id} / {control_data['displayName']} {control_data['distance']} km")
-            doc.collection("checkpoints").document(ref.id).set(
-                {
-                    "uid": ref.id,
-                },
-                merge=True,
-            )
+            writes.append((ref, control_data))
 
             brevet_checkpoints.append(
                 dict(
@@ -95,26 +88,17 @@ def import_brevet(request: Request):
                 )
             )
 
-        db_client.collection("brevets").document(doc.id).set(
-            {
-                "checkpoints": brevet_checkpoints,
-            },
-            merge=True,
-        )
+        brevet_data["checkpoints"] = brevet_checkpoints
 
-        if not map_url.startswith(ROUTE_PREFIX):
+        if map_url.startswith(ROUTE_PREFIX):
+            route_info = get_route_info(map_url)
+            brevet_data.update(route_track_fields(route_info["track"], route_info["short_track"], STORE_TRACK_POINTS))
+            brevet_data["routeFingerprint"] = route_info["routeFingerprint"]
+        else:
             logging.warning(f"Unsupported route {map_url}")
-            return
-
-        route_info = get_route_info(map_url)
 
-        db_client.collection("brevets").document(doc.id).set(
-            {
-                "track": [route_point_to_firestore(point) for point in route_info["track"]],
-                "short_track": [route_point_to_firestore(point) for point in route_info["short_track"]],
-            },
-            merge=True,
-        )
+        # the brevet with its route and the checkpoints in a single commit
+        write_batches(db_client, [(doc, brevet_data)] + writes)
 
     except Exception as error:
         return json.dumps({"message": str(error)}), 500
@@ -10,7 +10,8 @@ from google.cloud.firestore import GeoPoint
 from pytz import timezone
 from timezonefinder import TimezoneFinder
 
-from brevet_top_gcp_utils import resolve_document
+from brevet_top_gcp_utils import (BREVET_EXPORT, get_brevet, read_track_field, resolve_document,
+                                  track_point_to_firestore)
 
 log_client = google.cloud.logging.Client()
 log_client.get_default_handler()
@@ -54,7 +55,7 @@ def json_export(request: Request):
         return json.dumps({"message": str(error)}), 404
 
     try:
-        brevet_dict = brevet_doc.get().to_dict()
+        brevet_dict = get_brevet(brevet_doc, BREVET_EXPORT)
         assert brevet_dict is not None, f"Brevet {doc_uid} not found"
 
         payload = {
@@ -70,6 +71,11 @@ def json_export(request: Request):
                 "track",
             ]
         }
+        if brevet_dict.get("trackData") or brevet_dict.get("track"):
+            # the packed route (rounded to microdegrees) or the point list of an older document
+            payload["track"] = [
+                track_point_to_firestore(point) for point in read_track_field(brevet_dict, "track").tolist()
+            ]
     except Exception as error:
         return json.dumps({"message": str(error)}), 500
 
@@ -7,6 +7,7 @@ from flask import Request, json
 from flask_cors import cross_origin
 from google.cloud.firestore import Query
 
+from brevet_top_gcp_utils import BREVET_METADATA, get_dicts, query_dicts
 from brevet_top_gcp_utils.auth_decorator import authenticated
 
 log_client = google.cloud.logging.Client()
@@ -30,7 +31,8 @@ def save_brevet_list(request: Request, auth: dict):
     """
     logging.debug(f"Request {request}")
 
-    rider_dict = db_client.document(f"private/{auth['uid']}").get().to_dict()
+    # the rider and the list in a single round trip
+    rider_dict, list_dict = get_dicts(db_client, [f"private/{auth['uid']}", "brevets/list"])
     if not rider_dict["admin"]:
         return (
             json.dumps({"data": {"message": "Forbidden operation", "error": 403}}),
@@ -40,7 +42,7 @@ def save_brevet_list(request: Request, auth: dict):
     try:
         list_doc = db_client.collection("brevets").document("list")
 
-        list_dict = list_doc.get().to_dict() if list_doc.get().exists else {}
+        list_dict = list_dict or {}
         brevets: dict[str, dict] = {
             brevet.get("uid"): brevet for brevet in list_dict.get("brevets", [])
         }
@@ -52,8 +54,7 @@ def save_brevet_list(request: Request, auth: dict):
         if last_update is not None:
             query = query.where("startDate", ">=", last_update)
 
-        for doc in query.stream():
-            brevet_dict = db_client.document(f"brevets/{doc.id}").get().to_dict()
+        for brevet_dict in query_dicts(query, BREVET_METADATA):
             brevets[brevet_dict.get("uid")] = {
                 key: brevet_dict.get(key)
                 for key in [
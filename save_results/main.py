@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Tuple
 
 import firebase_admin
 import google.cloud.firestore
@@ -8,8 +8,12 @@ import google.cloud.logging
 from flask import Request, json
 from flask_cors import cross_origin
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import DELETE_FIELD, DocumentReference
+from google.cloud.firestore_v1.field_path import FieldPath
 
-from brevet_top_gcp_utils import resolve_document
+from brevet_top_gcp_utils import (BREVET_RESULTS, RESULTS_DIRTY, get_brevet, query_dicts, query_subcollections,
+                                  resolve_document)
 
 log_client = google.cloud.logging.Client()
 log_client.get_default_handler()
@@ -20,6 +24,10 @@ firebase_admin.initialize_app()
 db_client = google.cloud.firestore.Client()
 
 MANUAL_MICROSECONDS = 123456
+# the check-in fields used in the results
+CHECKIN_FIELDS = ("uid", "code", "name", "time")
+IN_LIMIT = 10  # values of an "in" query filter
+UNMARK_ATTEMPTS = 5  # the marks left after that are updated again by the next task
 
 
 @cross_origin(methods="POST")
@@ -43,56 +51,21 @@ def save_results(request: Request):
     except ValueError as error:
         return json.dumps({"message": str(error)}), 404
 
-    brevet_dict = brevet_doc.get().to_dict()
+    rider_uids, marks = get_rider_uids(data, brevet_doc.id)
+    if data.get("dirty") and not marks:
+        logging.info(f"No riders to update in the brevet {doc_uid}")
+        return json.dumps({"data": f"/json/brevet/{doc_uid}"}), 200
+    # the results are merged into the document, no need to read the tracks or the saved results
+    brevet_dict = get_brevet(brevet_doc, BREVET_RESULTS)
 
     try:
         if brevet_dict is None:
             raise ValueError(f"Brevet {doc_uid} not found")
 
-        checkpoints: List[dict] = [
-            cp.to_dict() for cp in brevet_doc.collection("checkpoints").get()
-        ]
-        checkpoints.sort(key=lambda x: x.get("distance", 0))
-
-        if len(checkpoints) > 0:
-            brevet_dict["checkpoints"] = []
-            brevet_dict["results"] = {}
-            for i, cp in enumerate(checkpoints):
-                brevet_dict["checkpoints"].append(
-                    {
-                        "uid": cp["uid"],
-                        "name": cp["displayName"],
-                        "distance": cp["distance"],
-                        "coordinates": cp["coordinates"],
-                        "sleep": cp.get("sleep"),
-                        # note the camelCase
-                        "selfCheck": cp.get("selfcheck"),
-                    }
-                )
-                for doc in (
-                    brevet_doc.collection("checkpoints")
-                    .document(cp["uid"])
-                    .collection("riders")
-                    .get()
-                ):
-                    checkin = doc.to_dict()
-                    rider_uid = checkin["uid"]
-                    if rider_uid not in brevet_dict["results"]:
-                        brevet_dict["results"][rider_uid] = {
-                            "uid": rider_uid,
-                            "code": checkin.get("code"),
-                            "name": checkin["name"],
-                            "checkins": [None] * len(checkpoints),
-                        }
-                    if checkin.get("time") is None:
-                        logging.error(
-                            f"Empty time of rider {rider_uid} {checkin['name']}"
-                        )
-                    times: List[datetime] = checkin_reorder(checkin["time"])
-                    if len(times) < 1:
-                        continue
-                    brevet_dict["results"][rider_uid]["checkins"][i] = times[0]
-            brevet_doc.set(brevet_dict, merge=True)
+        if not (rider_uids and save_rider_results(brevet_doc, brevet_dict, rider_uids)):
+            save_all_results(brevet_doc, brevet_dict)
+        if marks:
+            unmark_riders(brevet_doc.id, marks)
     except Exception as error:
         logging.error(f"Saving results error {error}")
         return json.dumps({"message": str(error)}), 500
@@ -100,6 +73,162 @@ def save_results(request: Request):
     return json.dumps({"data": f"/json/brevet/{doc_uid}"}), 200
 
 
+def get_rider_uids(data: dict, brevet_uid: str) -> Tuple[List[str], Dict[str, datetime]]:
+    """
+    Collect the riders to update: riderUids or riderUid after check-ins,
+    and with the dirty flag the riders marked by TaskResultsTrigger apart from the brevet.
+    No rider means the full rebuild.
+
+    :param data: the request data
+    :param brevet_uid: the brevet UID
+    :return: the riders to update and the marking times of the marked ones among them
+    """
+    rider_uids: List[str] = data.get("riderUids") or ([data["riderUid"]] if data.get("riderUid") else [])
+    marks: Dict[str, datetime] = {}
+    if data.get("dirty"):
+        dirty_dict = db_client.document(f"{RESULTS_DIRTY}/{brevet_uid}").get(["riders"]).to_dict()
+        marks = (dirty_dict or {}).get("riders") or {}
+    if marks:
+        rider_uids = sorted(set(rider_uids) | set(marks))
+    return rider_uids, marks
+
+
+def unmark_riders(brevet_uid: str, marks: Dict[str, datetime]):
+    """
+    Remove the marks of the updated riders. A rider marked again since the read keeps the new mark
+    for the next task: the marks are compared and removed on condition the document is not updated in between.
+
+    :param brevet_uid: the brevet UID
+    :param marks: the marking times read before the update
+    """
+    reference = db_client.document(f"{RESULTS_DIRTY}/{brevet_uid}")
+    for _ in range(UNMARK_ATTEMPTS):
+        snapshot = reference.get(["riders"])
+        current: Dict[str, datetime] = snapshot.get("riders") or {}
+        updated = [rider_uid for rider_uid, mark in marks.items() if current.get(rider_uid) == mark]
+        if not updated:
+            return
+        try:
+            reference.update(
+                {FieldPath("riders", rider_uid).to_api_repr(): DELETE_FIELD for rider_uid in updated},
+                option=db_client.write_option(last_update_time=snapshot.update_time),
+            )
+            return
+        except FailedPrecondition:
+            logging.debug(f"Riders of the brevet {brevet_uid} are marked during the update")
+    logging.warning(f"Riders of the brevet {brevet_uid} are left marked")
+
+
+def save_all_results(brevet_doc: DocumentReference, brevet_dict: dict):
+    """
+    Rebuild the checkpoint list and the results of all the riders, the consistency pass.
+
+    :param brevet_doc: the brevet document reference
+    :param brevet_dict: the brevet dict to merge the results into
+    """
+    checkpoints: List[dict] = query_dicts(brevet_doc.collection("checkpoints"))
+    checkpoints.sort(key=lambda x: x.get("distance", 0))
+
+    if len(checkpoints) > 0:
+        # the check-ins of all the controls at once
+        checkins = query_subcollections(
+            [brevet_doc.collection("checkpoints").document(cp["uid"]) for cp in checkpoints],
+            "riders",
+            CHECKIN_FIELDS,
+        )
+        brevet_dict["checkpoints"], brevet_dict["results"] = build_results(checkpoints, checkins)
+        brevet_doc.set(brevet_dict, merge=True)
+
+
+def save_rider_results(brevet_doc: DocumentReference, brevet_dict: dict, rider_uids: List[str]) -> bool:
+    """
+    Build the results rows of the given riders and put them into the results, a new rider's row is inserted.
+    The rest of the results is neither read nor written.
+    The rows are aligned to the saved checkpoint list, create_checkpoints and import_brevet keep it in the route order.
+
+    :param brevet_doc: the brevet document reference
+    :param brevet_dict: the brevet dict with the saved checkpoint list
+    :param rider_uids: the rider UIDs
+    :return: False if a full rebuild is necessary: no saved checkpoint list or no check-in found at its controls
+    """
+    checkpoints: List[dict] = brevet_dict.get("checkpoints") or []
+    if not checkpoints:
+        return False
+
+    references = [brevet_doc.collection("checkpoints").document(cp["uid"]) for cp in checkpoints]
+    results = {}
+    for start in range(0, len(rider_uids), IN_LIMIT):
+        # the check-ins of the riders at every control at once
+        checkins = query_subcollections(
+            references,
+            "riders",
+            CHECKIN_FIELDS,
+            filters=[("uid", "in", rider_uids[start:start + IN_LIMIT])],  # noqa: E203
+        )
+        for i, cp_checkins in enumerate(checkins):
+            for checkin in cp_checkins:
+                add_checkin(results, i, len(checkpoints), checkin)
+    if not results:
+        return False
+
+    brevet_doc.update({FieldPath("results", rider_uid).to_api_repr(): row for rider_uid, row in results.items()})
+    return True
+
+
+def build_results(checkpoints: List[dict], checkins: List[List[dict]]) -> Tuple[List[dict], Dict[str, dict]]:
+    """
+    Build the checkpoint list and the riders by checkpoints results matrix in one pass.
+
+    :param checkpoints: the checkpoint dicts sorted by distance
+    :param checkins: the check-in dicts of every checkpoint
+    :return: the checkpoint list and the results by rider UID
+    """
+    checkpoint_list = []
+    results = {}
+    for i, (cp, cp_checkins) in enumerate(zip(checkpoints, checkins)):
+        checkpoint_list.append(
+            {
+                "uid": cp["uid"],
+                "name": cp["displayName"],
+                "distance": cp["distance"],
+                "coordinates": cp["coordinates"],
+                "sleep": cp.get("sleep"),
+                # note the camelCase
+                "selfCheck": cp.get("selfcheck"),
+            }
+        )
+        for checkin in cp_checkins:
+            add_checkin(results, i, len(checkpoints), checkin)
+    return checkpoint_list, results
+
+
+def add_checkin(results: Dict[str, dict], index: int, size: int, checkin: dict):
+    """
+    Put the preferred time of a check-in into the rider's results row.
+
+    :param results: the results by rider UID
+    :param index: the checkpoint index
+    :param size: the number of checkpoints
+    :param checkin: the check-in dict
+    """
+    rider_uid = checkin["uid"]
+    if rider_uid not in results:
+        results[rider_uid] = {
+            "uid": rider_uid,
+            "code": checkin.get("code"),
+            "name": checkin["name"],
+            "checkins": [None] * size,
+        }
+    if checkin.get("time") is None:
+        logging.error(
+            f"Empty time of rider {rider_uid} {checkin['name']}"
+        )
+    times: List[datetime] = checkin_reorder(checkin["time"])
+    if len(times) < 1:
+        return
+    results[rider_uid]["checkins"][index] = times[0]
+
+
 def is_manual_checkin(checkin: DatetimeWithNanoseconds) -> bool:
     """The time entered manually by a volunteer"""
     return checkin.microsecond == MANUAL_MICROSECONDS
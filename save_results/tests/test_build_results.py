@@ -0,0 +1,61 @@
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from save_results import build_results
+from save_results.main import add_checkin
+
+STRAVA = DatetimeWithNanoseconds.fromisoformat("2023-07-10T04:04:00+00:00")
+MANUAL = DatetimeWithNanoseconds.fromisoformat("2023-07-10T04:25:11.123456+00:00")
+
+
+def checkpoint(uid: str, distance: int) -> dict:
+    return {"uid": uid, "displayName": f"CP {distance}", "distance": distance, "coordinates": None, "selfcheck": True}
+
+
+def make_checkins() -> list:
+    return [
+        [
+            {"uid": "r1", "name": "Rider 1", "code": "101", "time": [STRAVA]},
+            {"uid": "r2", "name": "Rider 2", "time": []},
+        ],
+        [],
+        [{"uid": "r1", "name": "Rider 1", "code": "101", "time": [STRAVA, MANUAL]}],
+    ]
+
+
+CHECKPOINTS = [checkpoint("cp1", 0), checkpoint("cp2", 100), checkpoint("cp3", 200)]
+
+
+def test_build_results():
+    # action
+    checkpoint_list, results = build_results(CHECKPOINTS, make_checkins())
+
+    # verification
+    assert [cp["uid"] for cp in checkpoint_list] == ["cp1", "cp2", "cp3"]
+    assert checkpoint_list[1] == {
+        "uid": "cp2",
+        "name": "CP 100",
+        "distance": 100,
+        "coordinates": None,
+        "sleep": None,
+        "selfCheck": True,
+    }
+    assert results == {
+        "r1": {"uid": "r1", "code": "101", "name": "Rider 1", "checkins": [STRAVA, None, MANUAL]},
+        "r2": {"uid": "r2", "code": None, "name": "Rider 2", "checkins": [None, None, None]},
+    }
+
+
+def test_add_checkin():
+    # setup: the rider's check-in documents by checkpoint as read by the incremental update
+    checkins = [
+        next((checkin for checkin in cp_checkins if checkin["uid"] == "r1"), None) for cp_checkins in make_checkins()
+    ]
+    results = {}
+
+    # action
+    for i, checkin in enumerate(checkins):
+        if checkin:
+            add_checkin(results, i, len(CHECKPOINTS), checkin)
+
+    # verification: the same row as the full rebuild
+    assert results == {"r1": build_results(CHECKPOINTS, make_checkins())[1]["r1"]}
@@ -0,0 +1,265 @@
+import copy
+
+import flask
+import pytest
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from brevet_top_gcp_utils import BREVET_RESULTS, RESULTS_DIRTY, TaskResultsTrigger, get_brevet
+from brevet_top_gcp_utils.testing import FakeClient
+from save_results import main
+from save_results.main import save_all_results, save_results, save_rider_results
+
+STRAVA = DatetimeWithNanoseconds.fromisoformat("2023-07-10T04:04:00+00:00")
+RIDERS = 20
+
+
+@pytest.fixture
+def db(fake_db: FakeClient) -> FakeClient:
+    # the checkpoint list as saved by create_checkpoints
+    checkpoints = [{"uid": f"cp{i}", "distance": distance} for i, distance in enumerate([0, 100, 200])]
+    documents = fake_db.documents
+    documents["brevets/b1"] = {"uid": "b1", "name": "Test 200", "length": 200, "checkpoints": checkpoints}
+    for i, distance in enumerate([0, 100, 200]):
+        documents[f"brevets/b1/checkpoints/cp{i}"] = {
+            "uid": f"cp{i}",
+            "displayName": f"CP {distance}",
+            "distance": distance,
+            "coordinates": None,
+            "selfcheck": False,
+        }
+        # a rider abandons at every next checkpoint, the check-in ids are not the rider UIDs
+        for j in range(RIDERS - i):
+            documents[f"brevets/b1/checkpoints/cp{i}/riders/c{i}x{j}"] = {
+                "uid": f"r{j}",
+                "code": f"{j:03d}",
+                "name": f"Rider {j}",
+                "time": [STRAVA],
+                "owner": f"r{j}",
+            }
+    return fake_db
+
+
+def test_save_all_results(db: FakeClient):
+    # action
+    save_all_results(db.document("brevets/b1"), {"uid": "b1"})
+
+    # verification: the checkpoint list and a row per rider are merged into the brevet
+    brevet = db.documents["brevets/b1"]
+    assert brevet["name"] == "Test 200"
+    assert brevet["checkpoints"] == [
+        {
+            "uid": f"cp{i}",
+            "name": f"CP {distance}",
+            "distance": distance,
+            "coordinates": None,
+            "sleep": None,
+            "selfCheck": False,
+        }
+        for i, distance in enumerate([0, 100, 200])
+    ]
+    assert brevet["results"] == {
+        f"r{j}": {
+            "uid": f"r{j}",
+            "code": f"{j:03d}",
+            "name": f"Rider {j}",
+            "checkins": [STRAVA if j < RIDERS - i else None for i in range(3)],
+        }
+        for j in range(RIDERS)
+    }
+    # a checkpoint query, a check-in query per checkpoint and a single write
+    assert db.round_trips == 1 + 3 + 1
+    assert db.writes == 1
+
+
+def test_save_rider_results(db: FakeClient):
+    # setup: a full rebuild, then the last rider checks in again after skipping a control
+    brevet_doc = db.document("brevets/b1")
+    save_all_results(brevet_doc, {"uid": "b1"})
+    rider_uid = f"r{RIDERS - 1}"
+    db.documents["brevets/b1/checkpoints/cp2/riders/late"] = {"uid": rider_uid, "name": "Rider", "time": [STRAVA]}
+    brevet_dict = get_brevet(brevet_doc, BREVET_RESULTS + (f"results.{rider_uid}",))
+    before = copy.deepcopy(db.documents["brevets/b1"])
+    db.reset()
+
+    # action
+    saved = save_rider_results(brevet_doc, brevet_dict, [rider_uid])
+
+    # verification: the rider's row is replaced, the rest of the brevet is unchanged
+    assert saved
+    results = before.pop("results")
+    results[rider_uid] = {"uid": rider_uid, "code": "019", "name": "Rider 19", "checkins": [STRAVA, None, STRAVA]}
+    assert db.documents["brevets/b1"] == {**before, "results": results}
+    # a check-in query per checkpoint and a single write
+    assert db.round_trips == 3 + 1
+    assert db.writes == 1
+
+
+def test_save_rider_results_new_rider(db: FakeClient):
+    # setup: the results are built, then a new rider checks in at the first two controls
+    brevet_doc = db.document("brevets/b1")
+    save_all_results(brevet_doc, {"uid": "b1"})
+    for i in range(2):
+        db.documents[f"brevets/b1/checkpoints/cp{i}/riders/new{i}"] = {"uid": "new", "name": "New", "time": [STRAVA]}
+    brevet_dict = get_brevet(brevet_doc, BREVET_RESULTS)
+    before = copy.deepcopy(db.documents["brevets/b1"])
+    db.reset()
+
+    # action
+    saved = save_rider_results(brevet_doc, brevet_dict, ["new"])
+
+    # verification: the row is inserted without a full rebuild
+    assert saved
+    results = before.pop("results")
+    results["new"] = {"uid": "new", "code": None, "name": "New", "checkins": [STRAVA, STRAVA, None]}
+    assert db.documents["brevets/b1"] == {**before, "results": results}
+    # only the new rider's check-ins are read
+    assert db.round_trips == 3 + 1
+    assert db.reads == 2
+    assert db.writes == 1
+
+
+@pytest.mark.parametrize("checkpoints", [False, True])
+def test_save_rider_results_rebuild(db: FakeClient, checkpoints: bool):
+    # setup: no checkpoint list, or a rider without check-ins at the listed controls
+    brevet_doc = db.document("brevets/b1")
+    if not checkpoints:
+        del db.documents["brevets/b1"]["checkpoints"]
+    brevet_dict = get_brevet(brevet_doc, BREVET_RESULTS)
+    before = copy.deepcopy(db.documents["brevets/b1"])
+
+    # action
+    saved = save_rider_results(brevet_doc, brevet_dict, ["r0" if not checkpoints else "unknown"])
+
+    # verification: the full rebuild is up to the caller
+    assert not saved
+    assert db.documents["brevets/b1"] == before
+    assert "results" not in before
+
+
+def call_save_results(data: dict) -> flask.Response:
+    with flask.Flask(__name__).test_request_context(method="POST", json={"data": data}):
+        return save_results(flask.request)
+
+
+def test_save_results_dirty(db: FakeClient, monkeypatch: pytest.MonkeyPatch):
+    # setup: the results are built, two riders are marked by TaskResultsTrigger
+    monkeypatch.setattr(main, "db_client", db)
+    save_all_results(db.document("brevets/b1"), {"uid": "b1"})
+    before = db.documents["brevets/b1"]["results"]
+    db.documents["brevets/b1/checkpoints/cp2/riders/late"] = {"uid": "r19", "name": "Rider", "time": [STRAVA]}
+    db.documents[f"{RESULTS_DIRTY}/b1"] = {"riders": {"r18": STRAVA, "r19": STRAVA}}
+
+    # action: the delayed task, then a repeated one
+    response = call_save_results({"brevetUid": "b1", "dirty": True})
+    db.reset()
+    repeated = call_save_results({"brevetUid": "b1", "dirty": True})
+
+    # verification: the marked riders are updated and unmarked, nothing is left to the repeated task
+    assert response.status_code == 200
+    assert response.get_json(force=True) == {"data": "/json/brevet/b1"}
+    results = db.documents["brevets/b1"]["results"]
+    assert results["r19"]["checkins"] == [STRAVA, None, STRAVA]
+    assert {uid: row for uid, row in results.items() if uid != "r19"} == {
+        uid: row for uid, row in before.items() if uid != "r19"
+    }
+    assert RESULTS_DIRTY not in db.documents["brevets/b1"]
+    assert db.documents[f"{RESULTS_DIRTY}/b1"] == {"riders": {}}
+    assert repeated.status_code == 200
+    assert db.writes == 0
+
+
+@pytest.fixture
+def tasks(db: FakeClient, monkeypatch: pytest.MonkeyPatch) -> list:
+    # the results are built, the delayed tasks are collected in the list
+    monkeypatch.setattr(main, "db_client", db)
+    save_all_results(db.document("brevets/b1"), {"uid": "b1"})
+    return []
+
+
+@pytest.fixture
+def trigger(db: FakeClient, tasks: list) -> TaskResultsTrigger:
+    return TaskResultsTrigger(
+        db,
+        lambda brevet_uid, rider_uids: pytest.fail("A synchronous call instead of a task"),
+        lambda brevet_uid, task_name, run_at: tasks.append({"brevetUid": brevet_uid, "dirty": True}),
+        interval=60,
+    )
+
+
+def check_in(db: FakeClient, rider_uid: str, checkin_id: str):
+    db.documents[f"brevets/b1/checkpoints/cp2/riders/{checkin_id}"] = {"uid": rider_uid, "time": [STRAVA]}
+
+
+def test_save_results_task_trigger(db: FakeClient, tasks: list, trigger: TaskResultsTrigger):
+    # setup: a rider checks in at the finish during a rush
+    check_in(db, "r19", "late")
+
+    # action: the check-in marks the rider, then the queued task runs
+    queued = not trigger.request("b1", ["r19"])
+    marked = list(db.documents[f"{RESULTS_DIRTY}/b1"]["riders"])
+    responses = [call_save_results(task) for task in tasks]
+
+    # verification: the marker is removed and the rider's row is rebuilt
+    assert queued
+    assert marked == ["r19"]
+    assert [response.status_code for response in responses] == [200]
+    assert db.documents[f"{RESULTS_DIRTY}/b1"] == {"riders": {}}
+    assert db.documents["brevets/b1"]["results"]["r19"] == {
+        "uid": "r19",
+        "code": "019",
+        "name": "Rider 19",
+        "checkins": [STRAVA, None, STRAVA],
+    }
+
+
+def test_save_results_marked_during_update(
+    db: FakeClient, tasks: list, trigger: TaskResultsTrigger, monkeypatch: pytest.MonkeyPatch
+):
+    # setup: the rider checks in at the finish, and at a skipped control while the task updates the results
+    check_in(db, "r19", "late")
+    trigger.request("b1", ["r19"])
+
+    def save_and_check_in(*args) -> bool:
+        saved = save_rider_results(*args)
+        db.documents["brevets/b1/checkpoints/cp1/riders/again"] = {"uid": "r19", "time": [STRAVA]}
+        trigger.request("b1", ["r19"])
+        return saved
+
+    monkeypatch.setattr(main, "save_rider_results", save_and_check_in)
+
+    # action: the first task misses the second check-in
+    call_save_results(tasks.pop(0))
+    missed = db.documents["brevets/b1"]["results"]["r19"]["checkins"]
+    monkeypatch.setattr(main, "save_rider_results", save_rider_results)
+    responses = [call_save_results(task) for task in tasks]
+
+    # verification: the rider stays marked and the next task writes the second check-in
+    assert missed == [STRAVA, None, STRAVA]
+    assert [response.status_code for response in responses] == [200]
+    assert db.documents["brevets/b1"]["results"]["r19"]["checkins"] == [STRAVA, STRAVA, STRAVA]
+    assert db.documents[f"{RESULTS_DIRTY}/b1"] == {"riders": {}}
+
+
+def test_save_results_marked_during_unmark(
+    db: FakeClient, tasks: list, trigger: TaskResultsTrigger, monkeypatch: pytest.MonkeyPatch
+):
+    # setup: the rider is marked again between the read of the marks and their removal
+    check_in(db, "r19", "late")
+    trigger.request("b1", ["r19"])
+    write_option = db.write_option
+
+    def mark_and_write_option(**kwargs):
+        monkeypatch.setattr(db, "write_option", write_option)
+        trigger.request("b1", ["r19"])
+        return write_option(**kwargs)
+
+    monkeypatch.setattr(db, "write_option", mark_and_write_option)
+
+    # action
+    response = call_save_results(tasks.pop(0))
+
+    # verification: the removal is conditional, the new mark is kept for the next task
+    assert response.status_code == 200
+    assert list(db.documents[f"{RESULTS_DIRTY}/b1"]["riders"]) == ["r19"]
+    assert len(tasks) == 1
+    assert db.documents["brevets/b1"]["results"]["r19"]["checkins"] == [STRAVA, None, STRAVA]
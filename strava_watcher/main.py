@@ -9,12 +9,13 @@ import firebase_admin
 import google.cloud.firestore
 import google.cloud.logging
 from flask import json
-from google.cloud import functions_v1
 from google.cloud.functions.context import Context
 from pytz import utc
 from requests import HTTPError
 
-from brevet_top_gcp_utils import create_document, firestore_to_track_point, get_checkpoints
+from brevet_top_gcp_utils import (BREVET_ALIGNMENT, TaskResultsTrigger, create_barcodes, get_checkpoints, query_dicts,
+                                  read_track_field)
+from brevet_top_gcp_utils.calls import call_save_results, schedule_save_results
 from brevet_top_numpy_utils import FloatArray
 from brevet_top_strava import (ActivityError, ActivityNotFound, AthleteNotFound, auth_token, build_checkpoint_list,
                                get_activity, get_track_points, refresh_tokens, tokens_expired, track_alignment)
@@ -27,6 +28,22 @@ logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 firebase_admin.initialize_app()
 db_client = google.cloud.firestore.Client()
 
+# align segments between controls in parallel processes, 0 - single pass
+ALIGNMENT_WORKERS = int(os.getenv("ALIGNMENT_WORKERS", "0"))
+# down-sampling interval (meters), check-ins are refined on the full track when sparser than 100
+ALIGNMENT_INTERVAL = int(os.getenv("ALIGNMENT_INTERVAL", "100"))
+# collapse stationary runs (cafés, traffic lights, hotels) before the alignment
+COLLAPSE_STOPS = os.getenv("COLLAPSE_STOPS", "").lower() in ("1", "true", "yes")
+# the track is considered stationary below that speed (meters per second)
+STOP_SPEED_MPS = float(os.getenv("STOP_SPEED_MPS", "0.5"))
+# seconds to extend the control time windows by, unset - match at any time
+CONTROL_WINDOW_SLACK = float(os.getenv("CONTROL_WINDOW_SLACK")) if os.getenv("CONTROL_WINDOW_SLACK") else None
+# seconds between the results rebuilds of a brevet, 0 - a synchronous call every time
+RESULTS_INTERVAL = float(os.getenv("RESULTS_INTERVAL", "0"))
+
+# the riders are marked in the brevet and a delayed task updates them, no state is kept in the instance
+results_trigger = TaskResultsTrigger(db_client, call_save_results, schedule_save_results, interval=RESULTS_INTERVAL)
+
 
 def strava_watcher(event, context: Context):
     try:
@@ -128,14 +145,11 @@ def strava_compare(athlete_id: int, activity_id: int, secret: dict):
     if len(brevets) < 1:
         raise Exception(f"Brevet on {start_date} not found")
 
-    client = functions_v1.CloudFunctionsServiceClient()
     for brevet_dict in brevets:
         logging.info(f"Brevet {brevet_dict['uid']}")
 
-        # convert stored GeoPoints
-        brevet_dict["short_track"] = [
-            firestore_to_track_point(p) for p in brevet_dict.get("short_track", [])
-        ]
+        # the packed route or the stored GeoPoints
+        brevet_dict["short_track"] = read_track_field(brevet_dict, "short_track")
 
         # prepare a list of control points (check-in / check-out) necessary to visit
         checkpoints, ids = build_checkpoint_list(get_checkpoints(brevet_dict["uid"], db=db_client))
@@ -146,13 +160,21 @@ def strava_compare(athlete_id: int, activity_id: int, secret: dict):
             # retrieve activities and transform to a track
             track: FloatArray = get_track_points(sorted([activity], key=lambda a: a["start_date"]), auth_token(riders[0]["strava"]))
             points = track_alignment(
-                brevet_dict, track, checkpoints
+                brevet_dict,
+                track,
+                checkpoints,
+                workers=ALIGNMENT_WORKERS,
+                window_slack=CONTROL_WINDOW_SLACK,
+                interval=ALIGNMENT_INTERVAL,
+                collapse=COLLAPSE_STOPS,
+                stop_speed_mps=STOP_SPEED_MPS,
             )
         except (ActivityNotFound, ActivityError) as error:
             logging.error(f"Activity error {error}")
             continue
 
         # register check-ins / check-outs
+        checkins = []
         for i, cp in enumerate(points):
             # test for NaN
             if cp[2] == cp[2]:
@@ -162,56 +184,28 @@ def strava_compare(athlete_id: int, activity_id: int, secret: dict):
                         f"{rider_dict['providers'][0]['displayName']}/{rider_dict['uid']} "
                         f"{datetime.fromtimestamp(cp[2], tz=utc)}"
                     )
-                    create_rider_barcode(
-                        rider_dict["uid"],
-                        code=ids[i],
-                        time=datetime.fromtimestamp(cp[2], tz=utc),
-                    )
-        client.call_function(request=functions_v1.CallFunctionRequest(
-            name=client.cloud_function_path(
-                project=os.getenv('GCLOUD_PROJECT'),
-                location=os.getenv('FUNCTION_REGION'),
-                function="saveResults",
-            ),
-            data='{"data": {"brevetUid": "%s"}}' % brevet_dict["uid"]
-        ))
+                checkins.append((ids[i], datetime.fromtimestamp(cp[2], tz=utc)))
+        # a redelivered webhook skips the registered ones
+        create_barcodes([rider_dict["uid"] for rider_dict in riders], brevet_dict["uid"], checkins, db=db_client)
+        # only the riders' results are updated, a finish rush is coalesced
+        results_trigger.request(brevet_dict["uid"], [rider_dict["uid"] for rider_dict in riders])
 
 
 def search_strava_riders(athlete_id: int) -> List[dict]:
     """
     Query the database for private/{rider}/strava.athlete_id to match the given id
     """
-    return [
-        db_client.document(f"private/{doc.id}").get().to_dict()
-        for doc in db_client.collection("private")
-        .where("strava.athlete_id", "==", int(athlete_id))
-        .stream()
-    ]
+    return query_dicts(db_client.collection("private").where("strava.athlete_id", "==", int(athlete_id)))
 
 
 def search_brevets(start_date: datetime) -> List[dict]:
     logging.debug(
         f"Lookup brevets in {start_date - timedelta(hours=2)} / {start_date + timedelta(hours=2)}"
     )
-    return [
-        db_client.document(f"brevets/{doc.id}").get().to_dict()
-        for doc in db_client.collection("brevets")
+    return query_dicts(
+        db_client.collection("brevets")
         # lookup +/- 12 hours from the activity start date
         .where("startDate", ">", start_date - timedelta(hours=2))
-        .where("startDate", "<", start_date + timedelta(hours=2))
-        .stream()
-    ]
-
-
-def create_rider_barcode(rider_uid: str, code: str, time: datetime) -> str:
-    return create_document(
-        f"riders/{rider_uid}/barcodes",
-        {
-            "code": code,
-            "control": rider_uid,
-            "owner": rider_uid,
-            "time": time,
-            "message": "new",
-        },
-        db=db_client,
+        .where("startDate", "<", start_date + timedelta(hours=2)),
+        BREVET_ALIGNMENT,
     )
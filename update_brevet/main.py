@@ -1,16 +1,17 @@
 import logging
 import os
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
 import dateutil.parser
 import firebase_admin
 import google.cloud.firestore
 import google.cloud.logging
+from google.cloud.firestore import DELETE_FIELD
 from google.cloud.functions.context import Context
 
-from brevet_top_gcp_utils import route_point_to_firestore
-from brevet_top_plot_a_route import ROUTE_PREFIX, get_route_info
+from brevet_top_gcp_utils import route_track_fields, write_batches
+from brevet_top_plot_a_route import ROUTE_PREFIX, UNCHANGED_TRACKS, get_route_info
 
 from brevet_top_misc_utils import get_limit_hours, get_control_window
 
@@ -23,6 +24,8 @@ firebase_admin.initialize_app()
 db_client = google.cloud.firestore.Client()
 
 EARLY_START = 32  # hours before
+# store the full route as point maps besides the packed trackData, for the clients still reading the point list
+STORE_TRACK_POINTS = os.getenv("STORE_TRACK_POINTS", "").lower() in ("1", "true", "yes")
 
 def update_brevet(data, context: Context):
     """
@@ -54,24 +57,44 @@ def update_time(doc_path: str, data: dict):
 
     logging.info(f"Brevet change of {doc_path} to {start_date} / {length} km")
 
+    writes = []
     if length and start_date:
         change = {
             "endDate": start_date + timedelta(hours=get_limit_hours(length)),
             "openDate": start_date - timedelta(hours=EARLY_START),
         }
-        save_doc(doc_path, change)
+        writes.append((db_client.document(doc_path), change))
 
     if start_date:
-        for cp in db_client.document(doc_path).collection("checkpoints").get():
-            checkpoint = cp.to_dict()
-            start, end = get_control_window(checkpoint.get("distance", 0))
-            save_doc(
-                f"{doc_path}/checkpoints/{checkpoint['uid']}",
-                {
-                    "startDate": start_date + timedelta(hours=start),
-                    "endDate": start_date + timedelta(hours=end),
-                },
-            )
+        checkpoints = (
+            db_client.document(doc_path).collection("checkpoints").select(["distance", "startDate", "endDate"]).get()
+        )
+        writes += control_window_changes(start_date, checkpoints)
+
+    # all the windows of the brevet in one or a few commits
+    logging.info(f"{len(writes)} documents to update")
+    write_batches(db_client, writes, merge=True)
+
+
+def control_window_changes(start_date: datetime, checkpoints: list) -> List[tuple]:
+    """
+    Compute the control windows for a start date, the checkpoints keeping their windows are skipped.
+
+    :param start_date: the brevet start date
+    :param checkpoints: the checkpoint snapshots with distance, startDate and endDate
+    :return: pairs of a checkpoint reference and its change
+    """
+    changes = []
+    for cp in checkpoints:
+        checkpoint = cp.to_dict()
+        start, end = get_control_window(checkpoint.get("distance", 0))
+        change = {
+            "startDate": start_date + timedelta(hours=start),
+            "endDate": start_date + timedelta(hours=end),
+        }
+        if any(checkpoint.get(key) != value for key, value in change.items()):
+            changes.append((cp.reference, change))
+    return changes
 
 
 def save_doc(path: str, data: dict):
@@ -104,13 +127,25 @@ def update_route(doc_path: str, data: dict):
         logging.error(f"Unsupported route {map_url}")
         return
 
-    route_info = get_route_info(map_url)
-    route_info["track"] = [
-        route_point_to_firestore(point) for point in route_info["track"]
-    ]
-    route_info["short_track"] = [
-        route_point_to_firestore(point) for point in route_info["short_track"]
-    ]
+    # the fingerprint of the route processed last time
+    fingerprint: Optional[str] = (
+        data.get("value").get("fields").get("routeFingerprint", {}).get("stringValue")
+    )
+
+    route_info = get_route_info(map_url, fingerprint=fingerprint)
+    if route_info is None:
+        logging.error(f"Broken route {map_url}")
+        return
+    if route_info["track"] is None:
+        logging.info(f"The route {map_url} track is unchanged")
+        # the name and the length may be edited without moving the route
+        save_doc(doc_path, {key: value for key, value in route_info.items() if key not in UNCHANGED_TRACKS})
+        return
+
+    route_info.update(route_track_fields(route_info.pop("track"), route_info["short_track"], STORE_TRACK_POINTS))
+    if not STORE_TRACK_POINTS:
+        # the migration to trackData, the point list of the former route is dropped
+        route_info["track"] = DELETE_FIELD
     route_info.pop("checkpoints")
 
     save_doc(doc_path, route_info)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from brevet_top_gcp_utils.testing import FakeClient
+from brevet_top_misc_utils import get_control_window
+from update_brevet import main
+from update_brevet.main import control_window_changes, update_time
+
+START = datetime(2024, 5, 1, 6, tzinfo=timezone.utc)
+
+
+def window(distance: int, start_date: datetime = START) -> dict:
+    start, end = get_control_window(distance)
+    return {
+        "distance": distance,
+        "startDate": start_date + timedelta(hours=start),
+        "endDate": start_date + timedelta(hours=end),
+    }
+
+
+@pytest.fixture
+def db(fake_db: FakeClient) -> FakeClient:
+    fake_db.documents.update(
+        {
+            "brevets/b1": {"uid": "b1", "length": 200},
+            "brevets/b1/checkpoints/cp1": window(0),
+            "brevets/b1/checkpoints/cp2": window(100, START - timedelta(days=1)),
+            "brevets/b1/checkpoints/cp3": window(200),
+        }
+    )
+    return fake_db
+
+
+def test_control_window_changes(db: FakeClient):
+    # setup
+    checkpoints = db.collection("brevets/b1/checkpoints").select(["distance", "startDate", "endDate"]).get()
+
+    # action
+    changes = control_window_changes(START, checkpoints)
+
+    # verification: the moved checkpoint only
+    assert [(reference.path, change) for reference, change in changes] == [
+        ("brevets/b1/checkpoints/cp2", {key: value for key, value in window(100).items() if key != "distance"})
+    ]
+
+
+def test_update_time(db: FakeClient, monkeypatch: pytest.MonkeyPatch):
+    # setup
+    monkeypatch.setattr(main, "db_client", db)
+    start_date = START + timedelta(hours=1)
+    fields = {"startDate": {"timestampValue": start_date.isoformat()}, "length": {"integerValue": "200"}}
+
+    # action
+    update_time("brevets/b1", {"value": {"fields": fields}})
+
+    # verification: the brevet and all the checkpoints are moved, in one query and a single commit
+    assert db.documents["brevets/b1"]["endDate"] == start_date + timedelta(hours=13.5)
+    assert [db.documents[f"brevets/b1/checkpoints/cp{i + 1}"] for i in range(3)] == [
+        window(distance, start_date) for distance in (0, 100, 200)
+    ]
+    assert db.round_trips == 2
+    assert db.batches == [4]
@@ -3,18 +3,16 @@ from __future__ import annotations
 import json
 import logging
 import os
-from base64 import b64decode
 from datetime import datetime
 
 import firebase_admin
-from google.cloud import functions_v1
 import google.cloud.logging
-import gpxpy
-from brevet_top_gcp_utils import (create_document, firestore_to_track_point,
-                                  get_checkpoints, resolve_document)
+from brevet_top_gcp_utils import (BREVET_ALIGNMENT, TaskResultsTrigger, create_barcodes, firestore_to_track_point,
+                                  get_brevet, get_checkpoints, read_track_field, resolve_document)
 from brevet_top_gcp_utils.auth_decorator import authenticated
-from brevet_top_numpy_utils import FloatArray, build_array_from_gpx, build_array_from_fit
-from brevet_top_plot_a_route.utils import geo_distance
+from brevet_top_gcp_utils.calls import call_save_results, schedule_save_results
+from brevet_top_gcp_utils.upload import read_upload
+from brevet_top_numpy_utils import FloatArray, TrackTooLarge, np_cumulative_distance, read_track
 from brevet_top_strava import (ActivityError, build_checkpoint_list,
                                track_alignment, ActivityNotFound)
 from flask import Request
@@ -29,6 +27,24 @@ logging.basicConfig(level=logging.DEBUG)
 firebase_admin.initialize_app()
 db_client = google.cloud.firestore.Client()
 
+# align segments between controls in parallel processes, 0 - single pass
+ALIGNMENT_WORKERS = int(os.getenv("ALIGNMENT_WORKERS", "0"))
+# down-sampling interval (meters), check-ins are refined on the full track when sparser than 100
+ALIGNMENT_INTERVAL = int(os.getenv("ALIGNMENT_INTERVAL", "100"))
+# collapse stationary runs (cafés, traffic lights, hotels) before the alignment
+COLLAPSE_STOPS = os.getenv("COLLAPSE_STOPS", "").lower() in ("1", "true", "yes")
+# the track is considered stationary below that speed (meters per second)
+STOP_SPEED_MPS = float(os.getenv("STOP_SPEED_MPS", "0.5"))
+# seconds to extend the control time windows by, unset - match at any time
+CONTROL_WINDOW_SLACK = float(os.getenv("CONTROL_WINDOW_SLACK")) if os.getenv("CONTROL_WINDOW_SLACK") else None
+# longer tracks are decimated by time while decoding
+MAX_TRACK_POINTS = int(os.getenv("MAX_TRACK_POINTS", "200000"))
+# seconds between the results rebuilds of a brevet, 0 - a synchronous call every time
+RESULTS_INTERVAL = float(os.getenv("RESULTS_INTERVAL", "0"))
+
+# the riders are marked in the brevet and a delayed task updates them, no state is kept in the instance
+results_trigger = TaskResultsTrigger(db_client, call_save_results, schedule_save_results, interval=RESULTS_INTERVAL)
+
 
 @cross_origin(methods="POST")
 @authenticated
@@ -41,7 +57,7 @@ def upload_track(request: Request, auth: dict):
     """
     logging.debug(f"Request {request}")
 
-    data: dict = request.get_json().get("data", {})
+    data, stream = read_upload(request)
 
     # brevet.top document uid
     brevet_uid: str | None = data.get("brevetUid")
@@ -49,21 +65,20 @@ def upload_track(request: Request, auth: dict):
     # brevet.top rider uid
     rider_uid: str | None = data.get("riderUid")
 
-    # GPX track as a text
-    track: str = data.get("track", "")
-
-    if not track:
+    if stream is None:
         return json.dumps({"data": {"message": "No track given", "error": 400}}), 400
 
     if not brevet_uid:
         return json.dumps({"data": {"message": "Provide either a brevet UID", "error": 400}}), 400
 
-    track_data = b64decode(track.removeprefix("data:application/octet-stream;base64,"))
-    if track_data.startswith(b'<?xml'):
-        draft: FloatArray = build_array_from_gpx(gpxpy.parse(track_data))
-    elif track_data[8:12] == b'.FIT':
-        draft: FloatArray = build_array_from_fit(track_data)
-    else:
+    # GPX or FIT track, optionally compressed
+    try:
+        draft: FloatArray = read_track(stream, budget=MAX_TRACK_POINTS, size=request.content_length)
+    except TrackTooLarge as error:
+        logging.warning(f"Track refused: {error}")
+        return json.dumps({"data": {"message": str(error), "error": 413}}), 413
+    except ValueError as error:
+        logging.warning(f"Track decoding failed: {error}")
         return json.dumps({"data": {"message": "Unsupported file type", "error": 400}}), 400
 
     logging.info(f"{len(draft)} points in the track")
@@ -72,12 +87,7 @@ def upload_track(request: Request, auth: dict):
         return json.dumps({"data": {"message": "Empty track", "error": 400}}), 400
 
     # Update distances
-    for i in range(1, len(draft)):
-        lat1, lng1, _, distance1 = draft[i - 1]
-        lat2, lng2, _, distance2 = draft[i]
-        if distance2:
-            continue
-        draft[i][3] = distance1 + geo_distance(lat1, lng1, lat2, lng2)
+    draft[:, 3] = np_cumulative_distance(draft)
 
     try:
         logging.info(f"Uploading track to brevet {brevet_uid} rider {rider_uid}")
@@ -99,14 +109,11 @@ def upload_track(request: Request, auth: dict):
         except ValueError as error:
             return json.dumps({"data": {"message": str(error), "error": 404}}), 404
 
-        brevet_dict = brevet_doc.get().to_dict()
+        brevet_dict = get_brevet(brevet_doc, BREVET_ALIGNMENT)
 
-        # convert stored GeoPoints
-        brevet_dict["short_track"] = [
-            #  TODO: rename to shortTrack
-            firestore_to_track_point(p)
-            for p in brevet_dict.get("short_track", [])
-        ]
+        # the packed route or the stored GeoPoints
+        #  TODO: rename to shortTrack
+        brevet_dict["short_track"] = read_track_field(brevet_dict, "short_track")
 
         # prepare a list of control points (check-in / check-out) mandatory to visit
         cps = brevet_dict["checkpoints"]
@@ -117,27 +124,28 @@ def upload_track(request: Request, auth: dict):
         checkpoints, ids = build_checkpoint_list(cps)
 
         # the main alignment routine
-        points = track_alignment(brevet_dict, draft, checkpoints)
+        points = track_alignment(
+            brevet_dict,
+            draft,
+            checkpoints,
+            workers=ALIGNMENT_WORKERS,
+            window_slack=CONTROL_WINDOW_SLACK,
+            interval=ALIGNMENT_INTERVAL,
+            collapse=COLLAPSE_STOPS,
+            stop_speed_mps=STOP_SPEED_MPS,
+        )
         logging.info(f"{len(points)} points found")
 
-        # register check-ins / check-outs
-        for i, cp in enumerate(points):
+        # register check-ins / check-outs, a retried upload skips the registered ones
+        create_barcodes(
+            [data["riderUid"]],
+            brevet_dict["uid"],
             # test for NaN
-            if cp[2] == cp[2]:
-                create_rider_barcode(
-                    data["riderUid"],
-                    code=ids[i],
-                    time=datetime.fromtimestamp(int(cp[2]), tz=utc),
-                )
-        client = functions_v1.CloudFunctionsServiceClient()
-        client.call_function(request=functions_v1.CallFunctionRequest(
-            name=client.cloud_function_path(
-                project=os.getenv('GCLOUD_PROJECT'),
-                location=os.getenv('FUNCTION_REGION'),
-                function="saveResults",
-            ),
-            data='{"data": {"brevetUid": "%s"}}' % brevet_dict["uid"]
-        ))
+            [(ids[i], datetime.fromtimestamp(int(cp[2]), tz=utc)) for i, cp in enumerate(points) if cp[2] == cp[2]],
+            db=db_client,
+        )
+        # only the rider's results are updated, a finish rush is coalesced
+        results_trigger.request(brevet_dict["uid"], [data["riderUid"]])
 
         return json.dumps({"data": {"message": len(points)}}), 200
 
@@ -146,17 +154,3 @@ def upload_track(request: Request, auth: dict):
     except Exception as error:
         logging.exception(error)
         return json.dumps({"data": {"message": str(error), "error": 500}}), 500
-
-
-def create_rider_barcode(rider_uid: str, code: str, time: datetime) -> str:
-    return create_document(
-        f"riders/{rider_uid}/barcodes",
-        {
-            "code": code,
-            "control": rider_uid,
-            "owner": rider_uid,
-            "time": time,
-            "message": "new",
-        },
-        db=db_client,
-    )
@@ -1,16 +1,14 @@
 import json
 import logging
-from base64 import b64decode
+import os
 
 import google.cloud.logging
-import gpxpy
 import numpy as np
-from brevet_top_numpy_utils import FloatArray
+from brevet_top_gcp_utils.upload import read_upload
+from brevet_top_numpy_utils import FloatArray, TrackTooLarge, np_cumulative_distance, read_track
 from brevet_top_strava import (ActivityError, track_alignment, ActivityNotFound)
 from flask import Request
 from flask_cors import cross_origin
-from garmin_fit_sdk import Decoder, Stream, Profile
-from gpxpy.gpx import GPX
 from more_itertools import flatten
 
 log_client = google.cloud.logging.Client()
@@ -18,9 +16,10 @@ log_client.get_default_handler()
 log_client.setup_logging(log_level=logging.DEBUG)
 logging.basicConfig(level=logging.DEBUG)
 
-GARMIN_FIT_BASE = 11930465
 TRACK_DEVIATION_FACTOR: int = 600
 CONTROL_DEVIATION_FACTOR: int = 500
+# longer tracks are decimated by time while decoding
+MAX_TRACK_POINTS = int(os.getenv("MAX_TRACK_POINTS", "200000"))
 
 
 @cross_origin(methods="POST")
@@ -32,26 +31,31 @@ def upload_track_other(request: Request):
     """
     logging.debug(f"Request {request}")
 
-    data: dict = request.get_json().get("data", {})
+    data, stream = read_upload(request)
 
-    # checkpoints as a list of [latitude, longitude, distance, 0]
+    # checkpoints as a list of [latitude, longitude, distance, 0], a JSON string in the form or the query
     checkpoints = data.get("checkpoints", [])
+    try:
+        if isinstance(checkpoints, str):
+            checkpoints = json.loads(checkpoints)
+    except ValueError as error:
+        logging.warning(f"Checkpoint list decoding failed: {error}")
+        return json.dumps({"data": {"message": "Malformed checkpoint list", "error": 400}}), 400
 
-    # GPX track as a text
-    track: str = data.get("track", "")
-
-    if not track:
+    if stream is None:
         return json.dumps({"data": {"message": "No track given", "error": 400}}), 400
 
     if not checkpoints:
         return json.dumps({"data": {"message": "Provide a checkpoint list", "error": 400}}), 400
 
-    track_data = b64decode(track.removeprefix("data:application/octet-stream;base64,"))
-    if track_data.startswith(b'<?xml'):
-        draft: FloatArray = build_array_from_gpx(gpxpy.parse(track_data))
-    elif track_data[8:12] == b'.FIT':
-        draft: FloatArray = build_array_from_fit(track_data)
-    else:
+    # GPX or FIT track, optionally compressed
+    try:
+        draft: FloatArray = read_track(stream, budget=MAX_TRACK_POINTS, size=request.content_length)
+    except TrackTooLarge as error:
+        logging.warning(f"Track refused: {error}")
+        return json.dumps({"data": {"message": str(error), "error": 413}}), 413
+    except ValueError as error:
+        logging.warning(f"Track decoding failed: {error}")
         return json.dumps({"data": {"message": "Unsupported file type", "error": 400}}), 400
 
     logging.info(f"{len(draft)} points in the track")
@@ -59,6 +63,9 @@ def upload_track_other(request: Request):
     if len(draft) == 0:
         return json.dumps({"data": {"message": "Empty track", "error": 400}}), 400
 
+    # Update distances
+    draft[:, 3] = np_cumulative_distance(draft)
+
     try:
         distance = checkpoints[-1][2]
         brevet = {
@@ -80,51 +87,3 @@ def upload_track_other(request: Request):
     except Exception as error:
         logging.exception(error)
         return json.dumps({"data": {"message": str(error), "error": 500}}), 500
-
-def build_array_from_gpx(data: GPX) -> FloatArray:
-    """
-    Compose a track sequence out of GPX data. The point's comment may be a distance.
-
-    :param data: the track data from the GPX file
-    :return: array of [latitude, longitude, timestamp, distance]
-    """
-    draft: FloatArray = np.empty(shape=(0, 4), dtype=np.float64)
-    for track in data.tracks:
-        for segment in track.segments:
-            points = [
-                [
-                    point.latitude,
-                    point.longitude,
-                    point.time.timestamp(),
-                    float(point.comment or 0) / 1000,
-                ]
-                for point in segment.points
-            ]
-            draft = np.concatenate((draft, points), axis=0)
-    return draft
-
-
-def build_array_from_fit(data: bytes) -> FloatArray:
-    """
-    Compose a track sequence out of FIT data.
-
-    :param data: the track data from the FIT file
-    :return: array of [latitude, longitude, timestamp, distance]
-    """
-    stream = Stream.from_byte_array(bytearray(data))
-    decoder = Decoder(stream)
-
-    draft: FloatArray = np.empty(shape=(0, 4), dtype=np.float64)
-    track_points = []
-
-    def mesg_listener(mesg_num, message):
-        if mesg_num == Profile['mesg_num']['RECORD']:
-            track_points.append([
-                message.get("position_lat", 0) / GARMIN_FIT_BASE,
-                message.get("position_long", 0) / GARMIN_FIT_BASE,
-                message.get("timestamp").timestamp(),
-                message.get("distance", 0) / 1000,
-            ])
-
-    decoder.read(mesg_listener=mesg_listener)
-    return np.concatenate((draft, track_points), axis=0)